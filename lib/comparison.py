@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+# The preprocessing shared by the Levenshtein and LCS demo drivers in modules/: reading
+# a MIDI file, through the score cache, the MIDI events or music21, into the parts to
+# compare.
+#
+# Parts are decoded lazily. loadParts only reads the part names; a part is converted
+# the first time it is asked for, so comparing one instrument of two quartets decodes
+# two tracks, not eight. With music21 that means converting a copy of the MIDI file
+# holding only the conductor tracks and the one track wanted.
+#
+# Every stage runs inside `with self.profiler.stage(...)`, see profiling.py.
+
+import random
+
+from encoding import EncodedPart
+from helpers import Music21Helper
+from midievents import MidiEvents
+from profiling import NO_PROFILER, Profiler
+from scorecache import ScoreCache, DEFAULT_CACHE_DIR, extractEvents
+
+
+class LazyParts():
+    """
+    the parts of one score, each decoded by load(number) on first access.
+    names are known up front: parts.names[i] is the name of parts[i]
+    """
+    def __init__(self, names, load):
+        self.names = list(names)
+        self._load = load
+        self._parts = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, number):
+        if isinstance(number, slice):
+            return [self[i] for i in range(len(self))[number]]
+        if number < 0:
+            number += len(self)
+        if not 0 <= number < len(self):
+            raise IndexError("part {} out of range".format(number))
+        part = self._parts.get(number)
+        if part is None:
+            part = self._parts[number] = self._load(number)
+        return part
+
+    def __iter__(self):
+        for number in range(len(self)):
+            yield self[number]
+
+    def loaded(self):
+        """numbers of the parts decoded so far"""
+        return sorted(self._parts)
+
+
+class ScoreComparison():
+    """
+    base class of the drivers: loads both scores and picks the part of each to compare.
+
+    select picks that part: a part name, a part number, or a function from the list of
+    part names to a number. by default a part is picked at random.
+
+    profiler (a profiling.Profiler) times each stage of loading and comparing
+    """
+    def __init__(self, cache=None, fast=False, intervals=False, ratios=False, chords=False, select=None, profiler=None):
+        self.helper = Music21Helper()
+        # optional scorecache.ScoreCache; when set, parsed scores are reused across runs
+        self.cache = cache
+        # read letter names straight from the MIDI events instead of building a music21 stream
+        self.fast = fast
+        # compare the intervals between notes (and optionally duration ratios), so transpositions match
+        self.intervals = intervals
+        self.ratios = ratios
+        # compare every tone of chords and double stops (pitch class sets, matching when they overlap)
+        self.chords = chords
+        self.select = select
+        self.profiler = NO_PROFILER if profiler is None else profiler
+
+    @staticmethod
+    def addArguments(parser):
+        """the command line options every driver takes"""
+        parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_DIR, help='reuse parsed scores from a score cache (optionally at this directory)')
+        parser.add_argument('--fast', action='store_true', help='read notes directly from the MIDI events, without building music21 streams')
+        parser.add_argument('--intervals', action='store_true', help='compare the intervals between notes, so the same theme in another key matches')
+        parser.add_argument('--ratios', action='store_true', help='with --intervals, also compare the ratios between note durations')
+        parser.add_argument('--chords', action='store_true', help='compare every tone of chords, matching notes and chords that share a pitch class')
+        parser.add_argument('--part', help='name or number of the part to compare in both files (default: one at random)')
+        parser.add_argument('--profile', metavar='REPORT', help='write the time (and with --memory, memory) of every stage to this .json file')
+        parser.add_argument('--memory', action='store_true', help='with --profile, trace memory with tracemalloc (slow)')
+        parser.add_argument('--cprofile', action='store_true', help='with --profile, also run cProfile and write its stats to REPORT.prof')
+
+    @classmethod
+    def fromArguments(cls, parser, args):
+        """a driver set up from addArguments' options"""
+        if args.chords and (args.cache or args.intervals):
+            parser.error("--chords can't be used with --cache (the cache keeps chord roots only) or --intervals")
+        if (args.memory or args.cprofile) and not args.profile:
+            parser.error("--memory and --cprofile need --profile")
+        profiler = None
+        if args.profile:
+            profiler = Profiler(memory=args.memory, cprofile=args.cprofile, output=args.profile)
+        cache = None
+        if args.cache:
+            cache = ScoreCache(args.cache, extractor=extractEvents) if args.fast else ScoreCache(args.cache)
+        select = int(args.part) if args.part is not None and args.part.isdigit() else args.part
+        return cls(cache=cache, fast=args.fast, intervals=args.intervals, ratios=args.ratios,
+                   chords=args.chords, select=select, profiler=profiler)
+
+    def saveProfile(self):
+        """writes the profiler's report, when profiling"""
+        if self.profiler.enabled:
+            print("Wrote the profile to {}".format(self.profiler.save()))
+
+    def readMidi(self, music):
+        """
+        Read a MIDI file with music21, without converting it
+        """
+        from music21 import midi
+
+        mf = midi.MidiFile()
+        mf.open(music)
+        print("Reading MIDI data for {}...".format(music))
+        with self.profiler.stage("readMidi"):
+            mf.read()
+        mf.close()
+        return mf
+
+    def preProcessStream(self, music):
+        """
+        Convert MIDI file to a stream and return
+        """
+        from music21 import midi
+
+        mf = self.readMidi(music)
+        print("Converting MIDI to stream for {}...".format(music))
+        with self.profiler.stage("midiFileToStream"):
+            stream = midi.translate.midiFileToStream(mf)
+
+        return stream
+
+    def streamToParts(self, stream):
+        """
+        Convert a music21 stream to a list of encoding.EncodedParts, one per part
+        """
+        print("Converting stream to matrix...")
+        with self.profiler.stage("streamToMatrix"):
+            note_matrix = self.helper.streamToMatrix(stream)
+            partList = self.helper.listInstruments(stream)
+        self.profiler.count("notes", sum(len(row) for row in note_matrix))
+        if self.chords:
+            print("Gathering the pitch class sets of the music...")
+            with self.profiler.stage("noteToPitchClassSets"):
+                return [EncodedPart(sets, name, "pitchClassSet") for sets, name in zip(self.helper.noteToPitchClassSets(note_matrix), partList)]
+
+        # encode each part once, here, rather than comparing strings in the DP
+        if self.intervals:
+            with self.profiler.stage("noteToPitches"):
+                pitch_matrix = self.helper.noteToPitches(note_matrix)
+                durations = self.helper.noteToDurations(note_matrix) if self.ratios else [None] * len(pitch_matrix)
+            with self.profiler.stage("encode"):
+                return [EncodedPart.fromIntervals(p, name, d) for p, name, d in zip(pitch_matrix, partList, durations)]
+        # convert pitch classes to simple letter names
+        print("Gathering letter names from the music...")
+        with self.profiler.stage("noteToLetterName"):
+            letter_matrix = self.helper.noteToLetterName(note_matrix)
+        with self.profiler.stage("encode"):
+            return [EncodedPart.fromLetterNames(letters, name) for letters, name in zip(letter_matrix, partList)]
+
+    def streamParts(self, music):
+        """
+        The parts of a MIDI file, each converted to a music21 stream on its own when needed
+        """
+        from music21 import midi
+
+        mf = self.readMidi(music)
+        # the tracks music21 makes parts of; the others are conductor tracks every part needs
+        tracks = [number for number, track in enumerate(mf.tracks) if track.hasNotes()]
+        with self.profiler.stage("partNames"):
+            names = MidiEvents.read(music).partNames()
+
+        def load(number):
+            print("Converting the {} track of {} to a stream...".format(names[number], music))
+            single = midi.MidiFile()
+            single.ticksPerQuarterNote = mf.ticksPerQuarterNote
+            single.ticksPerSecond = mf.ticksPerSecond
+            single.tracks = [t for k, t in enumerate(mf.tracks) if k == tracks[number] or not t.hasNotes()]
+            with self.profiler.stage("midiFileToStream"):
+                stream = midi.translate.midiFileToStream(single)
+            return self.streamToParts(stream)[0]
+        return LazyParts(names, load)
+
+    def cachedToParts(self, music):
+        """
+        Read the parts of a MIDI file from the score cache
+        """
+        print("Loading cached notes for {}...".format(music))
+        with self.profiler.stage("cache"):
+            score = self.cache.get(music)
+
+        def load(number):
+            with self.profiler.stage("encode"):
+                return score.part(number, self.intervals, self.ratios)
+        return LazyParts(score.partNames, load)
+
+    def eventsToParts(self, music):
+        """
+        Read the parts of a MIDI file straight from its note events
+        """
+        print("Reading MIDI events for {}...".format(music))
+        with self.profiler.stage("readEvents"):
+            events = MidiEvents.read(music)
+
+        def load(number):
+            with self.profiler.stage("encodedPart"):
+                return events.encodedPart(number, self.intervals, self.ratios, self.chords)
+        return LazyParts(events.partNames(), load)
+
+    def loadParts(self, music):
+        if self.cache is not None:
+            return self.cachedToParts(music)
+        if self.fast:
+            return self.eventsToParts(music)
+        return self.streamParts(music)
+
+    def partNumber(self, names):
+        """the number of the part self.select picks out of names"""
+        if self.select is None:
+            return random.randrange(len(names))
+        if callable(self.select):
+            return self.select(names)
+        if isinstance(self.select, int):
+            if not 0 <= self.select < len(names):
+                raise ValueError("no part {}, there are {} parts".format(self.select, len(names)))
+            return self.select
+        if self.select not in names:
+            raise ValueError("no part named {!r}, the parts are {}".format(self.select, names))
+        return names.index(self.select)
+
+    def selectPart(self, parts):
+        # the part is decoded here, so this stage includes decoding it
+        with self.profiler.stage("selectPart"):
+            part = parts[self.partNumber(parts.names)]
+        self.profiler.count("parts")
+        return part
+
+    def distance(self, function, part1, part2):
+        """function(part1, part2), as a profiled stage named after the function"""
+        with self.profiler.stage(function.__name__):
+            return function(part1, part2)
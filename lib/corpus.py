@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+
+# All-pairs part-vs-part scores over a corpus of MIDI files.
+#
+# Every part of every score is one row (and one column) of the matrix. The pairs are
+# cut into square tiles of `chunk` rows by `chunk` columns; each tile is one unit of
+# work for a worker process, which already holds all the parts (handed over once by
+# the pool initializer), so a task is just the four tile bounds.
+#
+# While it runs the matrix lives in <output>.partial.npy, a memmap initialised to NaN
+# that gets each finished tile written into it and flushed. Running the same command
+# again skips every tile that has no NaN left in it.
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from helpers import Music21Helper
+
+METRICS = ("levenshtein", "lcs")
+
+MIDI_EXTENSIONS = (".mid", ".midi", ".squ")
+
+
+def listScores(directory, extensions=MIDI_EXTENSIONS):
+    """the MIDI files in directory, sorted by name"""
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.lower().endswith(extensions)]
+
+
+def loadParts(path, cache=None, fast=False, intervals=False):
+    """
+    the encoding.EncodedParts of one MIDI file: from the score cache if there is one,
+    else read with midievents (fast) or music21. intervals=True for interval parts
+    """
+    if cache is not None:
+        return cache.get(path).parts(intervals)
+    if fast:
+        from midievents import MidiEvents
+        return MidiEvents.read(path).encodedParts(intervals)
+    from scorecache import extractScore
+    return extractScore(path).parts(intervals)
+
+
+class Corpus():
+    """
+    the parts of a list of MIDI files, flattened into one list. labels name each part
+    as "<file name>:<part name>" (or ":<part number>" for unnamed parts)
+    """
+    def __init__(self, paths, scores):
+        self.paths = list(paths)
+        self.parts = []
+        self.labels = []
+        self.files = []
+        for path, parts in zip(self.paths, scores):
+            for n, part in enumerate(parts):
+                self.parts.append(part)
+                self.labels.append("{}:{}".format(os.path.basename(path), part.name if part.name else n))
+                self.files.append(path)
+
+    @classmethod
+    def load(cls, paths, cache=None, fast=False, executor=None, intervals=False):
+        """reads every file once, on the executor's workers when one is given"""
+        if executor is None:
+            scores = [loadParts(path, cache, fast, intervals) for path in paths]
+        else:
+            n = len(paths)
+            scores = list(executor.map(loadParts, paths, [cache] * n, [fast] * n, [intervals] * n))
+        return cls(paths, scores)
+
+    @classmethod
+    def fromStore(cls, store):
+        """
+        the parts of a corpusstore.CorpusStore, which stay in the store: a pool gets the
+        store's path instead of a copy of every part
+        """
+        corpus = cls([], [])
+        corpus.paths = list(dict.fromkeys(entry["path"] for entry in store.table))
+        corpus.parts = store
+        corpus.labels = store.labels()
+        corpus.files = [entry["path"] for entry in store.table]
+        return corpus
+
+    def lengths(self):
+        if hasattr(self.parts, "lengths"):
+            return self.parts.lengths.copy()
+        return np.array([len(p) for p in self.parts], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.parts)
+
+
+# parts and metric of the pool worker, set once by _initWorker
+_worker = {}
+
+
+def _initWorker(rows, cols, metric):
+    _worker["rows"] = rows
+    _worker["cols"] = rows if cols is None else cols
+    _worker["symmetric"] = cols is None
+    _worker["metric"] = metric
+
+
+def _computeTile(tile):
+    """
+    scores of rows[i0:i1] against cols[j0:j1]. on the diagonal of a symmetric matrix
+    only the upper triangle is computed, and mirrored
+    """
+    i0, i1, j0, j1 = tile
+    rows, cols = _worker["rows"], _worker["cols"]
+    engine = Music21Helper.levenshteinBitParallel if _worker["metric"] == "levenshtein" else Music21Helper.lcsBitParallel
+    diagonal = _worker["symmetric"] and i0 == j0
+    block = np.empty((i1 - i0, j1 - j0), dtype=np.float64)
+    for i in range(i0, i1):
+        # one set of match masks per row, reused across the whole tile
+        masks = Music21Helper.matchMasks(rows[i])
+        for j in range(i if diagonal else j0, j1):
+            block[i - i0, j - j0] = engine(rows[i], cols[j], masks=masks)
+    if diagonal:
+        lower = np.tril_indices(i1 - i0, -1)
+        block[lower] = block.T[lower]
+    return tile, block
+
+
+def tiles(nrows, ncols, chunk, symmetric):
+    """the (i0, i1, j0, j1) work units; only those on or above the diagonal when symmetric"""
+    out = []
+    for i0 in range(0, nrows, chunk):
+        for j0 in range(i0 if symmetric else 0, ncols, chunk):
+            out.append((i0, min(i0 + chunk, nrows), j0, min(j0 + chunk, ncols)))
+    return out
+
+
+def similarity(matrix, rowLengths, colLengths, metric):
+    """
+    turns raw scores into the percentages the demo scripts print: 1 - distance / longer
+    part for levenshtein, lcs length / longer part for lcs
+    """
+    longer = np.maximum.outer(rowLengths, colLengths).astype(np.float64)
+    longer[longer == 0] = 1
+    if metric == "levenshtein":
+        return 1 - matrix / longer
+    return matrix / longer
+
+
+class CorpusMatrix():
+    """
+    resumable all-pairs matrix of levenshtein distances or lcs lengths.
+
+    matrix = CorpusMatrix(corpus, metric="lcs", output="lcs.npy").compute(workers=4)
+
+    pass cols (another Corpus) for an N x M matrix of corpus against cols; without it
+    the matrix is N x N and only the upper triangle is computed
+    """
+    def __init__(self, rows, cols=None, metric="levenshtein", output=None, chunk=16):
+        if metric not in METRICS:
+            raise ValueError("unknown metric: {}".format(metric))
+        self.rows = rows
+        self.cols = cols
+        self.metric = metric
+        self.output = output
+        self.chunk = chunk
+
+    @property
+    def shape(self):
+        return (len(self.rows), len(self.rows if self.cols is None else self.cols))
+
+    def _state(self):
+        return {
+            "metric": self.metric,
+            "rows": self.rows.labels,
+            "cols": None if self.cols is None else self.cols.labels,
+        }
+
+    def _openPartial(self):
+        """the working matrix: reopened when a run with the same parts was interrupted"""
+        if self.output is None:
+            return np.full(self.shape, np.nan)
+        partial = self.output + ".partial.npy"
+        statePath = self.output + ".partial.json"
+        if os.path.exists(partial) and os.path.exists(statePath):
+            with open(statePath) as f:
+                state = json.load(f)
+            if state == self._state():
+                matrix = np.lib.format.open_memmap(partial, mode="r+")
+                if matrix.shape == self.shape:
+                    return matrix
+        matrix = np.lib.format.open_memmap(partial, mode="w+", dtype=np.float64, shape=self.shape)
+        matrix[:] = np.nan
+        matrix.flush()
+        with open(statePath, "w") as f:
+            json.dump(self._state(), f)
+        return matrix
+
+    def compute(self, workers=None, progress=None):
+        """
+        fills in the matrix and returns it. workers=1 computes in this process, otherwise a
+        ProcessPoolExecutor with that many workers (default: one per cpu) does the tiles.
+        progress(pairsDone, pairsTotal) is called after every tile
+        """
+        symmetric = self.cols is None
+        matrix = self._openPartial()
+        allTiles = tiles(self.shape[0], self.shape[1], self.chunk, symmetric)
+        pairs = lambda t: (t[1] - t[0]) * (t[3] - t[2])
+        total = sum(pairs(t) for t in allTiles)
+        todo = [t for t in allTiles if np.isnan(matrix[t[0]:t[1], t[2]:t[3]]).any()]
+        done = total - sum(pairs(t) for t in todo)
+
+        rowParts = self.rows.parts
+        colParts = None if symmetric else self.cols.parts
+
+        def store(tile, block):
+            i0, i1, j0, j1 = tile
+            matrix[i0:i1, j0:j1] = block
+            if symmetric and i0 != j0:
+                matrix[j0:j1, i0:i1] = block.T
+            if isinstance(matrix, np.memmap):
+                matrix.flush()
+
+        if progress is not None:
+            progress(done, total)
+        if workers == 1:
+            _initWorker(rowParts, colParts, self.metric)
+            results = (_computeTile(t) for t in todo)
+            for tile, block in results:
+                store(tile, block)
+                done += pairs(tile)
+                if progress is not None:
+                    progress(done, total)
+        elif todo:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker,
+                                     initargs=(rowParts, colParts, self.metric)) as executor:
+                futures = [executor.submit(_computeTile, t) for t in todo]
+                for future in as_completed(futures):
+                    tile, block = future.result()
+                    store(tile, block)
+                    done += pairs(tile)
+                    if progress is not None:
+                        progress(done, total)
+
+        return np.array(matrix)
+
+    def save(self, matrix, path=None, similarities=False):
+        """
+        writes the matrix to path (default: output): a .csv gets the labels as its header
+        row and first column, a .npy gets them in <name>.labels.txt alongside it (and the
+        column labels of an N x M matrix in <name>.cols.txt). similarities=True says the
+        matrix went through similarity(); the top left cell of a .csv names the metric
+        and which of the two it holds, e.g. "metric=lcs values=similarity".
+        removes the partial files of the run
+        """
+        path = self.output if path is None else path
+        rowLabels = self.rows.labels
+        colLabels = rowLabels if self.cols is None else self.cols.labels
+        if path.lower().endswith(".csv"):
+            import csv
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                corner = "metric={} values={}".format(self.metric, "similarity" if similarities else "raw")
+                writer.writerow([corner] + colLabels)
+                for label, row in zip(rowLabels, matrix.tolist()):
+                    writer.writerow([label] + row)
+        else:
+            np.save(path, matrix)
+            stem = os.path.splitext(path)[0]
+            with open(stem + ".labels.txt", "w") as f:
+                f.write("\n".join(rowLabels) + "\n")
+            if self.cols is not None:
+                with open(stem + ".cols.txt", "w") as f:
+                    f.write("\n".join(colLabels) + "\n")
+        if self.output is not None:
+            for leftover in (self.output + ".partial.npy", self.output + ".partial.json"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+
+def _initMotifWorker(rows, cols, files, top, minScore, substitution, sameFile):
+    _worker["rows"] = rows
+    _worker["cols"] = rows if cols is None else cols
+    _worker["symmetric"] = cols is None
+    _worker["files"] = files
+    _worker["motifs"] = (top, minScore, substitution, sameFile)
+
+
+def _motifsOfRow(i):
+    """the smith-waterman hits of rows[i] against every column it is paired with"""
+    rows, cols = _worker["rows"], _worker["cols"]
+    top, minScore, substitution, sameFile = _worker["motifs"]
+    rowFiles, colFiles = _worker["files"]
+    hits = []
+    for j in range(i + 1 if _worker["symmetric"] else 0, len(cols)):
+        if not sameFile and rowFiles[i] == colFiles[j]:
+            continue
+        found = Music21Helper.smithWaterman(rows[i], cols[j], substitution=substitution, top=top, minScore=minScore)
+        hits.extend((score, i, j, region1, region2) for score, region1, region2 in found)
+    return hits
+
+
+def mineMotifs(rows, cols=None, top=3, minScore=16, substitution=None, sameFile=False, workers=None, progress=None):
+    """
+    local alignments (Music21Helper.smithWaterman) of every part of rows against every
+    part of cols (every other part of rows when cols is None): up to `top`
+    non-overlapping hits scoring at least minScore per pair of parts, skipping pairs of
+    parts from the same file unless sameFile. returns
+        [(score, row part, col part, (start1, end1), (start2, end2)), ...]
+    best first. progress(rowsDone, rowsTotal) is called as rows finish
+    """
+    realpath = lambda corpus: [os.path.realpath(f) for f in corpus.files]
+    files = (realpath(rows), realpath(rows if cols is None else cols))
+    initargs = (rows.parts, None if cols is None else cols.parts, files, top, minScore, substitution, sameFile)
+    hits = []
+    if workers == 1:
+        _initMotifWorker(*initargs)
+        results = map(_motifsOfRow, range(len(rows)))
+        for done, found in enumerate(results, 1):
+            hits.extend(found)
+            if progress is not None:
+                progress(done, len(rows))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initMotifWorker, initargs=initargs) as executor:
+            futures = [executor.submit(_motifsOfRow, i) for i in range(len(rows))]
+            for done, future in enumerate(as_completed(futures), 1):
+                hits.extend(future.result())
+                if progress is not None:
+                    progress(done, len(rows))
+    return sorted(hits, key=lambda hit: (-hit[0], hit[1], hit[2]))
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+# A packed corpus: the encoded parts of every score of a corpus in one file, read
+# through a memory map.
+#
+# <name>.npy holds the codes of all the parts back to back (an ordinary .npy file,
+# so np.load(path, mmap_mode="r") reads it too), and <name>.json the table of parts:
+# for each its offset and length in the codes, the file (and the path it was read
+# from) and part name, and the composer, key, catalogue number and movement parsed
+# from the file name.
+#
+# store[i] is an encoding.EncodedPart whose codes are a slice of the memory map, not
+# a copy. A CorpusStore pickles as its path, so a process pool handed the store (say
+# as the parts of a corpus.Corpus) has every worker map the same file and share one
+# page-cached copy of the corpus, instead of each receiving its own copy of the parts.
+
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+
+from encoding import EncodedPart
+
+STORE_VERSION = 1
+
+# <composer>_<form>_<key>_<catalogue>_<movement>, as in haydn_sq_Eb_20-1_1.squ
+FILE_NAME = re.compile(r"^(?P<composer>[a-z]+)_(?P<form>[a-z]+)_(?P<key>[A-Ga-g][b#]?)_(?P<catalogue>[^_]+)_(?P<movement>\d+)$")
+
+
+def scoreMetadata(path):
+    """
+    composer, key, catalogue number and movement parsed from a file name like
+    mozart_sq_Bb_k589_1.squ, all None for names that don't follow that pattern
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = FILE_NAME.match(stem)
+    if match is None:
+        return {"composer": None, "key": None, "catalogue": None, "movement": None}
+    return {"composer": match.group("composer"), "key": match.group("key"),
+            "catalogue": match.group("catalogue"), "movement": int(match.group("movement"))}
+
+
+def _stem(path):
+    return path[:-4] if path.endswith(".npy") else path
+
+
+class CorpusStore():
+    """
+    store = CorpusStore.pack(listScores("data"), "corpus.npy", fast=True)
+    store = CorpusStore("corpus.npy")
+    store[3]                        # EncodedPart viewing the memory map
+    store.table[3]                  # {"file": ..., "part": "Viola", "composer": "haydn", "key": "Eb", ...}
+    store.select(composer="haydn")  # numbers of the parts that match
+
+    a read-only sequence of the parts, in the order they were packed
+    """
+    def __init__(self, path):
+        self.path = _stem(path) + ".npy"
+        with open(_stem(path) + ".json") as f:
+            index = json.load(f)
+        if index.get("version") != STORE_VERSION:
+            raise ValueError("{} is not a version {} corpus store".format(path, STORE_VERSION))
+        self.alphabet = index["alphabet"]
+        self.table = index["parts"]
+        self.offsets = np.array([entry["offset"] for entry in self.table], dtype=np.int64)
+        self.lengths = np.array([entry["length"] for entry in self.table], dtype=np.int64)
+        # np.memmap can't map an empty file
+        self.codes = np.load(self.path, mmap_mode="r") if self.lengths.sum() else np.load(self.path)
+
+    @classmethod
+    def pack(cls, paths, output, cache=None, fast=False, intervals=False, executor=None):
+        """
+        reads every file in paths (as corpus.loadParts does; on the executor's workers
+        when one is given) and writes their parts to output (.npy) and its .json table.
+        returns the store, opened
+        """
+        from corpus import loadParts
+
+        if executor is None:
+            scores = [loadParts(path, cache, fast, intervals) for path in paths]
+        else:
+            n = len(paths)
+            scores = list(executor.map(loadParts, paths, [cache] * n, [fast] * n, [intervals] * n))
+        return cls.fromParts(paths, scores, output)
+
+    @classmethod
+    def fromParts(cls, paths, scores, output):
+        """writes scores (a list of EncodedParts per path) as a store at output"""
+        parts = [part for score in scores for part in score]
+        alphabets = {part.alphabet for part in parts}
+        if len(alphabets) > 1:
+            raise ValueError("the parts of a store share one alphabet, not {}".format(sorted(alphabets)))
+        alphabet = alphabets.pop() if alphabets else "pitchClass"
+
+        table = []
+        offset = 0
+        for path, score in zip(paths, scores):
+            metadata = scoreMetadata(path)
+            for number, part in enumerate(score):
+                table.append(dict(file=os.path.basename(path), path=path, number=number, part=part.name,
+                                  offset=offset, length=len(part), **metadata))
+                offset += len(part)
+        dtype = EncodedPart([], alphabet=alphabet).codes.dtype
+        codes = np.concatenate([part.codes for part in parts]) if parts else np.zeros(0, dtype=dtype)
+
+        stem = _stem(output)
+        directory = os.path.dirname(os.path.abspath(stem))
+        # the table goes last: a store without its table is never opened
+        for target, write in ((stem + ".npy", lambda f: np.save(f, codes.astype(dtype, copy=False))),
+                              (stem + ".json", lambda f: f.write(json.dumps(
+                                  {"version": STORE_VERSION, "alphabet": alphabet, "parts": table}, indent=1).encode("utf-8")))):
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    write(f)
+                os.replace(tmp, target)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+        return cls(stem)
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, number):
+        if isinstance(number, slice):
+            return [self[i] for i in range(len(self))[number]]
+        entry = self.table[number]
+        start = entry["offset"]
+        return EncodedPart(self.codes[start:start + entry["length"]], entry["part"], self.alphabet)
+
+    def __iter__(self):
+        for number in range(len(self)):
+            yield self[number]
+
+    def labels(self):
+        """"<file name>:<part name>" for every part, as corpus.Corpus labels them"""
+        return ["{}:{}".format(e["file"], e["part"] if e["part"] else e["number"]) for e in self.table]
+
+    def select(self, **fields):
+        """numbers of the parts whose table entries have all of fields, e.g. select(composer="mozart", key="D")"""
+        return [n for n, entry in enumerate(self.table) if all(entry.get(k) == v for k, v in fields.items())]
+
+    def __getstate__(self):
+        # the memory map is opened again where the store is unpickled
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+# Memoizes the Music21Helper distance functions.
+#
+# An entry is keyed by the function, the parameters that change its result, and a
+# stable fingerprint of each of the two sequences, so the key is the same in every
+# process and every run. For symmetric functions (every distance except an LCS
+# traceback) the two fingerprints are sorted, so (a, b) and (b, a) share an entry.
+#
+# Entries live in an in-memory LRU bounded by an estimate of the bytes it holds, and
+# optionally in a sqlite file behind it that outlives the process. The file holds the
+# values as JSON, never pickles, so a shared file can't run code in whoever reads it.
+
+import hashlib
+import inspect
+import json
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from encoding import EncodedPart
+from helpers import Music21Helper
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# parameters that don't change what a distance function returns
+IGNORED_PARAMS = ("engine", "masks", "printDistances")
+
+# what lookup returns for a key that isn't cached
+MISSING = object()
+
+
+def fingerprint(tokens):
+    """
+    16-byte hash of a sequence, stable across processes and runs. strings, lists of
+    tokens, numpy arrays and encoding.EncodedParts each hash their own way, so equal
+    notes in two different representations get two different fingerprints
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(tokens, EncodedPart):
+        h.update(b"part:" + tokens.alphabet.encode("ascii") + b":")
+        h.update(tokens.codes.tobytes())
+        if tokens.ratios is not None:
+            h.update(b":ratios:" + tokens.ratios.tobytes())
+    elif isinstance(tokens, str):
+        h.update(b"str:" + tokens.encode("utf-8"))
+    elif isinstance(tokens, np.ndarray) and tokens.dtype.kind in "iub":
+        h.update(b"array:" + tokens.dtype.str.encode("ascii") + b":")
+        h.update(np.ascontiguousarray(tokens).tobytes())
+    else:
+        h.update(b"seq:")
+        for token in list(tokens):
+            # numpy scalars compare equal to the python numbers they hold
+            if isinstance(token, np.generic):
+                token = token.item()
+            # typed, so 1 and "1" (same str()) hash apart
+            h.update(type(token).__name__.encode("utf-8") + b":" + repr(token).encode("utf-8") + b"\x1f")
+    return h.digest()
+
+
+def _allParams(func, token1, token2, params):
+    """params with every parameter func defaults filled in, so leaving one out and passing its default share a key"""
+    try:
+        bound = inspect.signature(func).bind(token1, token2, **params)
+    except (TypeError, ValueError):
+        # no signature to read, or one bind can't satisfy: func itself will say what is wrong
+        return params
+    bound.apply_defaults()
+    # everything but the two sequences
+    return dict(list(bound.arguments.items())[2:])
+
+
+def _sizeof(value):
+    """rough bytes held by a cached value: numbers, or tuples/lists of them"""
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def _dumps(value):
+    """value as JSON, for the sqlite file. tuples are written as {"tuple": [...]}, to be read back as tuples"""
+    def plain(value):
+        if isinstance(value, tuple):
+            return {"tuple": [plain(v) for v in value]}
+        if isinstance(value, list):
+            return [plain(v) for v in value]
+        # numpy scalars are written as the python numbers they hold
+        return value.item() if isinstance(value, np.generic) else value
+    return json.dumps(plain(value))
+
+
+def _loads(text):
+    """a value written by _dumps, with its tuples back as tuples"""
+    return json.loads(text, object_hook=lambda o: tuple(o["tuple"]) if set(o) == {"tuple"} else o)
+
+
+class DistanceCache():
+    """
+    LRU cache in front of the Music21Helper distance functions.
+
+    cache = DistanceCache(max_bytes=16 * 1024 * 1024, path="distances.sqlite")
+    cache.levenshteinDistanceDP(part1, part2)   # computed
+    cache.levenshteinDistanceDP(part2, part1)   # cache hit
+    cache.stats()
+
+    with a path, entries evicted from memory (or computed by another process) are
+    still found in the sqlite file. safe to share between threads
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, path=None):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.bytes = 0
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS distances (key BLOB PRIMARY KEY, value BLOB)")
+            self._db.commit()
+
+    def key(self, func, token1, token2, symmetric=True, **params):
+        """the 16-byte cache key of func(token1, token2, **params)"""
+        fingerprints = [fingerprint(token1), fingerprint(token2)]
+        if symmetric:
+            fingerprints.sort()
+        params = {k: v for k, v in _allParams(func, token1, token2, params).items() if k not in IGNORED_PARAMS}
+        h = hashlib.blake2b(digest_size=16)
+        h.update(func.__name__.encode("utf-8"))
+        h.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+        for fp in fingerprints:
+            h.update(fp)
+        return h.digest()
+
+    def call(self, func, token1, token2, symmetric=True, **params):
+        """func(token1, token2, **params), from the cache when it has been computed before"""
+        key = self.key(func, token1, token2, symmetric, **params)
+        value = self.lookup(key)
+        if value is MISSING:
+            value = func(token1, token2, **params)
+            self.store(key, value)
+        return value
+
+    def lookup(self, key):
+        """the value cached under key, or MISSING (counted as a miss)"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM distances WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    try:
+                        value = _loads(row[0])
+                    except ValueError:
+                        # not JSON (written by an older version): a miss, overwritten once computed
+                        value = MISSING
+                    if value is not MISSING:
+                        self.diskHits += 1
+                        self._store(key, value)
+                        return value
+            self.misses += 1
+            return MISSING
+
+    def store(self, key, value):
+        """caches value under key, for values computed elsewhere (on a process pool, say)"""
+        with self._lock:
+            self._store(key, value)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO distances VALUES (?, ?)", (key, _dumps(value)))
+                self._db.commit()
+
+    def _store(self, key, value):
+        """adds an entry to the in-memory LRU and evicts down to max_bytes. holds the lock"""
+        if key in self._entries:
+            return
+        self._entries[key] = value
+        self.bytes += len(key) + _sizeof(value)
+        while self.bytes > self.max_bytes and self._entries:
+            oldKey, oldValue = self._entries.popitem(last=False)
+            self.bytes -= len(oldKey) + _sizeof(oldValue)
+            self.evictions += 1
+
+    def levenshteinDistanceDP(self, token1, token2, **params):
+        return self.call(Music21Helper.levenshteinDistanceDP, token1, token2, **params)
+
+    def levenshteinBitParallel(self, token1, token2, **params):
+        return self.call(Music21Helper.levenshteinBitParallel, token1, token2, **params)
+
+    def lcsDP(self, token1, token2, traceback=False):
+        # a traceback lists positions in token1 then token2, so the order matters
+        return self.call(Music21Helper.lcsDP, token1, token2, symmetric=not traceback, traceback=traceback)
+
+    def lcsBitParallel(self, token1, token2, **params):
+        return self.call(Music21Helper.lcsBitParallel, token1, token2, **params)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """counters for sizing the cache"""
+        with self._lock:
+            lookups = self.hits + self.diskHits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.diskHits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.diskHits) / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        """empties the in-memory LRU (not the sqlite file)"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+# Compact integer encodings of note sequences for the DP engines in helpers.py.
+
+import numpy as np
+
+# music21 spells pitches read from MIDI with exactly these names, so for MIDI input a
+# pitch class maps back to the same letter name noteToLetterName would have produced
+PITCH_CLASS_NAMES = ['C', 'C#', 'D', 'E-', 'E', 'F', 'F#', 'G', 'G#', 'A', 'B-', 'B']
+
+# every spelled name music21 can give a pitch: 7 letters x 5 accidentals
+SPELLED_NAMES = [letter + accidental
+                 for letter in "CDEFGAB"
+                 for accidental in ("--", "-", "", "#", "##")]
+
+_LETTER_PITCH_CLASSES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+_PITCH_CLASS_CODES = {name: (_LETTER_PITCH_CLASSES[name[0]] + name.count("#") - name.count("-")) % 12
+                      for name in SPELLED_NAMES}
+_SPELLED_CODES = {name: code for code, name in enumerate(SPELLED_NAMES)}
+# spelled code -> pitch class code
+_SPELLED_PITCH_CLASSES = np.array([_PITCH_CLASS_CODES[name] for name in SPELLED_NAMES], dtype=np.uint8)
+
+ALPHABETS = ("pitchClass", "spelled", "interval", "pitchClassSet")
+
+# duration ratios are coded as round(RATIO_STEPS * log2(ratio)): 12 steps per doubling,
+# so 2:1 is 12, 3:2 is 7 and 1:1 is 0
+RATIO_STEPS = 12
+
+_DTYPES = {"pitchClass": np.uint8, "spelled": np.uint8, "interval": np.int8, "pitchClassSet": np.uint16}
+
+
+class EncodedPart():
+    """
+    one part as a numpy array of note codes, plus the part's name. no padding:
+    len(part) is the number of codes in the part.
+
+    alphabet "pitchClass" codes notes 0-11 (C=0), "spelled" codes them 0-34 by
+    SPELLED_NAMES so that enharmonics like F# and G- stay different; both are uint8.
+
+    alphabet "interval" codes the int8 signed semitone steps from each note to the next
+    (one fewer than there are notes), so a theme and its transposition to any key have
+    the same codes. ratios optionally holds, as int8, the ratio of each note's duration
+    to the previous note's (see RATIO_STEPS); two interval parts that both have ratios
+    only match where the interval and the ratio agree.
+
+    alphabet "pitchClassSet" codes each note or chord as the uint16 set of its pitch
+    classes, bit k set for pitch class k, so chords and double stops keep every tone.
+    two of them match when the sets overlap (see PitchClassSets).
+
+    levenshteinDistanceDP, lcsDP and the bit-parallel engines take EncodedParts directly
+    and compare the codes without re-encoding them.
+    """
+    __slots__ = ("codes", "name", "alphabet", "ratios")
+
+    def __init__(self, codes, name=None, alphabet="pitchClass", ratios=None):
+        if alphabet not in ALPHABETS:
+            raise ValueError("unknown alphabet: {}".format(alphabet))
+        if ratios is not None and alphabet != "interval":
+            raise ValueError("only interval parts have duration ratios")
+        self.codes = np.asarray(codes, dtype=_DTYPES[alphabet])
+        self.name = name
+        self.alphabet = alphabet
+        self.ratios = None if ratios is None else np.asarray(ratios, dtype=np.int8)
+
+    @classmethod
+    def fromLetterNames(cls, names, name=None, alphabet="pitchClass"):
+        """encodes a sequence of letter names such as noteToLetterName returns"""
+        if alphabet == "interval":
+            return cls.fromLetterNames(names, name).toIntervals()
+        if alphabet == "pitchClassSet":
+            return cls.fromLetterNames(names, name).toPitchClassSets()
+        table = _PITCH_CLASS_CODES if alphabet == "pitchClass" else _SPELLED_CODES
+        try:
+            codes = np.fromiter((table[n] for n in names), dtype=np.uint8, count=len(names))
+        except KeyError as e:
+            raise ValueError("not a letter name: {!r}".format(e.args[0]))
+        return cls(codes, name, alphabet)
+
+    @classmethod
+    def fromPitches(cls, pitches, name=None):
+        """encodes MIDI pitch numbers as pitch classes"""
+        return cls(np.asarray(pitches) % 12, name, "pitchClass")
+
+    @classmethod
+    def fromChords(cls, chords, name=None):
+        """encodes chords (lists of MIDI pitch numbers, one for a single note) as pitch class sets"""
+        sizes = np.fromiter((len(c) for c in chords), dtype=np.int64, count=len(chords))
+        pitches = np.fromiter((p for c in chords for p in c), dtype=np.int64, count=int(sizes.sum()))
+        return cls(chordMasks(pitches, sizes), name, "pitchClassSet")
+
+    @classmethod
+    def fromIntervals(cls, pitches, name=None, durations=None, fold=False):
+        """
+        encodes MIDI pitch numbers as the intervals between successive notes, and with
+        durations (quarter lengths) the ratios between successive durations too.
+        fold=True reduces every interval to -5..6 semitones, ignoring octaves, which is
+        all that letter names or pitch classes can tell
+        """
+        steps = np.diff(np.asarray(pitches, dtype=np.int16))
+        if fold:
+            steps = (steps + 5) % 12 - 5
+        ratios = None
+        if durations is not None:
+            # zero-length grace notes count as the shortest note music21 quantizes to
+            d = np.maximum(np.asarray(durations, dtype=np.float64), 1 / 12)
+            ratios = np.clip(np.round(RATIO_STEPS * np.diff(np.log2(d))), -127, 127)
+        return cls(np.clip(steps, -127, 127), name, "interval", ratios)
+
+    def toIntervals(self):
+        """this part's folded intervals (letter names don't know their octave)"""
+        if self.alphabet == "interval":
+            return self
+        if self.alphabet == "pitchClassSet":
+            raise ValueError("a pitch class set part has no intervals")
+        return EncodedPart.fromIntervals(self.pitchClasses(), self.name, fold=True)
+
+    def toPitchClassSets(self):
+        """this part with every note as a one-note pitch class set"""
+        if self.alphabet == "pitchClassSet":
+            return self
+        return EncodedPart(np.left_shift(1, self.pitchClasses().astype(np.uint16)), self.name, "pitchClassSet")
+
+    def pitchClasses(self):
+        """the codes as pitch classes 0-11, for the single note alphabets"""
+        if self.alphabet in ("interval", "pitchClassSet"):
+            raise ValueError("an {} part has no single pitch classes".format(self.alphabet))
+        if self.alphabet == "pitchClass":
+            return self.codes
+        return _SPELLED_PITCH_CLASSES[self.codes]
+
+    def letterNames(self):
+        if self.alphabet in ("interval", "pitchClassSet"):
+            raise ValueError("an {} part has no letter names".format(self.alphabet))
+        names = PITCH_CLASS_NAMES if self.alphabet == "pitchClass" else SPELLED_NAMES
+        return [names[c] for c in self.codes.tolist()]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.codes[i]
+
+    def __repr__(self):
+        what = "intervals" if self.alphabet == "interval" else "{} notes".format(self.alphabet)
+        return "<EncodedPart {!r}: {} {}>".format(self.name, len(self), what)
+
+
+def chordMasks(pitches, sizes):
+    """
+    uint16 pitch class set of each chord, from the MIDI pitches of all the chords one
+    after another and the number of pitches in each (at least one). one vectorized pass
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    if not len(sizes):
+        return np.zeros(0, dtype=np.uint16)
+    bits = np.left_shift(np.uint16(1), (np.asarray(pitches, dtype=np.int64) % 12).astype(np.uint16))
+    starts = np.concatenate(([0], np.cumsum(sizes[:-1])))
+    return np.bitwise_or.reduceat(bits, starts)
+
+
+class PitchClassSet(int):
+    """
+    one pitch class set mask as a python int, for the engines that compare tokens one at
+    a time: == means the two sets share a pitch class. (an empty set matches nothing,
+    not even itself, like the NaN padding of short parts.) hashes as the plain int
+    """
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return int(self) & int(other) != 0
+
+    def __ne__(self, other):
+        return int(self) & int(other) == 0
+
+    __hash__ = int.__hash__
+
+
+class PitchClassSets(np.ndarray):
+    """
+    uint16 pitch class set masks whose == and != compare by overlap, elementwise, so the
+    numpy engines need no special case. tolist() gives PitchClassSets for the python ones
+    """
+    def __eq__(self, other):
+        return (self.view(np.ndarray) & np.asarray(other)) != 0
+
+    def __ne__(self, other):
+        return (self.view(np.ndarray) & np.asarray(other)) == 0
+
+    def tolist(self):
+        return [PitchClassSet(c) for c in self.view(np.ndarray).tolist()]
+
+
+def substitutionMatrix(alphabet="pitchClass", match=2, enharmonic=1, neighbour=-1, mismatch=-2):
+    """
+    square matrix of alignment scores indexed by the codes of two notes, for
+    Music21Helper.smithWaterman: match for the same note, enharmonic for two spellings
+    of one pitch class ("spelled" alphabet only), neighbour for notes a semitone or
+    whole tone apart, mismatch otherwise
+    """
+    if alphabet == "pitchClass":
+        pcs = np.arange(12)
+        same = pcs[:, None] == pcs[None, :]
+        enharmonics = np.zeros((12, 12), dtype=bool)
+    elif alphabet == "spelled":
+        pcs = _SPELLED_PITCH_CLASSES.astype(np.int64)
+        codes = np.arange(len(SPELLED_NAMES))
+        same = codes[:, None] == codes[None, :]
+        enharmonics = (pcs[:, None] == pcs[None, :]) & ~same
+    else:
+        raise ValueError("no substitution matrix for the {} alphabet".format(alphabet))
+    steps = np.abs(pcs[:, None] - pcs[None, :]) % 12
+    neighbours = np.isin(np.minimum(steps, 12 - steps), (1, 2))
+    matrix = np.full(same.shape, mismatch)
+    matrix[neighbours] = neighbour
+    matrix[enharmonics] = enharmonic
+    matrix[same] = match
+    return matrix
+
+
+def comparableTokens(token1, token2):
+    """
+    returns the two sequences in a form the DP engines can compare token by token:
+    the code arrays of two EncodedParts with the same alphabet (for interval parts that
+    both have duration ratios, interval and ratio packed into one code), otherwise the
+    inputs with any EncodedPart decoded back to letter names, or to plain ints for
+    interval parts.
+
+    when either is a pitch class set part, both become PitchClassSets (single notes and
+    letter names as one-note sets), which match by overlap
+    """
+    encoded1 = isinstance(token1, EncodedPart)
+    encoded2 = isinstance(token2, EncodedPart)
+    if (encoded1 and token1.alphabet == "pitchClassSet") or (encoded2 and token2.alphabet == "pitchClassSet"):
+        return _pitchClassSets(token1), _pitchClassSets(token2)
+    if encoded1 and encoded2 and token1.alphabet == token2.alphabet:
+        if token1.ratios is not None and token2.ratios is not None:
+            pack = lambda part: part.codes.astype(np.int32) * 256 + part.ratios
+            return pack(token1), pack(token2)
+        return token1.codes, token2.codes
+    if encoded1 and encoded2 and "interval" in (token1.alphabet, token2.alphabet):
+        raise ValueError("can't compare interval and note parts, convert with toIntervals()")
+    if encoded1:
+        token1 = token1.codes.tolist() if token1.alphabet == "interval" else token1.letterNames()
+    if encoded2:
+        token2 = token2.codes.tolist() if token2.alphabet == "interval" else token2.letterNames()
+    return token1, token2
+
+
+def _pitchClassSets(tokens):
+    """an EncodedPart or a sequence of letter names as PitchClassSets"""
+    if not isinstance(tokens, EncodedPart):
+        tokens = EncodedPart.fromLetterNames(list(tokens))
+    return tokens.toPitchClassSets().codes.view(PitchClassSets)
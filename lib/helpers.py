@@ -1,11 +1,46 @@
 # -*- coding: utf-8 -*-
 
 # Helper class for doing interesting things with music21
+#
+# music21 is only imported by the methods that handle its streams and notes: the
+# comparisons work on encoded parts, and a run that reads them from the score cache
+# or the MIDI events never pays for importing it.
 
-from music21 import chord, pitch
 import numpy as np
 import random
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+from encoding import EncodedPart, PitchClassSets, chordMasks, comparableTokens
+
+def _plain(tokens):
+    """numpy arrays become lists: indexing and comparing numpy scalars one at a time is slow"""
+    return tokens.tolist() if isinstance(tokens, np.ndarray) else tokens
+
+class _OverlapMasks(dict):
+    """
+    matchMasks of a pitch class set pattern: a token matches every position whose set
+    it overlaps, so its mask is the OR of the masks of its pitch classes. built per
+    token on first use
+    """
+    def __init__(self, pattern):
+        super().__init__()
+        codes = pattern.view(np.ndarray).astype(np.uint16)
+        self.byPitchClass = []
+        for pc in range(12):
+            bits = np.packbits(((codes >> pc) & 1).astype(np.uint8), bitorder="little")
+            self.byPitchClass.append(int.from_bytes(bits.tobytes(), "little"))
+
+    def get(self, token, default=0):
+        mask = dict.get(self, token)
+        if mask is None:
+            mask = 0
+            token = int(token)
+            for pc in range(12):
+                if token >> pc & 1:
+                    mask |= self.byPitchClass[pc]
+            self[token] = mask
+        return mask or default
 
 class Music21Helper():
     def __init__(self):
@@ -49,6 +84,8 @@ class Music21Helper():
 
     @staticmethod
     def noteToLetterName(note_matrix):
+        from music21 import chord
+
         aux = []
         for i in range(len(note_matrix)):
             row = []
@@ -62,7 +99,114 @@ class Music21Helper():
         return aux
 
     @staticmethod
-    def levenshteinDistanceDP(token1, token2, printDistances=False):
+    def noteToPitches(note_matrix):
+        """
+        like noteToLetterName, but the MIDI pitch numbers (of the root, for chords),
+        for encoding.EncodedPart.fromIntervals
+        """
+        from music21 import chord
+
+        aux = []
+        for i in range(len(note_matrix)):
+            row = []
+            for j in range(len(note_matrix[i])):
+                if isinstance(note_matrix[i][j], chord.Chord):
+                    nt = note_matrix[i][j]._findRoot().midi
+                else:
+                    nt = note_matrix[i][j].pitch.midi
+                row.append(nt)
+            aux.append(row)
+        return aux
+
+    @staticmethod
+    def noteToPitchClassSets(note_matrix):
+        """
+        every note and chord of note_matrix as the uint16 set of all its pitch classes
+        (see encoding.chordMasks), one array per part. keeps every chord tone where
+        noteToLetterName keeps the root, and never has to work out which one that is
+        """
+        from music21 import chord
+
+        aux = []
+        for row in note_matrix:
+            sizes = []
+            pitches = []
+            for nt in row:
+                if isinstance(nt, chord.Chord):
+                    chordPitches = nt.pitches
+                    sizes.append(len(chordPitches))
+                    pitches.extend(p.midi for p in chordPitches)
+                else:
+                    sizes.append(1)
+                    pitches.append(nt.pitch.midi)
+            aux.append(chordMasks(pitches, sizes))
+        return aux
+
+    @staticmethod
+    def noteToDurations(note_matrix):
+        """the quarter length of every note in note_matrix"""
+        return [[float(nt.duration.quarterLength) for nt in row] for row in note_matrix]
+
+    @staticmethod
+    def encodeTokens(*sequences):
+        """
+        maps every token (note name, character, ...) of the given sequences to a small
+        integer code so the DP engines can compare whole numpy rows at once.
+        the vocabulary is shared, so equal tokens get equal codes across sequences.
+        tokens that don't equal themselves (the NaN padding pandas adds to short parts)
+        each get their own code, so they never match anything - same as `==` would.
+        returns one np.int32 array per input sequence
+        """
+        # integer codes (e.g. EncodedPart.codes) are already a shared vocabulary
+        if all(isinstance(seq, np.ndarray) and seq.dtype.kind in "iu" for seq in sequences):
+            return [seq.astype(np.int32) for seq in sequences]
+        vocab = {}
+        unmatched = -1
+        encoded = []
+        for seq in sequences:
+            codes = np.empty(len(seq), dtype=np.int32)
+            for i, token in enumerate(seq):
+                if token != token:
+                    codes[i] = unmatched
+                    unmatched -= 1
+                else:
+                    codes[i] = vocab.setdefault(token, len(vocab))
+            encoded.append(codes)
+        return encoded
+
+    @staticmethod
+    def levenshteinDistanceDP(token1, token2, printDistances=False, engine="python", max_distance=None):
+        """
+        edit distance between two token sequences.
+        engine="python" fills the full (m+1)x(n+1) matrix cell by cell (and can print it).
+        engine="numpy" integer-encodes the tokens and computes the matrix a row at a time,
+        keeping only two rows; same distance, orders of magnitude faster on long parts.
+
+        max_distance=k only computes the diagonal band of width 2k+1 (Ukkonen) and gives up
+        as soon as a whole row exceeds k. any distance above k is reported as k + 1,
+        so `levenshteinDistanceDP(a, b, max_distance=k) > k` means "further apart than k"
+
+        tokens can be strings, lists, pd.Series or encoding.EncodedParts. every engine
+        returns an int. only the full python matrix can be printed
+        """
+        if engine not in ("python", "numpy"):
+            raise ValueError("unknown engine: {}".format(engine))
+        if printDistances and (engine != "python" or max_distance is not None):
+            raise ValueError("printDistances needs engine=\"python\" without max_distance, the only one that keeps the whole matrix")
+        token1, token2 = comparableTokens(token1, token2)
+        if max_distance is not None:
+            if max_distance < 0:
+                raise ValueError("max_distance must be non-negative")
+            if engine == "numpy":
+                codes1, codes2 = Music21Helper.encodeTokens(token1, token2)
+                return int(Music21Helper._levenshteinBandedRows(codes1, codes2, max_distance))
+            return int(Music21Helper._levenshteinBanded(_plain(token1), _plain(token2), max_distance))
+        if engine == "numpy":
+            codes1, codes2 = Music21Helper.encodeTokens(token1, token2)
+            return int(Music21Helper._levenshteinRows(codes1, codes2))
+        token1 = _plain(token1)
+        token2 = _plain(token2)
+
         distances = np.zeros((len(token1) + 1, len(token2) + 1))
 
         for t1 in range(len(token1) + 1):
@@ -86,8 +230,238 @@ class Music21Helper():
                     
                     distances[t1][t2] = min([a,b,c]) + 1
         if printDistances:
-            printDistances(distances, len(token1), len(token2))
-        return distances[len(token1)][len(token2)]
+            Music21Helper.printDistances(distances, len(token1), len(token2))
+        return int(distances[len(token1)][len(token2)])
+
+    @staticmethod
+    def _levenshteinRows(codes1, codes2):
+        """
+        row-at-a-time levenshtein over two integer code arrays.
+        within a row, the substitution/deletion candidates only depend on the previous row:
+            tmp[j] = min(prev[j-1] + cost, prev[j] + 1)
+        and the insertion chain row[j] = min(tmp[j], row[j-1] + 1) unrolls to
+            row[j] = min over k <= j of tmp[k] + (j - k)
+        which is a running minimum of (tmp - j), shifted back by j
+        """
+        # loop over the shorter sequence, vectorize over the longer one
+        if len(codes1) > len(codes2):
+            codes1, codes2 = codes2, codes1
+        n = len(codes2)
+        offsets = np.arange(n + 1, dtype=np.int64)
+        prev = offsets.copy()
+        tmp = np.empty(n + 1, dtype=np.int64)
+        for i in range(1, len(codes1) + 1):
+            cost = codes2 != codes1[i - 1]
+            tmp[0] = i
+            np.minimum(prev[:-1] + cost, prev[1:] + 1, out=tmp[1:])
+            tmp -= offsets
+            prev = np.minimum.accumulate(tmp)
+            prev += offsets
+        return int(prev[n])
+
+    @staticmethod
+    def _levenshteinBanded(token1, token2, k):
+        """
+        cell-by-cell levenshtein restricted to the band |i - j| <= k, two rows of memory.
+        cells outside the band (and any value above k) are held at k + 1, which is all
+        the caller needs to know about them. O(k * n)
+        """
+        m = len(token1)
+        n = len(token2)
+        over = k + 1
+        # the corner cell sits |m - n| diagonals away from the main one
+        if abs(m - n) > k:
+            return over
+
+        prev = [min(j, over) for j in range(n + 1)]
+        curr = [over] * (n + 1)
+        for i in range(1, m + 1):
+            lo = max(1, i - k)
+            hi = min(n, i + k)
+            curr[lo - 1] = min(i, over) if lo == 1 else over
+            rowMin = curr[lo - 1]
+            t1 = token1[i - 1]
+            for j in range(lo, hi + 1):
+                if t1 == token2[j - 1]:
+                    d = prev[j - 1]
+                else:
+                    d = min(prev[j - 1], prev[j], curr[j - 1]) + 1
+                    if d > over:
+                        d = over
+                curr[j] = d
+                if d < rowMin:
+                    rowMin = d
+            # the next row reads one cell past the end of this row's band
+            if hi < n:
+                curr[hi + 1] = over
+            if rowMin > k:
+                return over
+            prev, curr = curr, prev
+        return prev[n]
+
+    @staticmethod
+    def _levenshteinBandedRows(codes1, codes2, k):
+        """
+        the band of _levenshteinBanded computed with the row-vectorized numpy update of
+        _levenshteinRows, applied to the band slice of each row only
+        """
+        m = len(codes1)
+        n = len(codes2)
+        over = k + 1
+        if abs(m - n) > k:
+            return over
+
+        prev = np.minimum(np.arange(n + 1, dtype=np.int64), over)
+        curr = np.full(n + 1, over, dtype=np.int64)
+        offsets = np.arange(n + 1, dtype=np.int64)
+        for i in range(1, m + 1):
+            lo = max(1, i - k)
+            hi = min(n, i + k)
+            seg = np.empty(hi - lo + 2, dtype=np.int64)
+            seg[0] = min(i, over) if lo == 1 else over
+            cost = codes2[lo - 1:hi] != codes1[i - 1]
+            np.minimum(prev[lo - 1:hi] + cost, prev[lo:hi + 1] + 1, out=seg[1:])
+            seg -= offsets[:len(seg)]
+            seg = np.minimum.accumulate(seg)
+            seg += offsets[:len(seg)]
+            np.minimum(seg, over, out=curr[lo - 1:hi + 1])
+            if hi < n:
+                curr[hi + 1] = over
+            if curr[lo - 1:hi + 1].min() > k:
+                return over
+            prev, curr = curr, prev
+        return int(prev[n])
+
+    @staticmethod
+    def matchMasks(pattern):
+        """
+        per-symbol match masks for the bit-parallel engines: bit i of masks[token] is set
+        when pattern[i] == token. build once per pattern and pass it as `masks` to reuse.
+        python ints are arbitrary precision, so a pattern of any length is handled as
+        one multi-word bit vector (processed a machine word at a time by CPython)
+        """
+        if isinstance(pattern, EncodedPart):
+            # the codes the engines will compare, ratios packed in and all
+            pattern = comparableTokens(pattern, pattern)[0]
+        if isinstance(pattern, PitchClassSets):
+            return _OverlapMasks(pattern)
+        masks = {}
+        for i, token in enumerate(_plain(pattern)):
+            if token != token:
+                continue
+            masks[token] = masks.get(token, 0) | (1 << i)
+        return masks
+
+    @staticmethod
+    def levenshteinBitParallel(token1, token2, masks=None):
+        """
+        Myers' bit-vector edit distance (Hyyro's formulation). token1 is the pattern held
+        in the bit vectors, token2 is scanned one token at a time, so the cost is
+        O(len(token2) * len(token1) / wordsize). same distance as levenshteinDistanceDP.
+        pass masks=matchMasks(token1) to reuse a pattern across many comparisons
+        """
+        token1, token2 = comparableTokens(token1, token2)
+        if masks is None:
+            # fewer python-level iterations when the longer sequence is the bit vector
+            if len(token2) > len(token1):
+                token1, token2 = token2, token1
+            masks = Music21Helper.matchMasks(token1)
+        return Music21Helper._myersScan(masks, len(token1), _plain(token2))
+
+    @staticmethod
+    def _myersScan(masks, m, token2):
+        """levenshteinBitParallel once the pattern's masks and length are known"""
+        if m == 0:
+            return len(token2)
+
+        full = (1 << m) - 1
+        last = 1 << (m - 1)
+        # vertical deltas of the current column: all +1 for the first column
+        pv = full
+        mv = 0
+        score = m
+        for token in token2:
+            eq = masks.get(token, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | (~(xh | pv) & full)
+            mh = pv & xh
+            if ph & last:
+                score += 1
+            elif mh & last:
+                score -= 1
+            # the top row of the matrix grows by one every column
+            ph = ((ph << 1) | 1) & full
+            mh = (mh << 1) & full
+            pv = mh | (~(xv | ph) & full)
+            mv = ph & xv
+        return score
+
+    @staticmethod
+    def lcsBitParallel(token1, token2, masks=None):
+        """
+        Allison-Dix / Hyyro bit-vector LCS length. token1 is the pattern held in the bit
+        vector, zero bits of V mark the pattern positions matched so far.
+        same length as lcsDP, O(len(token2) * len(token1) / wordsize).
+        pass masks=matchMasks(token1) to reuse a pattern across many comparisons
+        """
+        token1, token2 = comparableTokens(token1, token2)
+        if masks is None:
+            if len(token2) > len(token1):
+                token1, token2 = token2, token1
+            masks = Music21Helper.matchMasks(token1)
+        return Music21Helper._allisonDixScan(masks, len(token1), _plain(token2))
+
+    @staticmethod
+    def _allisonDixScan(masks, m, token2):
+        """lcsBitParallel once the pattern's masks and length are known"""
+        full = (1 << m) - 1
+        v = full
+        for token in token2:
+            u = v & masks.get(token, 0)
+            v = ((v + u) | (v - u)) & full
+        return m - bin(v).count("1")
+
+    @staticmethod
+    def batchDistances(query, targets, metric="levenshtein", workers=1, executor=None, chunksize=64):
+        """
+        scores one query against many targets: levenshtein distances (metric="levenshtein")
+        or lcs lengths (metric="lcs"), as an int64 numpy array in the order of targets.
+        same scores as levenshteinBitParallel / lcsBitParallel, but the query is encoded
+        and its match masks are built once, not once per target.
+
+        workers > 1 scores chunks of `chunksize` targets on a ProcessPoolExecutor with
+        that many processes; or pass any concurrent.futures executor to use instead
+        """
+        if metric not in ("levenshtein", "lcs"):
+            raise ValueError("unknown metric: {}".format(metric))
+        # the query, as compared with each target (letter names against a list of names,
+        # codes against an EncodedPart, ...): masks for each form it takes
+        patterns = []
+        forms = {}
+        items = []
+        for target in targets:
+            pattern, target = comparableTokens(query, target)
+            form = (type(pattern), getattr(pattern, "dtype", None))
+            if form not in forms:
+                forms[form] = len(patterns)
+                patterns.append((Music21Helper.matchMasks(pattern), len(pattern)))
+            items.append((forms[form], target))
+
+        if workers == 1 and executor is None:
+            return np.array(Music21Helper._scoreTargets(patterns, metric, items), dtype=np.int64)
+        if executor is None:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                return Music21Helper.batchDistances(query, targets, metric, executor=pool, chunksize=chunksize)
+        chunks = [items[i:i + chunksize] for i in range(0, len(items), chunksize)]
+        scores = executor.map(Music21Helper._scoreTargets, [patterns] * len(chunks), [metric] * len(chunks), chunks)
+        return np.array([score for chunk in scores for score in chunk], dtype=np.int64)
+
+    @staticmethod
+    def _scoreTargets(patterns, metric, items):
+        """scores of (pattern number, target tokens) items, a batchDistances task"""
+        scan = Music21Helper._myersScan if metric == "levenshtein" else Music21Helper._allisonDixScan
+        return [scan(patterns[form][0], patterns[form][1], _plain(target)) for form, target in items]
 
     @staticmethod
     def printDistances(distances, token1Length, token2Length):
@@ -97,26 +471,201 @@ class Music21Helper():
             print()
 
     @staticmethod
-    def lcsDP(token1, token2): 
-        # find the length of the strings 
-        m = len(token1) 
-        n = len(token2) 
-    
-        # declaring the array for storing the dp values 
-        L = [[None]*(n+1) for i in range(m+1)] 
-    
-        # build L by computing values from the bottom up
-        for i in range(m+1): 
-            for j in range(n+1): 
-                if i == 0 or j == 0 : 
-                    L[i][j] = 0
-                elif token1[i-1] == token2[j-1]: 
-                    L[i][j] = L[i-1][j-1]+1
-                else: 
-                    L[i][j] = max(L[i-1][j] , L[i][j-1]) 
-        # return the value of the bottom right corner of the array
+    def lcsDP(token1, token2, traceback=False):
+        """
+        length of the longest common subsequence of two token sequences.
+        only two rows of the DP table are kept, laid over the shorter sequence,
+        so memory is O(min(m, n)) instead of a full (m+1)x(n+1) table.
+
+        with traceback=True, uses Hirschberg's divide and conquer (still linear space)
+        to recover the subsequence itself and returns a tuple
+            (subsequence, positions1, positions2)
+        where subsequence[k] == token1[positions1[k]] == token2[positions2[k]]
+        """
+        token1, token2 = comparableTokens(token1, token2)
+        token1 = _plain(token1)
+        token2 = _plain(token2)
+        if traceback:
+            return Music21Helper.lcsTraceback(token1, token2)
+
+        # find the length of the strings, keeping the row over the shorter one
+        if len(token1) < len(token2):
+            token1, token2 = token2, token1
+        n = len(token2)
+
+        # build the rows from the top down; the last row holds the LCS lengths of
+        # all of token1 against every prefix of token2
+        row = Music21Helper._lcsLastRow(token1, token2)
+        # return the value of the bottom right corner of the table
         # this contains the length of the LCS if we consider both complete strings
-        return L[m][n] 
+        return row[n]
+
+    @staticmethod
+    def _lcsLastRow(token1, token2):
+        """
+        returns the last row of the LCS table of token1 against token2, i.e. a list L
+        where L[j] is the LCS length of token1 and token2[:j]. two rows of memory
+        """
+        n = len(token2)
+        prev = [0] * (n + 1)
+        for i in range(len(token1)):
+            curr = [0] * (n + 1)
+            t1 = token1[i]
+            for j in range(1, n + 1):
+                if t1 == token2[j-1]:
+                    curr[j] = prev[j-1] + 1
+                else:
+                    curr[j] = max(prev[j], curr[j-1])
+            prev = curr
+        return prev
+
+    @staticmethod
+    def lcsTraceback(token1, token2):
+        """
+        Hirschberg's algorithm: recovers one longest common subsequence in linear space.
+        token1 is halved, the forward and reversed LCS rows of each half against token2
+        give the best split point of token2, and each half is solved recursively.
+        returns (subsequence, positions1, positions2)
+        """
+        token1, token2 = comparableTokens(token1, token2)
+        token1 = list(_plain(token1))
+        token2 = list(_plain(token2))
+        positions1 = []
+        positions2 = []
+
+        def solve(lo1, hi1, lo2, hi2):
+            if lo1 >= hi1 or lo2 >= hi2:
+                return
+            if hi1 - lo1 == 1:
+                t1 = token1[lo1]
+                for j in range(lo2, hi2):
+                    if token2[j] == t1:
+                        positions1.append(lo1)
+                        positions2.append(j)
+                        return
+                return
+            mid = (lo1 + hi1) // 2
+            forward = Music21Helper._lcsLastRow(token1[lo1:mid], token2[lo2:hi2])
+            backward = Music21Helper._lcsLastRow(token1[mid:hi1][::-1], token2[lo2:hi2][::-1])
+            n = hi2 - lo2
+            split = max(range(n + 1), key=lambda k: forward[k] + backward[n - k])
+            solve(lo1, mid, lo2, lo2 + split)
+            solve(mid, hi1, lo2 + split, hi2)
+
+        solve(0, len(token1), 0, len(token2))
+        subsequence = [token1[i] for i in positions1]
+        return subsequence, positions1, positions2
+
+    @staticmethod
+    def smithWaterman(token1, token2, substitution=None, match=2, mismatch=-2, gap=-3, top=None, minScore=1):
+        """
+        Smith-Waterman local alignment: the best scoring pair of stretches of token1 and
+        token2, for finding a theme two long parts share when the parts as a whole differ.
+        aligned tokens score substitution[code1, code2] (a square matrix indexed by the
+        codes of two EncodedParts, see encoding.substitutionMatrix) or else match /
+        mismatch, and every gap scores gap (negative). the defaults make an unrelated
+        stretch score less than nothing even over the small alphabets notes and intervals
+        have, so alignments stay local.
+
+        computed a row at a time with numpy, in linear space: every cell carries where its
+        alignment started along with its score. returns
+            (score, (start1, end1), (start2, end2))
+        with token1[start1:end1] aligned to token2[start2:end2], or None when nothing
+        scores at least minScore. with top=k returns a list of up to k such hits, best
+        first, none of them overlapping another in either sequence (Waterman-Eggert:
+        the tokens of each hit are blocked before looking for the next one)
+        """
+        if gap >= 0:
+            raise ValueError("gap must be negative")
+        token1, token2 = comparableTokens(token1, token2)
+        if substitution is not None:
+            substitution = np.asarray(substitution)
+            codes1, codes2 = np.asarray(token1, dtype=np.int64), np.asarray(token2, dtype=np.int64)
+            for codes in (codes1, codes2):
+                if len(codes) and (codes.min() < 0 or codes.max() >= len(substitution)):
+                    raise ValueError("substitution matrix doesn't cover the codes of these tokens")
+        else:
+            codes1, codes2 = Music21Helper.encodeTokens(token1, token2)
+
+        # loop over the shorter sequence, vectorize over the longer one
+        swapped = len(codes1) > len(codes2)
+        if swapped:
+            codes1, codes2 = codes2, codes1
+            if substitution is not None:
+                substitution = substitution.T
+        used1 = np.zeros(len(codes1), dtype=bool)
+        used2 = np.zeros(len(codes2), dtype=bool)
+
+        hits = []
+        for k in range(1 if top is None else top):
+            hit = Music21Helper._smithWatermanPass(codes1, codes2, substitution, match, mismatch, gap, used1, used2)
+            if hit is None or hit[0] < minScore:
+                break
+            score, (start1, end1), (start2, end2) = hit
+            used1[start1:end1] = True
+            used2[start2:end2] = True
+            if swapped:
+                hit = (score, (start2, end2), (start1, end1))
+            hits.append(hit)
+        if top is None:
+            return hits[0] if hits else None
+        return hits
+
+    @staticmethod
+    def _smithWatermanPass(codes1, codes2, substitution, match, mismatch, gap, used1, used2):
+        """
+        one linear-space Smith-Waterman pass over codes1 (rows) and codes2 (columns),
+        with the rows in used1 and columns in used2 blocked. within a row, after
+            t[j] = max(0, prev[j-1] + s(i, j), prev[j] + gap)
+        the gap chain row[j] = max(t[j], row[j-1] + gap) unrolls to
+            row[j] = max over k <= j of t[k] + (j - k) * gap
+        a running maximum of (t - j * gap), shifted back by j * gap, whose argmax also
+        says which t[k] (and so which start) each cell inherits
+        """
+        n = len(codes2)
+        dtype = np.result_type(np.int64, gap, match, mismatch, *(() if substitution is None else (substitution.dtype,)))
+        columns = np.arange(n)
+        steps = columns * gap
+        # where each cell's alignment started, as start1 * (n + 1) + start2
+        width = n + 1
+        prev = np.zeros(width, dtype=dtype)
+        prevStart = np.zeros(width, dtype=np.int64)
+        # one row of substitution scores per distinct code of codes1
+        rows = {}
+        best = None
+        for i in range(1, len(codes1) + 1):
+            code = codes1[i - 1]
+            scores = rows.get(code)
+            if scores is None:
+                if substitution is not None:
+                    scores = substitution[code, codes2]
+                else:
+                    scores = np.where(codes2 == code, match, mismatch)
+                rows[code] = scores
+            # an alignment that starts here starts at (i-1, j-1)
+            diag = prev[:-1] + scores
+            diagStart = np.where(prev[:-1] <= 0, (i - 1) * width + columns, prevStart[:-1])
+            up = prev[1:] + gap
+            fromDiag = diag >= up
+            t = np.maximum(np.maximum(diag, up, out=up), 0, out=up)
+            tStart = np.where(fromDiag, diagStart, prevStart[1:])
+
+            t -= steps
+            running = np.maximum.accumulate(t)
+            source = np.maximum.accumulate(np.where(t == running, columns, 0))
+            running += steps
+            if used1[i - 1]:
+                running[:] = 0
+            running[used2] = 0
+
+            j = int(np.argmax(running))
+            if running[j] > 0 and (best is None or running[j] > best[0]):
+                start1, start2 = divmod(int(tStart[source[j]]), width)
+                best = (running[j].item(), (start1, i), (start2, j + 1))
+
+            prev[1:] = running
+            prevStart[1:] = tStart[source]
+        return best
 
     @staticmethod
     def selectFile(directory):
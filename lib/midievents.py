@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+
+# Reads note events straight out of a Standard MIDI File into numpy arrays,
+# without building any music21 objects.
+#
+# MidiEvents.read(path).tracks[i].notes gives the raw notes of a track as a structured
+# array of (onset tick, pitch, velocity, duration in ticks, channel).
+# MidiEvents.letterNames() additionally replays what music21's midiFileToStream does to
+# those notes - grouping simultaneous notes into chords, quantizing to 16ths/triplet 8ths,
+# splitting notes across barlines - so it returns the same sequences as
+# Music21Helper.noteToLetterName(Music21Helper().streamToMatrix(stream)).
+
+import struct
+
+import numpy as np
+
+from encoding import PITCH_CLASS_NAMES, EncodedPart, chordMasks
+
+NOTE_DTYPE = np.dtype([
+    ("onset", np.int64),
+    ("pitch", np.uint8),
+    ("velocity", np.uint8),
+    ("duration", np.int64),
+    ("channel", np.uint8),
+])
+
+# diatonic step (C=0 ... B=6) of music21's spelling of each pitch class (see
+# encoding.PITCH_CLASS_NAMES), needed to find chord roots
+PITCH_CLASS_STEPS = [0, 0, 1, 2, 2, 3, 3, 4, 4, 5, 6, 6]
+
+# music21 quantizes offsets and durations to 16ths or triplet 8ths, whichever is closer
+QUANTIZATION_DIVISORS = (4, 3)
+# quantized times are kept as integer multiples of 1/12 quarter note
+UNITS_PER_QUARTER = 12
+
+
+class MidiTrackEvents():
+    """the notes, name and time signatures of one MTrk chunk"""
+    __slots__ = ("name", "notes", "timeSignatures")
+
+    def __init__(self, name, notes, timeSignatures):
+        self.name = name
+        self.notes = notes
+        # list of (tick, numerator, denominator)
+        self.timeSignatures = timeSignatures
+
+    def hasNotes(self):
+        return len(self.notes) > 0
+
+
+def _readVarLen(data, pos):
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, pos
+
+
+def parseTrack(data):
+    """
+    decodes the events of one MTrk chunk. note-ons are paired with the first matching
+    note-off that follows them (a note-on with velocity 0 counts as a note-off), the same
+    rule music21 uses; unmatched note-ons are dropped. notes come out in note-on order
+    """
+    tick = 0
+    pos = 0
+    status = 0
+    name = None
+    timeSignatures = []
+    # (channel, pitch) -> note-on indexes still waiting for their note-off
+    pending = {}
+    onsets, pitches, velocities, channels = [], [], [], []
+    offs = []
+    end = len(data)
+    while pos < end:
+        delta, pos = _readVarLen(data, pos)
+        tick += delta
+        byte = data[pos]
+        if byte == 0xFF:
+            kind = data[pos + 1]
+            length, pos = _readVarLen(data, pos + 2)
+            payload = data[pos:pos + length]
+            pos += length
+            if kind in (0x03, 0x04) and name is None:
+                name = payload.decode("utf-8", errors="replace").rstrip("\x00")
+            elif kind == 0x58 and length >= 2:
+                timeSignatures.append((tick, payload[0], 2 ** payload[1]))
+            elif kind == 0x2F:
+                break
+            continue
+        if byte in (0xF0, 0xF7):
+            length, pos = _readVarLen(data, pos + 1)
+            pos += length
+            continue
+        if byte & 0x80:
+            status = byte
+            pos += 1
+        # otherwise running status: byte is already the first data byte
+        kind = status & 0xF0
+        if kind in (0xC0, 0xD0):
+            pos += 1
+            continue
+        d1 = data[pos]
+        d2 = data[pos + 1]
+        pos += 2
+        if kind == 0x90 and d2 > 0:
+            key = (status & 0x0F, d1)
+            pending.setdefault(key, []).append(len(onsets))
+            onsets.append(tick)
+            pitches.append(d1)
+            velocities.append(d2)
+            channels.append(status & 0x0F)
+            offs.append(-1)
+        elif kind == 0x80 or kind == 0x90:
+            waiting = pending.get((status & 0x0F, d1))
+            if waiting:
+                offs[waiting.pop(0)] = tick
+
+    notes = np.empty(len(onsets), dtype=NOTE_DTYPE)
+    notes["onset"] = onsets
+    notes["pitch"] = pitches
+    notes["velocity"] = velocities
+    notes["channel"] = channels
+    offs = np.array(offs, dtype=np.int64)
+    notes["duration"] = offs - notes["onset"]
+    return MidiTrackEvents(name, notes[offs >= 0], timeSignatures)
+
+
+class MidiEvents():
+    """
+    all tracks of a Standard MIDI File
+
+    events = MidiEvents.read("data/mozsq1.mid")
+    events.partNames()     # ['Violino I', 'Violino II', 'Viola', 'Cello']
+    events.letterNames()   # same as noteToLetterName on the music21 stream
+    """
+    def __init__(self, ticksPerQuarter, tracks):
+        self.ticksPerQuarter = ticksPerQuarter
+        self.tracks = tracks
+
+    @classmethod
+    def read(cls, path):
+        """parses a MIDI file"""
+        with open(path, "rb") as f:
+            return cls.parse(f.read())
+
+    @classmethod
+    def parse(cls, data):
+        if data[:4] != b"MThd":
+            raise ValueError("not a Standard MIDI File")
+        headerLength, = struct.unpack(">I", data[4:8])
+        unused_format, trackCount, division = struct.unpack(">HHH", data[8:14])
+        if division & 0x8000:
+            raise ValueError("SMPTE time division is not supported")
+
+        parsed = []
+        pos = 8 + headerLength
+        index = 0
+        while pos + 8 <= len(data) and index < trackCount:
+            chunkId = data[pos:pos + 4]
+            length, = struct.unpack(">I", data[pos + 4:pos + 8])
+            body = data[pos + 8:pos + 8 + length]
+            pos += 8 + length
+            if chunkId != b"MTrk":
+                continue
+            parsed.append(parseTrack(body))
+            index += 1
+        return cls(division, parsed)
+
+    def parts(self):
+        """the tracks music21 turns into parts: the ones with notes"""
+        return [t for t in self.tracks if t.hasNotes()]
+
+    def partNames(self):
+        return [t.name for t in self.parts()]
+
+    def _timeSignatures(self):
+        """
+        (offset in 1/12 quarters, bar length in 1/12 quarters) of each time signature,
+        taken from the conductor tracks (the ones without notes) as music21 does
+        """
+        conductor = [ts for t in self.tracks if not t.hasNotes() for ts in t.timeSignatures]
+        if not conductor:
+            conductor = [ts for t in self.parts() for ts in t.timeSignatures[:1]][:1]
+        offsets = _quantize([tick for tick, unused_num, unused_den in conductor], self.ticksPerQuarter)[0]
+        signatures = sorted((int(o), UNITS_PER_QUARTER * 4 * num // den)
+                            for o, (unused_tick, num, den) in zip(offsets, conductor))
+        if not signatures or signatures[0][0] > 0:
+            signatures.insert(0, (0, UNITS_PER_QUARTER * 4))
+        return signatures
+
+    def noteSequence(self, track):
+        """
+        replays music21's MIDI import for one track. returns (offsets, durations, chords)
+        for the notes and chords in the order part.flat.notes would list them:
+        offsets and durations in quarter lengths, chords a list of MIDI pitch lists
+        """
+        elements = _groupChords(track.notes, self.ticksPerQuarter)
+        offsets, durations = _quantizeElements(elements, self.ticksPerQuarter)
+        offsets, durations, index = _splitAtBarlines(offsets, durations, self._timeSignatures())
+        chords = [elements[i][3] for i in index.tolist()]
+        return offsets / UNITS_PER_QUARTER, durations / UNITS_PER_QUARTER, chords
+
+    def rootPitches(self):
+        """one uint8 array per part of the MIDI pitch of each note, or the root for chords"""
+        return [chordRoots(self.noteSequence(t)[2]) for t in self.parts()]
+
+    def letterNames(self):
+        """one list of letter names per part, matching noteToLetterName"""
+        return [[PITCH_CLASS_NAMES[pc] for pc in (part % 12).tolist()] for part in self.rootPitches()]
+
+    def pitchClassSets(self):
+        """one uint16 array per part of the pitch class set of each note or chord"""
+        return [part.codes for part in self.encodedParts(chords=True)]
+
+    def encodedParts(self, intervals=False, ratios=False, chords=False):
+        """
+        one pitch-class encoding.EncodedPart per part, or with intervals=True one interval
+        part (with duration ratios too if ratios=True), or with chords=True one pitch
+        class set part, keeping every tone of the chords
+        """
+        return [self.encodedPart(number, intervals, ratios, chords) for number in range(len(self.parts()))]
+
+    def encodedPart(self, number, intervals=False, ratios=False, chords=False):
+        """encodedParts()[number], replaying music21's import for that track only"""
+        track = self.parts()[number]
+        unused_offsets, durations, notes = self.noteSequence(track)
+        if chords:
+            sizes = [len(c) for c in notes]
+            return EncodedPart(chordMasks([p for c in notes for p in c], sizes), track.name, "pitchClassSet")
+        if not intervals:
+            return EncodedPart.fromPitches(chordRoots(notes), track.name)
+        return EncodedPart.fromIntervals(chordRoots(notes), track.name, durations if ratios else None)
+
+
+def _groupChords(notes, ticksPerQuarter):
+    """
+    music21 gathers notes starting within a 16th of each other into a chord, unless their
+    ends differ by more than that too (those go to another voice as separate notes).
+    returns (onset tick, last gathered note's (onset, off) ticks, pitches) per element
+    """
+    tolerance = ticksPerQuarter / max(QUANTIZATION_DIVISORS)
+    onsets = notes["onset"].tolist()
+    offs = (notes["onset"] + notes["duration"]).tolist()
+    pitches = notes["pitch"].tolist()
+    gathered = set()
+    elements = []
+    for i in range(len(onsets)):
+        if i in gathered:
+            continue
+        chord = [i]
+        for j in range(i + 1, len(onsets)):
+            if abs(onsets[j] - onsets[i]) >= tolerance:
+                break
+            if abs(offs[j] - offs[i]) > tolerance:
+                continue
+            chord.append(j)
+            gathered.add(j)
+        last = chord[-1]
+        elements.append((onsets[i], onsets[last], offs[last], [pitches[k] for k in chord]))
+    return elements
+
+
+def _quantize(ticks, ticksPerQuarter, divisors=QUANTIZATION_DIVISORS):
+    """
+    nearest multiple of 1/divisor quarter lengths over all divisors, ties going down and
+    to the first divisor - common.nearestMultiple as used by Stream.quantize - done in
+    integer arithmetic on a whole array of tick times.
+    returns (matches in 1/12 quarters, divisor used for each)
+    """
+    ticks = np.asarray(ticks, dtype=np.int64)
+    best = bestError = bestDivisor = None
+    for div in divisors:
+        scaled = ticks * div
+        low = scaled // ticksPerQuarter
+        match = low + (2 * (scaled - low * ticksPerQuarter) > ticksPerQuarter)
+        # |ticks / tpq - match / div|, scaled by 12 * tpq so all divisors compare as integers
+        error = np.abs(scaled - match * ticksPerQuarter) * (UNITS_PER_QUARTER // div)
+        units = match * (UNITS_PER_QUARTER // div)
+        if best is None:
+            best, bestError, bestDivisor = units, error, np.full(len(ticks), div)
+        else:
+            better = error < bestError
+            best = np.where(better, units, best)
+            bestError = np.where(better, error, bestError)
+            bestDivisor = np.where(better, div, bestDivisor)
+    return best, bestDivisor
+
+
+def _quantizeElements(elements, ticksPerQuarter):
+    """
+    Stream.quantize on offsets and durations, including its look-ahead: a duration that
+    would leave a gap smaller than a 16th before the next onset is re-quantized with
+    the next onset's divisor, and notes never quantize to a zero duration.
+    returns (offsets, durations) in 1/12 quarters
+    """
+    smallest = UNITS_PER_QUARTER // max(QUANTIZATION_DIVISORS)
+    onsets = np.array([e[0] for e in elements], dtype=np.int64)
+    lengths = np.array([max(e[2] - e[1], 0) for e in elements], dtype=np.int64)
+    offsets, divisors = _quantize(onsets, ticksPerQuarter)
+    durations, unused = _quantize(lengths, ticksPerQuarter)
+
+    gap = offsets[1:] - (offsets[:-1] + durations[:-1])
+    requantize = np.flatnonzero((gap > 0) & (gap < smallest))
+    for div in QUANTIZATION_DIVISORS:
+        which = requantize[divisors[requantize + 1] == div]
+        durations[which] = _quantize(lengths[which], ticksPerQuarter, (div,))[0]
+    durations[durations == 0] = smallest
+    return offsets, durations
+
+
+def _splitAtBarlines(offsets, durations, signatures):
+    """
+    makeMeasures + makeTies: notes running past a barline are split into tied pieces,
+    each listed again (continuations come after the notes that start on that barline).
+    returns (offsets, durations, element index) of the pieces in flat order,
+    times in 1/12 quarters
+    """
+    if not len(offsets):
+        return offsets, durations, np.arange(0)
+    last = int((offsets + durations).max())
+    # barline offsets up to the end of the last note
+    bars = [0]
+    k = 0
+    while bars[-1] < last:
+        while k + 1 < len(signatures) and signatures[k + 1][0] <= bars[-1]:
+            k += 1
+        bars.append(bars[-1] + signatures[k][1])
+    bars = np.array(bars)
+
+    ends = offsets + durations
+    barEnds = bars[np.searchsorted(bars, offsets, side="right")]
+    crossing = np.flatnonzero(ends > barEnds)
+    if not len(crossing):
+        return offsets, durations, np.arange(len(offsets))
+
+    pieces = [((int(o), 0, i), int(o), int(d), i) for i, (o, d) in enumerate(zip(offsets, durations))]
+    for index in crossing.tolist():
+        key, offset, unused_d, unused_i = pieces[index]
+        end = int(ends[index])
+        barEnd = int(barEnds[index])
+        pieces[index] = (key, offset, barEnd - offset, index)
+        while end > barEnd:
+            key = (barEnd, 1, key)
+            offset = barEnd
+            barEnd = int(bars[np.searchsorted(bars, offset, side="right")])
+            pieces.append((key, offset, min(end, barEnd) - offset, index))
+    pieces.sort(key=lambda piece: piece[0])
+    return (np.array([p[1] for p in pieces], dtype=np.int64),
+            np.array([p[2] for p in pieces], dtype=np.int64),
+            np.array([p[3] for p in pieces], dtype=np.int64))
+
+
+def chordRoots(chords):
+    """uint8 array with the root of each chord (a list of MIDI pitches) in chords"""
+    return np.array([_chordRoot(p) for p in chords], dtype=np.uint8)
+
+
+def _chordRoot(pitches):
+    """
+    chord.Chord._findRoot for pitches spelled the way music21 spells MIDI: a pitch with
+    a perfect stack of thirds above it wins, otherwise the best "rootness" score
+    """
+    if len(pitches) == 1:
+        return pitches[0]
+    # first pitch of each diatonic step, in chord order
+    byStep = {}
+    for p in pitches:
+        byStep.setdefault(PITCH_CLASS_STEPS[p % 12], p)
+    unique = list(byStep.values())
+    if len(unique) == 1:
+        return pitches[0]
+    if len(unique) == 7:
+        return min(pitches)
+
+    steps = sorted(byStep)
+    for start in range(len(steps)):
+        last = steps[start]
+        stacked = True
+        for end in range(start + 1, start + len(steps)):
+            step = steps[end % len(steps)]
+            if step - last not in (2, -5):
+                stacked = False
+                break
+            last = step
+        if stacked:
+            return byStep[steps[start]]
+
+    scores = []
+    for p in unique:
+        step = PITCH_CLASS_STEPS[p % 12]
+        score = 0
+        for index, interval in enumerate((3, 5, 7, 2, 4, 6)):
+            if (step + interval - 1) % 7 in byStep:
+                score += 1 / (index + 6)
+        scores.append(score)
+    return unique[scores.index(max(scores))]
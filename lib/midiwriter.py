@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+# Writes note and rest sequences straight to Standard MIDI File bytes, without
+# building music21 streams: the counterpart of midievents.py, for persisting
+# generated corpora.
+#
+# A part is two arrays, MIDI pitches (negative for a rest) and durations in quarter
+# lengths, played back to back from offset 0. midiBytes(parts) gives a format 1 file:
+# a conductor track with the time signatures, then one named track per part.
+#
+# Reading a file back (MidiEvents or music21's midiFileToStream) splits notes that run
+# over a barline into tied pieces, each listed again. So that a written file reads
+# back as exactly the notes written, barlines only go where no note of any part is
+# sounding: each bar is at least four quarters long and ends at the first such point
+# a time signature (5/4, 7/8, up to 255 beats) can reach, and when there is none the
+# rest of the music is one last long bar.
+#
+# MIDI keeps no spelling: read back, pitches get music21's default names (see
+# encoding.PITCH_CLASS_NAMES), so D# comes back as E-. Letter names round-trip
+# exactly when they are spelled that way, pitch classes always.
+
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+TICKS_PER_QUARTER = 480
+
+# bars are at least this many quarter lengths long
+BAR_QUARTERS = 4
+
+# a channel per part, leaving out channel 10 (9 here), which General MIDI keeps for drums
+CHANNELS = [c for c in range(16) if c != 9]
+
+# time signature denominators 1 (whole notes) to 64 (64ths), as powers of two
+_DENOMINATOR_POWERS = range(0, 7)
+
+
+def _varLen(values):
+    """
+    the MIDI variable-length quantities of an array of values < 2**28: returns a
+    (len(values), 4) uint8 array of the bytes, left aligned, and each one's length
+    """
+    values = np.asarray(values, dtype=np.int64)
+    if len(values) and values.max() >= 1 << 28:
+        raise ValueError("delta time too large for a MIDI file")
+    lengths = 1 + (values >= 1 << 7) + (values >= 1 << 14) + (values >= 1 << 21)
+    out = np.zeros((len(values), 4), dtype=np.uint8)
+    for column in range(4):
+        # byte `column` holds 7-bit group lengths - 1 - column, counted from the low end
+        group = lengths - 1 - column
+        valid = group >= 0
+        byte = (values >> (7 * np.maximum(group, 0))) & 0x7F
+        # every byte but the last has the continuation bit set
+        byte |= np.where(group > 0, 0x80, 0)
+        out[:, column] = np.where(valid, byte, 0)
+    return out, lengths
+
+
+def _chunk(kind, body):
+    return kind + len(body).to_bytes(4, "big") + body
+
+
+def _events(ticks, messages):
+    """
+    track bytes for events at absolute ticks (sorted): messages is a (n, k) uint8 array
+    of each event's bytes after its delta time, all k long
+    """
+    deltas = np.diff(np.asarray(ticks, dtype=np.int64), prepend=0)
+    varLen, lengths = _varLen(deltas)
+    rows = np.concatenate([varLen, messages], axis=1)
+    keep = np.concatenate([np.arange(4)[None, :] < lengths[:, None],
+                           np.ones(messages.shape, dtype=bool)], axis=1)
+    # row by row, the delta's bytes then the message's
+    return rows[keep].tobytes()
+
+
+def _varLenBytes(value):
+    """one variable-length quantity"""
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(out))
+
+
+def _meta(kind, payload, delta=0):
+    """a meta event, delta ticks after the one before it"""
+    return _varLenBytes(delta) + bytes([0xFF, kind]) + _varLenBytes(len(payload)) + payload
+
+
+def _noteTimes(pitches, durations, ticksPerQuarter):
+    """(onsets, offs, pitches) in ticks of the notes of one part, rests dropped"""
+    pitches = np.asarray(pitches, dtype=np.int64)
+    durations = np.asarray(durations, dtype=np.float64)
+    if len(pitches) != len(durations):
+        raise ValueError("a part needs one duration per pitch")
+    if (durations <= 0).any():
+        raise ValueError("durations must be positive")
+    if (pitches > 127).any():
+        raise ValueError("MIDI pitches go up to 127")
+    ends = np.rint(np.cumsum(durations) * ticksPerQuarter).astype(np.int64)
+    starts = np.concatenate([[0], ends[:-1]])
+    notes = pitches >= 0
+    return starts[notes], ends[notes], pitches[notes]
+
+
+def _timeSignature(ticks, ticksPerQuarter):
+    """(numerator, denominator power) of a bar of ticks, with the smallest denominator, or None"""
+    for power in _DENOMINATOR_POWERS:
+        # a bar of numerator notes of 4 / 2**power quarters
+        numerator, remainder = divmod(ticks * 2 ** power, 4 * ticksPerQuarter)
+        if not remainder:
+            return (numerator, power) if 0 < numerator <= 255 else None
+    return None
+
+
+def _longTimeSignature(ticks, ticksPerQuarter):
+    """the time signature of the shortest bar at least ticks long (a last bar can run past the end), or None"""
+    for power in reversed(_DENOMINATOR_POWERS[:3]):
+        numerator = -(-ticks * 2 ** power // (4 * ticksPerQuarter))
+        if numerator <= 255:
+            return max(numerator, 1), power
+    return None
+
+
+def barLines(parts, ticksPerQuarter=TICKS_PER_QUARTER, barQuarters=BAR_QUARTERS):
+    """
+    the ticks of the barlines midiBytes writes for parts (a list of (pitches, durations)):
+    each bar at least barQuarters long, ending where no note of any part is sounding.
+    the first is 0 and the last the end of the music. the last bar can be shorter, or
+    longer when no barline fits before the end; its time signature can run past the end
+    """
+    notes = [_noteTimes(p, d, ticksPerQuarter) for p, d in parts]
+    times = np.unique(np.concatenate([[0]] + [np.concatenate([on, off]) for on, off, unused in notes]))
+    # a barline can't go inside a note
+    free = np.ones(len(times), dtype=bool)
+    for on, off, unused in notes:
+        if len(on):
+            inside = np.searchsorted(on, times, side="left") - 1
+            sounding = (inside >= 0) & (off[np.maximum(inside, 0)] > times)
+            free &= ~sounding
+    cuts = times[free]
+
+    bars = [0]
+    end = int(times[-1])
+    minimum = barQuarters * ticksPerQuarter
+    while end - bars[-1] > minimum:
+        # the first point far enough on that a time signature can reach
+        for cut in cuts[np.searchsorted(cuts, bars[-1] + minimum, side="left"):].tolist():
+            if _timeSignature(cut - bars[-1], ticksPerQuarter) is not None:
+                bars.append(cut)
+                break
+        else:
+            # the rest is one last bar, when a time signature is that long
+            if _longTimeSignature(end - bars[-1], ticksPerQuarter) is None:
+                raise ValueError("no time signature fits a bar from {} quarter lengths on".format(bars[-1] / ticksPerQuarter))
+            break
+    if bars[-1] < end:
+        bars.append(end)
+    return bars
+
+
+def midiBytes(parts, names=None, ticksPerQuarter=TICKS_PER_QUARTER, tempo=500000, velocity=90):
+    """
+    a format 1 Standard MIDI File of parts, a list of (pitches, durations): MIDI pitches
+    (negative for rests) and quarter lengths, played back to back. names are the
+    parts' track names. tempo is microseconds per quarter note
+    """
+    names = names if names is not None else ["Part {}".format(i + 1) for i in range(len(parts))]
+    if len(names) != len(parts):
+        raise ValueError("one name per part")
+    if len(parts) > len(CHANNELS):
+        raise ValueError("at most {} parts, one per MIDI channel".format(len(CHANNELS)))
+
+    bars = barLines(parts, ticksPerQuarter)
+    conductor = bytearray(_meta(0x51, tempo.to_bytes(3, "big")))
+    previous = 0
+    signature = None
+    for i, (bar, nextBar) in enumerate(zip(bars, bars[1:])):
+        length = nextBar - bar
+        if i == len(bars) - 2:
+            # the last bar only has to be long enough: keep the signature before it if it is
+            if signature is not None and signature[0] * 4 * ticksPerQuarter // 2 ** signature[1] >= length:
+                break
+            current = _longTimeSignature(max(length, BAR_QUARTERS * ticksPerQuarter), ticksPerQuarter)
+        else:
+            current = _timeSignature(length, ticksPerQuarter)
+        if current != signature:
+            conductor += _meta(0x58, bytes([current[0], current[1], 24, 8]), bar - previous)
+            previous = bar
+            signature = current
+    if signature is None:
+        conductor += _meta(0x58, bytes([4, 2, 24, 8]))
+    conductor += _meta(0x2F, b"")
+
+    chunks = [_chunk(b"MThd", (1).to_bytes(2, "big") + (len(parts) + 1).to_bytes(2, "big") + ticksPerQuarter.to_bytes(2, "big")),
+              _chunk(b"MTrk", bytes(conductor))]
+    for channel, (pitches, durations), name in zip(CHANNELS, parts, names):
+        on, off, pitch = _noteTimes(pitches, durations, ticksPerQuarter)
+        # note-offs before note-ons at the same tick, so repeated notes stay apart
+        ticks = np.concatenate([off, on])
+        order = np.lexsort((np.concatenate([np.zeros(len(off)), np.ones(len(on))]), ticks))
+        messages = np.empty((len(ticks), 3), dtype=np.uint8)
+        messages[:, 0] = np.concatenate([np.full(len(off), 0x80 | channel), np.full(len(on), 0x90 | channel)])
+        messages[:, 1] = np.concatenate([pitch, pitch])
+        messages[:, 2] = np.concatenate([np.zeros(len(off)), np.full(len(on), velocity)])
+        track = _meta(0x03, str(name).encode("utf-8"))
+        track += _events(ticks[order], messages[order])
+        track += _meta(0x2F, b"")
+        chunks.append(_chunk(b"MTrk", track))
+    return b"".join(chunks)
+
+
+def writeMidi(path, parts, names=None, **options):
+    """writes midiBytes(parts, names, **options) to path, atomically"""
+    data = midiBytes(parts, names, **options)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path
+
+
+class MidiDirectoryWriter():
+    """
+    writes many MIDI files into one directory on a thread pool:
+
+    with MidiDirectoryWriter("corpus/", workers=4) as writer:
+        for i, parts in enumerate(scores):
+            writer.write("score{}.mid".format(i), parts, names)
+    writer.written      # the paths, in the order they were asked for
+
+    write() blocks while pending files are waiting to be written, so a generator
+    producing scores faster than they are written never holds more than pending of
+    them. the first error raised by a write is raised again by close()
+    """
+    def __init__(self, directory, workers=4, pending=None, **options):
+        self.directory = directory
+        self.options = options
+        os.makedirs(directory, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(pending or 2 * workers)
+        self._futures = []
+
+    def write(self, name, parts, names=None):
+        """queues parts to be written as the file name in the directory"""
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(writeMidi, os.path.join(self.directory, name), parts, names, **self.options)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda unused: self._slots.release())
+        self._futures.append(future)
+        return future
+
+    @property
+    def written(self):
+        return [f.result() for f in self._futures if f.done() and not f.exception()]
+
+    def close(self):
+        """waits for every file, then raises the first error of any write"""
+        self._pool.shutdown(wait=True)
+        for future in self._futures:
+            future.result()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            return False
+        self.close()
+        return False
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+# Inverted index of note n-grams over a corpus of parts, for finding the parts most
+# similar to a query without running the DP against every one of them.
+#
+# Each n-gram of a part (n consecutive pitch classes, or in "interval" mode n
+# consecutive intervals between notes, which ignores transposition) becomes one
+# integer id. The index is a handful of .npy files in one directory, all loaded with
+# mmap_mode="r" so opening an index reads almost nothing:
+#   grams.npy       sorted unique gram ids
+#   offsets.npy     postings of grams[g] are postings[offsets[g]:offsets[g+1]]
+#   postingParts.npy, postingPositions.npy    (part number, note position) postings
+#   codes.npy, starts.npy    the parts' notes, to run the exact DP on candidates
+#   meta.json       n, mode, alphabet, part labels and files
+#
+# A query counts the grams it shares with every part (as multisets) and ranks the
+# parts by that count, or by the q-gram lower bound on the edit distance it gives.
+# Only the best ranked parts are then compared with the bit-parallel engines.
+
+import heapq
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from encoding import EncodedPart
+from helpers import Music21Helper
+
+MODES = ("pitch", "interval")
+RANKINGS = ("shared", "qgram")
+
+# one ranked part of a query result. distance is the levenshtein distance or lcs
+# length, None for parts that didn't get the exact DP
+Match = namedtuple("Match", ["part", "label", "shared", "bound", "distance", "offset"])
+
+_ARRAYS = ("grams", "offsets", "postingParts", "postingPositions", "codes", "starts")
+
+
+def _symbols(part, mode):
+    """the sequence the grams are made of, and the size of its alphabet"""
+    if part.alphabet == "interval":
+        # already intervals: grams of the codes themselves, shifted to 0-255
+        return part.codes.astype(np.int64) + 128, 256
+    if mode == "interval":
+        pcs = part.pitchClasses().astype(np.int16)
+        return (np.diff(pcs) % 12).astype(np.int64), 12
+    return part.codes.astype(np.int64), (12 if part.alphabet == "pitchClass" else 35)
+
+
+def gramIds(symbols, n, base):
+    """one int64 id per n-gram of symbols (each < base), in order"""
+    if len(symbols) < n:
+        return np.zeros(0, dtype=np.int64)
+    windows = np.lib.stride_tricks.sliding_window_view(symbols, n)
+    return windows @ (base ** np.arange(n - 1, -1, -1, dtype=np.int64))
+
+
+class NgramIndex():
+    """
+    index = NgramIndex.build(corpus.parts, corpus.labels, corpus.files, n=4)
+    index.save("quartets.idx")
+    index = NgramIndex.load("quartets.idx")
+    index.query(part, top=5)
+
+    parts are encoding.EncodedParts (or lists of letter names such as noteToLetterName
+    returns); a query must use the same alphabet as the indexed parts
+    """
+    def __init__(self, arrays, meta):
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+        self.n = meta["n"]
+        self.mode = meta["mode"]
+        self.alphabet = meta["alphabet"]
+        self.labels = meta["labels"]
+        self.files = meta["files"]
+
+    @classmethod
+    def build(cls, parts, labels=None, files=None, n=4, mode="pitch", alphabet="pitchClass"):
+        if mode not in MODES:
+            raise ValueError("unknown mode: {}".format(mode))
+        parts = [p if isinstance(p, EncodedPart) else EncodedPart.fromLetterNames(p, alphabet=alphabet) for p in parts]
+        if parts:
+            alphabet = parts[0].alphabet
+        if any(p.alphabet != alphabet for p in parts):
+            raise ValueError("parts of an index must share one alphabet")
+        if alphabet == "pitchClassSet":
+            raise ValueError("pitch class sets match by overlap, which n-grams can't index")
+        if alphabet == "interval":
+            base = 256
+        else:
+            base = 12 if mode == "interval" or alphabet == "pitchClass" else 35
+        if base ** n >= 2 ** 63:
+            raise ValueError("n={} is too long for int64 gram ids".format(n))
+
+        ids, partNumbers, positions = [], [], []
+        for number, part in enumerate(parts):
+            symbols, base = _symbols(part, mode)
+            grams = gramIds(symbols, n, base)
+            ids.append(grams)
+            partNumbers.append(np.full(len(grams), number, dtype=np.int32))
+            positions.append(np.arange(len(grams), dtype=np.int32))
+        ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+        # stable, so postings of a gram stay in (part, position) order
+        order = np.argsort(ids, kind="stable")
+        grams, starts = np.unique(ids[order], return_index=True)
+
+        lengths = np.array([len(p) for p in parts], dtype=np.int64)
+        arrays = {
+            "grams": grams,
+            "offsets": np.append(starts, len(ids)).astype(np.int64),
+            "postingParts": np.concatenate(partNumbers)[order] if parts else np.zeros(0, dtype=np.int32),
+            "postingPositions": np.concatenate(positions)[order] if parts else np.zeros(0, dtype=np.int32),
+            "codes": np.concatenate([p.codes for p in parts]) if parts else np.zeros(0, dtype=np.uint8),
+            "starts": np.append(0, np.cumsum(lengths)).astype(np.int64),
+        }
+        meta = {
+            "n": n,
+            "mode": mode,
+            "alphabet": alphabet,
+            "labels": list(labels) if labels is not None else [p.name for p in parts],
+            "files": list(files) if files is not None else [None] * len(parts),
+        }
+        return cls(arrays, meta)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(directory, name + ".npy"), getattr(self, name))
+        meta = {"n": self.n, "mode": self.mode, "alphabet": self.alphabet, "labels": self.labels, "files": self.files}
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        arrays = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode=mmap_mode) for name in _ARRAYS}
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        return cls(arrays, meta)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def part(self, number):
+        """the indexed part as an EncodedPart"""
+        return EncodedPart(self.codes[self.starts[number]:self.starts[number + 1]], self.labels[number], self.alphabet)
+
+    def lengths(self):
+        return np.diff(self.starts)
+
+    def _queryGrams(self, query):
+        if not isinstance(query, EncodedPart):
+            query = EncodedPart.fromLetterNames(query, alphabet=self.alphabet)
+        if query.alphabet != self.alphabet:
+            raise ValueError("query alphabet {} doesn't match the index's {}".format(query.alphabet, self.alphabet))
+        symbols, base = _symbols(query, self.mode)
+        return query, gramIds(symbols, self.n, base)
+
+    def _postings(self, gram):
+        """(start, stop) of a gram's postings, empty when the corpus doesn't have it"""
+        g = np.searchsorted(self.grams, gram)
+        if g == len(self.grams) or self.grams[g] != gram:
+            return 0, 0
+        return int(self.offsets[g]), int(self.offsets[g + 1])
+
+    def shared(self, query):
+        """number of n-grams each indexed part shares with query, counted as multisets"""
+        query, ids = self._queryGrams(query)
+        shared = np.zeros(len(self), dtype=np.int64)
+        grams, counts = np.unique(ids, return_counts=True)
+        for gram, count in zip(grams.tolist(), counts.tolist()):
+            start, stop = self._postings(gram)
+            if start == stop:
+                continue
+            parts, perPart = np.unique(self.postingParts[start:stop], return_counts=True)
+            shared[parts] += np.minimum(perPart, count)
+        return shared
+
+    def lowerBounds(self, queryLength, shared):
+        """
+        q-gram lemma: one edit changes at most `span` grams, so the edit distance is at
+        least (grams of the longer sequence - shared grams) / span. in interval mode a
+        gram spans n+1 notes, and matching intervals are weaker than matching notes, so
+        the bound still holds for the edit distance of the notes
+        """
+        span = self.n + 1 if self.mode == "interval" else self.n
+        longer = np.maximum(self.lengths(), queryLength)
+        missing = np.maximum(longer - span + 1, 0) - shared
+        # the length difference alone is a bound too
+        return np.maximum(-(-np.maximum(missing, 0) // span), np.abs(self.lengths() - queryLength))
+
+    def offset(self, query, number):
+        """
+        the most common (part position - query position) of the grams query shares with
+        part `number`: where the query best lines up in the part
+        """
+        query, ids = self._queryGrams(query)
+        diagonals = []
+        for position, gram in enumerate(ids.tolist()):
+            start, stop = self._postings(gram)
+            if start == stop:
+                continue
+            mine = self.postingParts[start:stop] == number
+            diagonals.append(self.postingPositions[start:stop][mine].astype(np.int64) - position)
+        diagonals = np.concatenate(diagonals) if diagonals else np.zeros(0, dtype=np.int64)
+        if not len(diagonals):
+            return None
+        values, counts = np.unique(diagonals, return_counts=True)
+        return int(values[np.argmax(counts)])
+
+    def query(self, query, top=10, candidates=50, rank="qgram", metric="levenshtein", exact=True, locate=False):
+        """
+        the `top` parts most similar to query, best first.
+
+        parts are ranked by shared grams (rank="shared") or by the q-gram lower bound on
+        their edit distance (rank="qgram"), and at most `candidates` of them, in that
+        order, are compared exactly with the bit-parallel levenshtein or lcs engine.
+        with rank="qgram" and metric="levenshtein" the search stops as soon as no
+        remaining part's bound can beat the top found so far, and candidates=None makes
+        the result exact. exact=False skips the DP and returns the ranking.
+        locate=True fills in each match's offset
+        """
+        if rank not in RANKINGS:
+            raise ValueError("unknown ranking: {}".format(rank))
+        query, unused = self._queryGrams(query)
+        shared = self.shared(query)
+        bounds = self.lowerBounds(len(query), shared)
+        if rank == "qgram":
+            order = np.lexsort((-shared, bounds))
+        else:
+            order = np.argsort(-shared, kind="stable")
+
+        if not exact:
+            chosen = [(None, int(p)) for p in order[:top]]
+        else:
+            pruning = rank == "qgram" and metric == "levenshtein"
+            engine = Music21Helper.levenshteinBitParallel if metric == "levenshtein" else Music21Helper.lcsBitParallel
+            masks = Music21Helper.matchMasks(query)
+            # max heap (negated) of the best `top` (score, part) so far, score is lower-is-better
+            heap = []
+            limit = len(order) if candidates is None else min(candidates, len(order))
+            for number in order[:limit].tolist():
+                if pruning and len(heap) == top and bounds[number] > -heap[0][0]:
+                    break
+                value = engine(query, self.part(number), masks=masks)
+                score = value if metric == "levenshtein" else -value
+                if len(heap) < top:
+                    heapq.heappush(heap, (-score, -number))
+                elif (score, number) < (-heap[0][0], -heap[0][1]):
+                    heapq.heapreplace(heap, (-score, -number))
+            chosen = sorted((-s, -p) for s, p in heap)
+            chosen = [(s if metric == "levenshtein" else -s, p) for s, p in chosen]
+
+        return [Match(p, self.labels[p], int(shared[p]), int(bounds[p]), None if d is None else int(d),
+                      self.offset(query, p) if locate else None)
+                for d, p in chosen]
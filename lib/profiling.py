@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+# Per-stage timing and memory counters for the comparison pipeline.
+#
+# Code marks its stages with `with profiler.stage("name"):`. A Profiler adds up the
+# calls, time (perf_counter_ns) and, with memory=True, the peak memory tracemalloc saw
+# in every stage; one profiler kept across many comparisons aggregates all of them.
+# Stages nest, and a stage's figures include the stages inside it.
+#
+# When profiling is off the pipeline holds NO_PROFILER, whose stage() hands back one
+# shared do-nothing context manager, so a disabled stage costs a method call.
+
+import cProfile
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+
+class _NullStage():
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class NullProfiler():
+    """the profiler used when profiling is off: every method does nothing"""
+    enabled = False
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+    def count(self, name, n=1):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def report(self):
+        return {}
+
+    def save(self, path=None):
+        return None
+
+
+NO_PROFILER = NullProfiler()
+
+
+class _Stage():
+    __slots__ = ("profiler", "name", "start", "memory", "peak")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        profiler = self.profiler
+        if profiler.memory:
+            # tracemalloc has one peak: outer stages keep the peaks their inner stages saw
+            current, peak = tracemalloc.get_traced_memory()
+            for outer in profiler._stack:
+                outer.peak = max(outer.peak, peak)
+            tracemalloc.reset_peak()
+            self.memory = self.peak = current
+        profiler._stack.append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter_ns() - self.start
+        profiler = self.profiler
+        profiler._stack.pop()
+        peak = None
+        if profiler.memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            for outer in profiler._stack:
+                outer.peak = max(outer.peak, self.peak)
+            peak = self.peak - self.memory
+        profiler._record(self.name, elapsed, peak)
+        return False
+
+
+class Profiler():
+    """
+    profiler = Profiler(memory=True, cprofile=True, output="run.json")
+    with profiler.stage("read"):
+        ...
+    profiler.save()      # run.json, and run.prof for cProfile
+
+    memory=True traces allocations with tracemalloc (slow) to report each stage's peak
+    memory above what was allocated when it started. cprofile=True runs cProfile
+    between start() and stop() (the first stage starts it). callback(name, seconds,
+    peakBytes) is called as every stage ends
+    """
+    enabled = True
+
+    def __init__(self, memory=False, cprofile=False, callback=None, output=None):
+        self.memory = memory
+        self.cprofile = cprofile
+        self.callback = callback
+        self.output = output
+        self.stages = {}
+        self.counters = {}
+        self._stack = []
+        self._profile = None
+        self._started = None
+        self._stopped = None
+        self._allocations = None
+
+    def start(self):
+        """starts the clock, tracemalloc and cProfile, as asked for. stage() calls it"""
+        if self._started is not None:
+            return
+        self._started = time.perf_counter()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.cprofile:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self):
+        """stops tracing and profiling; the report covers start() to here"""
+        if self._started is None or self._stopped is not None:
+            return
+        self._stopped = time.perf_counter()
+        if self._profile is not None:
+            self._profile.disable()
+        if self.memory and tracemalloc.is_tracing():
+            statistics = tracemalloc.take_snapshot().statistics("lineno")[:10]
+            self._allocations = [{"where": str(stat.traceback), "bytes": stat.size, "blocks": stat.count}
+                                 for stat in statistics]
+            tracemalloc.stop()
+
+    def stage(self, name):
+        self.start()
+        return _Stage(self, name)
+
+    def count(self, name, n=1):
+        """adds n to a counter of the report (notes read, pairs scored, ...)"""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def _record(self, name, nanoseconds, peak):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "peak_bytes": None}
+        seconds = nanoseconds / 1e9
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+        if peak is not None:
+            entry["peak_bytes"] = max(entry["peak_bytes"] or 0, peak)
+        if self.callback is not None:
+            self.callback(name, seconds, peak)
+
+    def merge(self, report):
+        """adds the stages and counters of another profiler's report (from a worker process, say)"""
+        for name, other in report.get("stages", {}).items():
+            entry = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "peak_bytes": None})
+            entry["calls"] += other["calls"]
+            entry["seconds"] += other["seconds"]
+            entry["max_seconds"] = max(entry["max_seconds"], other["max_seconds"])
+            if other["peak_bytes"] is not None:
+                entry["peak_bytes"] = max(entry["peak_bytes"] or 0, other["peak_bytes"])
+        for name, n in report.get("counters", {}).items():
+            self.count(name, n)
+
+    def report(self):
+        """the stages (slowest first) and counters so far, as a JSON-ready dict"""
+        end = self._stopped if self._stopped is not None else time.perf_counter()
+        stages = {}
+        for name, entry in sorted(self.stages.items(), key=lambda item: -item[1]["seconds"]):
+            stages[name] = dict(entry, mean_seconds=entry["seconds"] / entry["calls"])
+        report = {
+            "wall_seconds": 0.0 if self._started is None else end - self._started,
+            "stages": stages,
+            "counters": dict(self.counters),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        }
+        if self._allocations is not None:
+            report["top_allocations"] = self._allocations
+        return report
+
+    def save(self, path=None):
+        """
+        stops the profiler and writes the report to path (default: output) as JSON,
+        and the cProfile stats next to it as <name>.prof. returns the report's path
+        """
+        path = path or self.output
+        if path is None:
+            raise ValueError("no output path")
+        self.stop()
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        if self._profile is not None:
+            self._profile.dump_stats(os.path.splitext(path)[0] + ".prof")
+        return path
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+# On-disk cache of the note data we pull out of MIDI files, so that comparing
+# the same scores again doesn't re-run music21's MIDI translation every time.
+#
+# Layout of a cache directory:
+#   objects/<sha1 of file contents>-<variant>-v<CACHE_VERSION>.npz   the extracted parts
+#   refs/<sha1 of path, mtime and size>                              -> sha1 of file contents
+# A file that hasn't changed since it was cached is found through its ref without
+# reading it; a touched or copied file with the same contents reuses the object.
+# The variant names the extractor and whether durations and offsets were kept
+# (e.g. "extractEvents" or "extractScore-notiming"), since each gives different data
+# for the same file: caches with different settings can share a directory.
+
+import hashlib
+import os
+import re
+import tempfile
+
+import numpy as np
+
+from encoding import PITCH_CLASS_NAMES, EncodedPart
+
+CACHE_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "MIDI_LCS_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "midi-levenshtein-lcs"))
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class CachedScore():
+    """
+    per-part note data of one score: for every part its name and the MIDI pitch of each
+    note (the root, for chords) in the order `part.flat.notes` yields them, plus
+    optionally each note's duration and offset in quarter lengths
+    """
+    def __init__(self, partNames, pitches, durations=None, offsets=None):
+        self.partNames = list(partNames)
+        self.pitches = [np.asarray(p, dtype=np.uint8) for p in pitches]
+        self.durations = None if durations is None else [np.asarray(d, dtype=np.float32) for d in durations]
+        self.offsets = None if offsets is None else [np.asarray(o, dtype=np.float32) for o in offsets]
+
+    def pitchClasses(self):
+        """returns one uint8 array of pitch classes (0-11) per part"""
+        return [p % 12 for p in self.pitches]
+
+    def letterNames(self):
+        """returns one list of letter names per part, same as noteToLetterName"""
+        return [[PITCH_CLASS_NAMES[pc] for pc in part.tolist()] for part in self.pitchClasses()]
+
+    def parts(self, intervals=False, ratios=False):
+        """
+        returns one pitch-class encoding.EncodedPart per part, or with intervals=True one
+        interval part (with duration ratios too if ratios=True and durations were kept)
+        """
+        return [self.part(number, intervals, ratios) for number in range(len(self.pitches))]
+
+    def part(self, number, intervals=False, ratios=False):
+        """parts()[number], encoding only that part"""
+        pitches, name = self.pitches[number], self.partNames[number]
+        if not intervals:
+            return EncodedPart.fromPitches(pitches, name)
+        durations = self.durations[number] if ratios and self.durations is not None else None
+        return EncodedPart.fromIntervals(pitches, name, durations)
+
+    def save(self, fileobj, **meta):
+        lengths = np.array([len(p) for p in self.pitches], dtype=np.int64)
+        arrays = {
+            "partNames": np.array(["" if n is None else n for n in self.partNames], dtype=str),
+            "lengths": lengths,
+            "pitches": np.concatenate(self.pitches) if self.pitches else np.zeros(0, dtype=np.uint8),
+        }
+        if self.durations is not None:
+            arrays["durations"] = np.concatenate(self.durations) if self.durations else np.zeros(0, dtype=np.float32)
+        if self.offsets is not None:
+            arrays["offsets"] = np.concatenate(self.offsets) if self.offsets else np.zeros(0, dtype=np.float32)
+        for k, v in meta.items():
+            arrays["meta_" + k] = np.array(v)
+        np.savez(fileobj, **arrays)
+
+    @classmethod
+    def load(cls, fileobj):
+        with np.load(fileobj, allow_pickle=False) as data:
+            lengths = data["lengths"]
+            bounds = np.cumsum(lengths)[:-1]
+            # np.split always gives at least one piece, a score without parts has none
+            split = lambda name: (np.split(data[name], bounds) if len(lengths) else []) if name in data else None
+            partNames = [str(n) or None for n in data["partNames"]]
+            return cls(partNames, split("pitches"), split("durations"), split("offsets"))
+
+
+def extractScore(path):
+    """
+    parses a MIDI file with music21 - the slow path the cache is there to avoid - and
+    returns its per-part note data as a CachedScore
+    """
+    # deferred so a warm cache never imports music21
+    from music21 import chord, midi
+    from helpers import Music21Helper
+
+    mf = midi.MidiFile()
+    mf.open(path)
+    mf.read()
+    mf.close()
+    stream = midi.translate.midiFileToStream(mf)
+
+    pitches, durations, offsets = [], [], []
+    for part in stream.parts:
+        flat = part.flat
+        p, d, o = [], [], []
+        for nt in flat.notes:
+            if isinstance(nt, chord.Chord):
+                p.append(nt._findRoot().midi)
+            else:
+                p.append(nt.pitch.midi)
+            d.append(float(nt.duration.quarterLength))
+            o.append(float(flat.elementOffset(nt)))
+        pitches.append(p)
+        durations.append(d)
+        offsets.append(o)
+    return CachedScore(Music21Helper.listInstruments(stream), pitches, durations, offsets)
+
+
+def extractEvents(path):
+    """
+    same as extractScore but reads the MIDI events directly with midievents.MidiEvents,
+    never building a music21 stream. letter names agree with extractScore; offsets are
+    the quantized MIDI times
+    """
+    from midievents import MidiEvents, chordRoots
+
+    events = MidiEvents.read(path)
+    pitches, durations, offsets = [], [], []
+    for track in events.parts():
+        o, d, chords = events.noteSequence(track)
+        pitches.append(chordRoots(chords))
+        durations.append(d)
+        offsets.append(o)
+    return CachedScore(events.partNames(), pitches, durations, offsets)
+
+
+class ScoreCache():
+    """
+    size-bounded on-disk cache of CachedScores keyed by file path, mtime and content hash.
+
+    cache = ScoreCache()
+    score = cache.get("data/mozsq1.mid")   # parsed by music21 once, loaded from disk after
+    score.letterNames()
+
+    when the cache grows past max_bytes the least recently used entries are removed
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, timing=True, extractor=extractScore):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.timing = timing
+        self.extractor = extractor
+        name = getattr(extractor, "__name__", type(extractor).__name__)
+        # part of a file name: "<lambda>" becomes "_lambda_"
+        self.variant = re.sub(r"[^\w]", "_", name) + ("" if timing else "-notiming")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "refs"), exist_ok=True)
+
+    def _refPath(self, path, st):
+        key = "{}:{}:{}".format(os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        return os.path.join(self.directory, "refs", hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+    def _objectPath(self, digest):
+        return os.path.join(self.directory, "objects", "{}-{}-v{}.npz".format(digest, self.variant, CACHE_VERSION))
+
+    def _writeAtomic(self, target, write):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def lookup(self, path):
+        """returns the cached score for path, or None when it isn't cached (or is stale)"""
+        st = os.stat(path)
+        ref = self._refPath(path, st)
+        try:
+            with open(ref) as f:
+                digest = f.read().strip()
+        except FileNotFoundError:
+            return None
+        obj = self._objectPath(digest)
+        try:
+            score = CachedScore.load(obj)
+        except FileNotFoundError:
+            return None
+        # bump the mtime, the eviction policy is least recently used
+        os.utime(obj)
+        return score
+
+    def get(self, path):
+        """returns the CachedScore of a MIDI file, extracting and storing it on a miss"""
+        score = self.lookup(path)
+        if score is not None:
+            self.hits += 1
+            return score
+
+        self.misses += 1
+        st = os.stat(path)
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        obj = self._objectPath(digest)
+        if os.path.exists(obj):
+            # same contents under a new path or mtime
+            score = CachedScore.load(obj)
+            os.utime(obj)
+        else:
+            score = self.extractor(path)
+            if not self.timing:
+                score.durations = score.offsets = None
+            self._writeAtomic(obj, lambda f: score.save(f, path=os.path.abspath(path), sha1=digest))
+        self._writeAtomic(self._refPath(path, st), lambda f: f.write(digest.encode("ascii")))
+        self.evict()
+        return score
+
+    def size(self):
+        """total bytes of cached scores"""
+        objects = os.path.join(self.directory, "objects")
+        return sum(e.stat().st_size for e in os.scandir(objects) if e.name.endswith(".npz"))
+
+    def evict(self, max_bytes=None):
+        """removes least recently used scores until the cache fits in max_bytes"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        objects = os.path.join(self.directory, "objects")
+        entries = [(e.stat().st_mtime_ns, e.stat().st_size, e.path)
+                   for e in os.scandir(objects) if e.name.endswith(".npz")]
+        total = sum(size for _, size, _ in entries)
+        if total <= max_bytes:
+            return 0
+        removed = 0
+        for _, size, entry in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(entry)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        self.evictions += removed
+        self._pruneRefs()
+        return removed
+
+    def _pruneRefs(self):
+        # a ref stays while any variant of its contents is cached
+        objects = os.path.join(self.directory, "objects")
+        cached = {e.name.split("-", 1)[0] for e in os.scandir(objects) if e.name.endswith(".npz")}
+        refs = os.path.join(self.directory, "refs")
+        for e in os.scandir(refs):
+            try:
+                with open(e.path) as f:
+                    digest = f.read().strip()
+            except FileNotFoundError:
+                continue
+            if digest not in cached:
+                try:
+                    os.remove(e.path)
+                except FileNotFoundError:
+                    pass
+
+    def warm(self, directory, extensions=(".mid", ".midi", ".squ")):
+        """caches every MIDI file in directory, yields (path, was_cached) as it goes"""
+        for name in sorted(os.listdir(directory)):
+            if not name.lower().endswith(extensions):
+                continue
+            path = os.path.join(directory, name)
+            cached = self.lookup(path) is not None
+            if not cached:
+                self.get(path)
+            yield path, cached
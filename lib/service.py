@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+
+# A long-running comparison service: one process keeps the parsed scores warm and
+# answers part-to-part Levenshtein / LCS requests over a Unix socket or localhost TCP,
+# so a comparison doesn't pay for starting python and importing music21.
+#
+# The protocol is newline-delimited JSON. Each request is one object on one line:
+#   {"id": 1, "file1": "data/mozsq1.mid", "part1": "Viola",
+#    "file2": "data/haydn_sq_A_20-6_1.squ", "part2": 2, "metric": "lcs"}
+# with optional "intervals" / "chords" (booleans) picking the encoding, and parts
+# given by name or number. The reply, on one line and tagged with the same id, is
+#   {"id": 1, "score": 443, "length1": 1480, "length2": 1037, "similarity": 0.30, "ms": 122.5}
+# or {"id": 1, "error": "..."} when it can't be answered, for whatever reason.
+# {"op": "stats"} returns the service counters.
+# Replies come back in the order they finish, not the order they were asked.
+#
+# Reading scores and the DP both run on a process pool. Requests for a pair already
+# being scored wait for that result instead of scoring it again (coalescing), and
+# finished results are kept in a distancecache.DistanceCache for later ones. At most
+# `queue` comparisons may wait for the pool; past that a request is answered with
+# {"error": "busy"} at once. Each connection also has at most `window` requests in
+# flight: the service stops reading from a connection that is that far ahead.
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from distancecache import DistanceCache, MISSING
+from helpers import Music21Helper
+from midievents import MidiEvents
+
+DEFAULT_PORT = 8765
+
+
+class RequestError(Exception):
+    """a request the service can't answer; its message goes back to the client"""
+    pass
+
+
+def _readScore(path, intervals, chords):
+    """the names and EncodedParts of every part of a MIDI file (runs on the pool)"""
+    events = MidiEvents.read(path)
+    return events.partNames(), events.encodedParts(intervals=intervals, chords=chords)
+
+
+ENGINES = {"levenshtein": Music21Helper.levenshteinBitParallel, "lcs": Music21Helper.lcsBitParallel}
+
+
+def _score(metric, part1, part2):
+    """one comparison (runs on the pool)"""
+    return ENGINES[metric](part1, part2)
+
+
+def _partNumber(names, part):
+    if isinstance(part, int) and not isinstance(part, bool):
+        if not 0 <= part < len(names):
+            raise RequestError("no part {}, there are {} parts".format(part, len(names)))
+        return part
+    if part not in names:
+        raise RequestError("no part named {!r}, the parts are {}".format(part, names))
+    return names.index(part)
+
+
+class ComparisonService():
+    """
+    service = ComparisonService(workers=4)
+    asyncio.run(service.serve(path="/tmp/compare.sock"))    # or host=, port=
+
+    workers processes do the reading and scoring; up to maxScores parsed files are
+    kept in memory, least recently used dropped first. distances is the DistanceCache
+    results are kept in (by default a 16 MB one in memory)
+    """
+    def __init__(self, workers=None, queue=64, window=16, maxScores=256, distances=None):
+        self.workers = workers
+        self.queue = queue
+        self.window = window
+        self.maxScores = maxScores
+        self.scores = OrderedDict()
+        self.distances = DistanceCache(max_bytes=16 * 1024 * 1024) if distances is None else distances
+        self._loading = {}
+        self._inflight = {}
+        self._waiting = 0
+        self._pool = None
+        self.counters = {"requests": 0, "scored": 0, "coalesced": 0, "remembered": 0, "busy": 0, "errors": 0,
+                         "scores_read": 0, "connections": 0}
+
+    def start(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def stats(self):
+        return dict(self.counters, waiting=self._waiting, inflight=len(self._inflight), scores=len(self.scores),
+                    distances=self.distances.stats())
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, function, *args)
+
+    async def parts(self, path, intervals=False, chords=False):
+        """(names, parts) of a file, read once and kept warm; concurrent reads of one file share a read"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError as e:
+            raise RequestError("can't read {}: {}".format(path, e.strerror))
+        key = (os.path.realpath(path), mtime, intervals, chords)
+        if key in self.scores:
+            self.scores.move_to_end(key)
+            return self.scores[key]
+        loading = self._loading.get(key)
+        if loading is None:
+            loading = self._loading[key] = asyncio.ensure_future(self._read(key, path))
+            loading.add_done_callback(lambda _: self._loading.pop(key, None))
+        return await asyncio.shield(loading)
+
+    async def _read(self, key, path):
+        try:
+            score = await self._run(_readScore, path, key[2], key[3])
+        except Exception as e:
+            # a truncated or malformed file can fail anywhere in the event parser
+            raise RequestError("can't read {}: {}".format(path, str(e) or type(e).__name__))
+        self.counters["scores_read"] += 1
+        self.scores[key] = score
+        while len(self.scores) > self.maxScores:
+            self.scores.popitem(last=False)
+        return score
+
+    async def compare(self, request):
+        """answers one comparison request (a dict), see the protocol above"""
+        metric = request.get("metric", "levenshtein")
+        if metric not in ENGINES:
+            raise RequestError("unknown metric: {!r}".format(metric))
+        for field in ("file1", "file2"):
+            if not isinstance(request.get(field), str):
+                raise RequestError("{} must be a path".format(field))
+        intervals = bool(request.get("intervals", False))
+        chords = bool(request.get("chords", False))
+        if intervals and chords:
+            raise RequestError("intervals and chords can't be used together")
+
+        start = time.perf_counter()
+        names1, parts1 = await self.parts(request["file1"], intervals, chords)
+        names2, parts2 = await self.parts(request["file2"], intervals, chords)
+        number1 = _partNumber(names1, request.get("part1", 0))
+        number2 = _partNumber(names2, request.get("part2", 0))
+        part1, part2 = parts1[number1], parts2[number2]
+
+        # both metrics are symmetric, so (a, b) and (b, a) share a key
+        key = self.distances.key(ENGINES[metric], part1, part2)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.counters["coalesced"] += 1
+            score = await asyncio.shield(pending)
+        else:
+            score = self.distances.lookup(key)
+            if score is not MISSING:
+                self.counters["remembered"] += 1
+            else:
+                if self._waiting >= self.queue:
+                    self.counters["busy"] += 1
+                    raise RequestError("busy")
+                self._waiting += 1
+                pending = self._inflight[key] = asyncio.ensure_future(self._scorePair(key, metric, part1, part2))
+                score = await asyncio.shield(pending)
+
+        longer = max(len(part1), len(part2))
+        if metric == "levenshtein":
+            similarity = 1 - score / longer if longer else 1.0
+        else:
+            similarity = score / longer if longer else 1.0
+        return {"score": int(score), "length1": len(part1), "length2": len(part2),
+                "similarity": similarity, "ms": (time.perf_counter() - start) * 1000}
+
+    async def _scorePair(self, key, metric, part1, part2):
+        try:
+            score = await self._run(_score, metric, part1, part2)
+        finally:
+            self._waiting -= 1
+            del self._inflight[key]
+        self.distances.store(key, score)
+        self.counters["scored"] += 1
+        return score
+
+    async def answer(self, line):
+        """the reply (a dict) to one line of the protocol"""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            self.counters["errors"] += 1
+            return {"error": "not JSON"}
+        if not isinstance(request, dict):
+            self.counters["errors"] += 1
+            return {"error": "a request is a JSON object"}
+        reply = {"id": request.get("id")}
+        op = request.get("op", "compare")
+        if op == "stats":
+            reply.update(self.stats())
+            return reply
+        if op == "ping":
+            return reply
+        if op != "compare":
+            self.counters["errors"] += 1
+            reply["error"] = "unknown op: {!r}".format(op)
+            return reply
+        self.counters["requests"] += 1
+        try:
+            reply.update(await self.compare(request))
+        except RequestError as e:
+            if str(e) != "busy":
+                self.counters["errors"] += 1
+            reply["error"] = str(e)
+        except Exception as e:
+            # whatever went wrong, the request gets an answer rather than leaving the client waiting
+            self.counters["errors"] += 1
+            reply["error"] = "{}: {}".format(type(e).__name__, e)
+        return reply
+
+    async def handle(self, reader, writer):
+        """serves one connection until the client closes it"""
+        self.counters["connections"] += 1
+        window = asyncio.Semaphore(self.window)
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(line):
+            try:
+                reply = await self.answer(line)
+                async with lock:
+                    writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+                    # the client has to read its replies to keep sending
+                    await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                window.release()
+
+        try:
+            while True:
+                await window.acquire()
+                line = await reader.readline()
+                if not line:
+                    window.release()
+                    break
+                if not line.strip():
+                    window.release()
+                    continue
+                task = asyncio.ensure_future(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    async def serve(self, path=None, host="127.0.0.1", port=DEFAULT_PORT, ready=None):
+        """
+        serves on the Unix socket at path, or else on host:port, until cancelled.
+        ready(server) is called once it is listening
+        """
+        self.start()
+        try:
+            if path is not None:
+                server = await asyncio.start_unix_server(self.handle, path=path)
+            else:
+                server = await asyncio.start_server(self.handle, host=host, port=port)
+            async with server:
+                if ready is not None:
+                    ready(server)
+                await server.serve_forever()
+        finally:
+            self.close()
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+# Incremental edit distance against a fixed reference part, for notes that arrive one
+# at a time (score following from a live MIDI input, a part that is still growing).
+#
+# The reference runs down the rows of the DP matrix and every pushed note adds one
+# column, so a push only needs the previous column: O(m) numpy work with
+# engine="numpy", or O(m / wordsize) with engine="bitparallel", which keeps the column
+# as Myers' vertical delta bit vectors (as levenshteinBitParallel does) and never
+# materializes it unless asked.
+#
+# semiGlobal=True lets the notes pushed so far match anywhere in the reference: the
+# first column is all zeros (skipping reference notes before the match is free) and
+# the distance is the smallest value of the current column (so is skipping the ones
+# after it). Its row is where in the reference the match currently ends.
+
+import numpy as np
+
+from encoding import EncodedPart, comparableTokens
+from helpers import Music21Helper, _plain
+
+ENGINES = ("bitparallel", "numpy")
+
+
+class StreamingMatcher():
+    """
+    matcher = StreamingMatcher(reference, semiGlobal=True)
+    for note in performance:
+        matcher.push(note)
+        matcher.distance, matcher.end    # best match so far, and where it ends in reference
+
+    reference is a list of letter names or an encoding.EncodedPart. pushed notes are
+    letter names; for an EncodedPart reference they can also be its codes (pitch
+    classes 0-11, SPELLED_NAMES positions, or for interval parts intervals, or
+    (interval, ratio) pairs when the reference has duration ratios). a pitch class set
+    reference also takes chords as tuples of letter names, or as set masks.
+
+    without semiGlobal, distance is levenshteinDistanceDP(pushed notes, reference) and
+    end is always len(reference)
+    """
+    def __init__(self, reference, semiGlobal=False, engine="bitparallel"):
+        if engine not in ENGINES:
+            raise ValueError("unknown engine: {}".format(engine))
+        self.semiGlobal = semiGlobal
+        self.engine = engine
+        self._alphabet = None
+        self._ratios = False
+        if isinstance(reference, EncodedPart):
+            self._alphabet = reference.alphabet
+            self._ratios = reference.ratios is not None
+        # the tokens the engines compare, ratios packed in and all
+        self._codes = comparableTokens(reference, reference)[0]
+        self.reference = _plain(self._codes)
+        self._tokens = {}
+        self._masks = Music21Helper.matchMasks(self._codes) if engine == "bitparallel" else None
+        self._costs = {}
+        self.reset()
+
+    def reset(self):
+        """forgets every pushed note"""
+        m = len(self.reference)
+        self.length = 0
+        self._column = None
+        if self.engine == "bitparallel":
+            self._full = (1 << m) - 1
+            self._last = 1 << (m - 1) if m else 0
+            # vertical deltas of the first column: +1 per row, or all 0 when semi-global
+            self._pv = 0 if self.semiGlobal else self._full
+            self._mv = 0
+            self._score = 0 if self.semiGlobal else m
+        else:
+            self._column = np.zeros(m + 1, dtype=np.int64) if self.semiGlobal else np.arange(m + 1, dtype=np.int64)
+            self._offsets = np.arange(m + 1, dtype=np.int64)
+            self._tmp = np.empty(m + 1, dtype=np.int64)
+        self._best = None
+
+    def __len__(self):
+        return self.length
+
+    def _token(self, note):
+        """note as the token the reference is compared in"""
+        if self._alphabet is None:
+            return note
+        token = self._tokens.get(note)
+        if token is None:
+            if isinstance(note, str):
+                if self._alphabet == "interval":
+                    raise ValueError("push intervals to an interval reference, not letter names")
+                token = int(EncodedPart.fromLetterNames([note], alphabet=self._alphabet).codes[0])
+            elif self._alphabet == "pitchClassSet" and isinstance(note, tuple):
+                token = int(np.bitwise_or.reduce(EncodedPart.fromLetterNames(note, alphabet="pitchClassSet").codes))
+            elif self._ratios:
+                interval, ratio = note
+                token = int(interval) * 256 + int(ratio)
+            else:
+                token = int(note)
+            self._tokens[note] = token
+        return token
+
+    def push(self, note):
+        """adds one note to the end of the query and updates the last column"""
+        token = self._token(note)
+        self.length += 1
+        self._best = None
+        if self.engine == "bitparallel":
+            self._pushBits(token)
+        else:
+            self._pushColumn(token)
+
+    def extend(self, notes):
+        for note in notes:
+            self.push(note)
+
+    def _pushBits(self, token):
+        # one step of levenshteinBitParallel, with the query note as the scanned token
+        full, pv, mv = self._full, self._pv, self._mv
+        if not full:
+            # an empty reference: every pushed note is an insertion (as in Music21Helper._myersScan)
+            self._score += 1
+            self._column = None
+            return
+        eq = self._masks.get(token, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & self._last:
+            self._score += 1
+        elif mh & self._last:
+            self._score -= 1
+        # row 0 is the number of query notes, it grows by one every column
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        self._pv = mh | (~(xv | ph) & full)
+        self._mv = ph & xv
+        self._column = None
+
+    def _pushColumn(self, token):
+        # one row of Music21Helper._levenshteinRows, along the reference
+        cost = self._costs.get(token)
+        if cost is None:
+            if isinstance(self._codes, np.ndarray):
+                # pitch class set codes compare by overlap here
+                cost = np.asarray(self._codes != token)
+            else:
+                cost = np.fromiter((t != token for t in self.reference), dtype=bool, count=len(self.reference))
+            self._costs[token] = cost
+        prev, tmp = self._column, self._tmp
+        tmp[0] = self.length
+        np.minimum(prev[:-1] + cost, prev[1:] + 1, out=tmp[1:])
+        tmp -= self._offsets
+        column = np.minimum.accumulate(tmp)
+        column += self._offsets
+        self._column = column
+
+    def column(self):
+        """the last DP column: column()[i] is the distance of the query to reference[:i] (or to a substring ending at i)"""
+        if self._column is None:
+            m = len(self.reference)
+            nbytes = (m + 7) // 8
+            bits = lambda v: np.unpackbits(np.frombuffer(v.to_bytes(nbytes, "little"), dtype=np.uint8),
+                                           bitorder="little")[:m].astype(np.int64)
+            column = np.empty(m + 1, dtype=np.int64)
+            column[0] = self.length
+            np.cumsum(bits(self._pv) - bits(self._mv), out=column[1:])
+            column[1:] += self.length
+            self._column = column
+        return self._column
+
+    def _bestMatch(self):
+        if self._best is None:
+            if not self.semiGlobal:
+                m = len(self.reference)
+                distance = self._score if self.engine == "bitparallel" else int(self._column[m])
+                self._best = (distance, m)
+            else:
+                column = self.column()
+                # the earliest end among equally good matches
+                end = int(np.argmin(column))
+                self._best = (int(column[end]), end)
+        return self._best
+
+    @property
+    def distance(self):
+        """edit distance of the notes pushed so far to the reference (semi-global: to its best matching stretch)"""
+        return self._bestMatch()[0]
+
+    @property
+    def end(self):
+        """where in the reference the best match of the pushed notes ends (exclusive)"""
+        return self._bestMatch()[1]
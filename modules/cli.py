@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+# One entry point for the comparison tools:
+#
+#   python3 modules/cli.py compare FILE1 FILE2 -m lcs --part Viola --fast
+#   python3 modules/cli.py levenshtein [FILE1 FILE2]     (or lcs: compare with that metric)
+#   python3 modules/cli.py compose DIRECTORY -n 100      (generated scores, as MIDI files)
+#   python3 modules/cli.py corpus|motifs|pack|index|serve|warm ...
+#
+# The last are the scripts of modules/ of the same name, given the rest of the command
+# line. Heavy imports wait until a subcommand runs, which imports only what its path
+# needs: a comparison read from a warm score cache (--cache) or straight from the MIDI
+# events (--fast) never imports music21. tests/startup.py times the cold starts.
+
+import os
+import sys
+import argparse
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+modules_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(modules_dir, "..", "data")
+
+# subcommands that run a script of modules/ with the rest of the command line
+SCRIPTS = {
+  "corpus": ("corpus_matrix.py", "score every part of a directory against every other part"),
+  "motifs": ("motifs.py", "find the passages parts of different files share"),
+  "pack": ("pack_corpus.py", "pack the parts of a directory into a memory-mapped corpus store"),
+  "index": ("ngram_index.py", "build or query an n-gram index of a directory"),
+  "serve": ("serve.py", "answer comparisons over a socket"),
+  "warm": ("warm_cache.py", "parse every file of a directory into the score cache"),
+}
+
+METRICS = ("levenshtein", "lcs")
+
+def compare(parser, args):
+  # each driver module only imports comparison, which leaves music21 to the paths that convert streams
+  if args.metric == "lcs":
+    from composition_lcs_score import LCS as Driver
+  else:
+    from composition_levenshtein_score import Levenshtein as Driver
+  if (args.file1 is None) != (args.file2 is None):
+    parser.error("give both files, or neither to pick two at random")
+
+  driver = Driver.fromArguments(parser, args)
+  file1 = args.file1 or driver.helper.selectFile(data_dir)
+  file2 = args.file2 or driver.helper.selectFile(data_dir)
+  if args.file1 is None:
+    print("First file selected for analysis: {}".format(file1))
+    print("Second file selected for analysis: {}".format(file2))
+  driver.compute(file1, file2)
+  driver.saveProfile()
+
+def compose(parser, args):
+  from composer import Compose
+
+  paths = Compose(args.key).write_scores(args.directory, args.scores, parts=args.parts, notes=args.notes,
+                                          seed=args.seed, workers=args.workers)
+  print("Wrote {} scores to {}".format(len(paths), args.directory))
+
+def runScript(name, argv):
+  """runs modules/<script of name> as if it was started with argv"""
+  import runpy
+
+  script = os.path.join(modules_dir, SCRIPTS[name][0])
+  sys.argv = [script] + list(argv)
+  if modules_dir not in sys.path:
+    sys.path.insert(0, modules_dir)
+  runpy.run_path(script, run_name="__main__")
+
+def makeParser(command=None):
+  """
+  the parser of every subcommand. the comparison options come from comparison.py, which
+  imports numpy, so only a compare command's parser gets them (--help lists the
+  subcommands without importing anything)
+  """
+  parser = argparse.ArgumentParser(prog="cli.py", description="Compare, index and generate MIDI scores")
+  commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+  commands.required = True
+
+  for name in ("compare",) + METRICS:
+    metric = "" if name == "compare" else " by {}".format("the longest common subsequence" if name == "lcs" else "Levenshtein distance")
+    sub = commands.add_parser(name, help="compare one part of two MIDI files{}".format(metric))
+    sub.add_argument('file1', nargs='?', help='first MIDI file (default: one from data/ at random)')
+    sub.add_argument('file2', nargs='?', help='second MIDI file (default: one from data/ at random)')
+    if name == "compare":
+      sub.add_argument('-m', '--metric', choices=METRICS, default='levenshtein')
+    else:
+      sub.set_defaults(metric=name)
+    if command == name:
+      from comparison import ScoreComparison
+      ScoreComparison.addArguments(sub)
+    sub.set_defaults(run=compare, parser=sub)
+
+  sub = commands.add_parser("compose", help="generate random scores and write them as MIDI files")
+  sub.add_argument('directory', help='directory to write the scores to')
+  sub.add_argument('-n', '--scores', type=int, default=10, help='scores to generate')
+  sub.add_argument('--parts', type=int, default=4, help='parts per score')
+  sub.add_argument('--notes', type=int, default=200, help='notes per part')
+  sub.add_argument('--key', default='g', help='key the pitches are drawn from (default: g)')
+  sub.add_argument('--seed', type=int, default=None, help='seed, for the same scores every run')
+  sub.add_argument('-j', '--workers', type=int, default=4, help='threads writing the files')
+  sub.set_defaults(run=compose, parser=sub)
+
+  # listed for --help; main() hands their arguments to the script before parsing
+  for name, (script, description) in SCRIPTS.items():
+    commands.add_parser(name, help="{} (modules/{}; see {} --help)".format(description, script, name), add_help=False)
+  return parser
+
+def main(argv=None):
+  argv = sys.argv[1:] if argv is None else list(argv)
+  if argv and argv[0] in SCRIPTS:
+    return runScript(argv[0], argv[1:])
+  parser = makeParser(argv[0] if argv else None)
+  args = parser.parse_args(argv)
+  # errors are reported by the subcommand's parser, with its usage
+  args.run(args.parser, args)
+
+if __name__ == '__main__':
+  main()
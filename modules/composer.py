@@ -1,10 +1,13 @@
 #!/usr/bin/python3
 
-from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import inspect
+import math
 import os
 import sys
 
-from music21 import environment, key, metadata, note, stream
+from music21 import chord, environment, key, metadata, note, stream
 import numpy as np
 
 # add ../lib to the system path
@@ -12,7 +15,9 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
 # add ../resources to the system path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "resources"))
 
+from encoding import EncodedPart
 from helpers import Music21Helper
+from midiwriter import MidiDirectoryWriter, midiBytes
 
 
 # ## Musescore setup
@@ -32,6 +37,15 @@ from helpers import Music21Helper
 
 
 
+# a prenote of sample_note_durations: (start, length, end) as get_note_with_duration
+# draws them, plus the prenote's number
+NOTE_DTYPE = np.dtype([("id", np.int32), ("start", np.float64), ("length", np.float64), ("end", np.float64)])
+
+# a note or rest of schedule_measures
+EVENT_DTYPE = np.dtype([("measure", np.int32), ("id", np.int32), ("start", np.float64),
+                        ("length", np.float64), ("end", np.float64), ("pitch", np.int16)])
+
+
 class Compose:
     """ Generates a musical score given a string representation of a key,
         following music21's convention which uses lowercase letters for minor mode
@@ -45,16 +59,25 @@ class Compose:
 
     """
     
-    def __init__(self, given_key):
+    def __init__(self, given_key, seed=None):
+        """ seed seeds self.rng, the numpy Generator every random choice is drawn from.
+            by default it is drawn from numpy's global random state, so np.random.seed
+            still makes a run repeatable
+        """
+        self.given_key = given_key
         self.key = key.Key(given_key)
         self.pitch_names = [i.name for i in self.key.pitches]
+        if seed is None:
+            # an explicit dtype: the default int is 32-bit on Windows, too small for 2**32
+            seed = np.random.randint(2**32, dtype=np.int64)
+        self.rng = np.random.default_rng(seed)
         
     def melody(self, length):
         """given an int length,
            returns a list of pitch names randomly selected from
            list of notes ϵ self.key
         """
-        return [np.random.choice(self.pitch_names) for i in range(length)]
+        return self.rng.choice(self.pitch_names, size=length).tolist()
     
     def convert_names_to_notes(self, pitch_names):
         """given a list of pitch names, eg ['A4'] 
@@ -71,8 +94,8 @@ class Compose:
         #get list of unique notes
         un = list(set(i.pitch.name for i in s))
 
-        for i in range(np.random.randint(0,len(un))):
-            un.remove(np.random.choice(un))
+        for i in range(self.rng.integers(0,len(un))):
+            un.remove(self.rng.choice(un))
 
         st.append( self.convert_names_to_notes(un) )
         return st
@@ -85,8 +108,8 @@ class Compose:
         """ given list of note.Note objects
             return chord.Chord of n notes, minNum <= n <= maxNum
         """
-        nl = [np.random.choice(self.get_notes_in_key()) for i in range(np.random.randint(minNum,maxNum))]
-        ch = chord.Chord(nl)
+        nl = self.rng.choice(self.pitch_names, size=self.rng.integers(minNum,maxNum)).tolist()
+        ch = chord.Chord(self.convert_names_to_notes(nl))
         return ch
     
     def create_part_chords(self, chords):
@@ -111,15 +134,102 @@ class Compose:
             inserting rests
 
         """
-        #generate 100 random note durations
-        a = []
-        for i in range(100):
-            a.append((f"n{i}", self.get_note_with_duration()))
-            
-        a_sorted = sorted(a,key=lambda x: x[1][2])
-        notes = self.greedy_note_duration_selector(a_sorted)
-        measure = self.note_seq_to_measure(notes)
-        return measure
+        return self.events_to_measures(self.schedule_measures(1))[0]
+
+    def sample_note_durations(self, measures, notes=100, measureEndTime=20, qlen=[1.0,2.0,4.0], qlen_prob=[0.15, 0.35, 0.5]):
+        """ the array version of get_note_with_duration: draws notes prenotes
+            for each of measures measures, as a (measures, notes) NOTE_DTYPE array
+            (field id is the prenote's number within its measure)
+
+            start is drawn from the starts some length fits after, and length from
+            the lengths that fit there, weighted by qlen_prob: the distribution
+            get_note_with_duration's rejection loop gives, without the loop
+        """
+        qlen = np.asarray(qlen, dtype=np.float64)
+        starts = np.arange(measureEndTime)
+        # P(length | start): qlen_prob restricted to the lengths that fit, renormalized
+        weights = np.where(starts[:, None] + qlen[None, :] <= measureEndTime, np.asarray(qlen_prob, dtype=np.float64), 0.0)
+        valid = weights.sum(axis=1) > 0
+        if not valid.any():
+            raise ValueError("no length in qlen fits in a measure of {}".format(measureEndTime))
+        starts, weights = starts[valid], weights[valid]
+        cdf = np.cumsum(weights, axis=1) / weights.sum(axis=1, keepdims=True)
+
+        start = self.rng.integers(len(starts), size=(measures, notes))
+        u = self.rng.random((measures, notes))
+        length = (u[..., None] >= cdf[start]).sum(axis=-1)
+        # rounding can leave u past the last cumulative weight
+        length = np.minimum(length, len(qlen) - 1)
+
+        prenotes = np.empty((measures, notes), dtype=NOTE_DTYPE)
+        prenotes["id"] = np.arange(notes)
+        prenotes["start"] = starts[start]
+        prenotes["length"] = qlen[length]
+        prenotes["end"] = prenotes["start"] + prenotes["length"]
+        return prenotes
+
+    def schedule_measures(self, measures, notes=100, measureEndTime=20, qlen=[1.0,2.0,4.0], qlen_prob=[0.15, 0.35, 0.5]):
+        """ the array version of create_measure_from_gen_notes, for measures measures at
+            once: samples notes prenotes per measure, keeps a maximum mutually compatible
+            set of them (earliest finish first) and fills the gaps between them with rests.
+
+            returns the notes and rests of every measure as one EVENT_DTYPE array, ordered
+            by measure then end time; rests have id -1 and pitch -1, notes a pitch
+            indexing self.pitch_names
+        """
+        prenotes = self.sample_note_durations(measures, notes, measureEndTime, qlen, qlen_prob)
+        # stable, so prenotes ending together stay in id order as with sorted()
+        order = np.argsort(prenotes["end"], axis=1, kind="stable")
+        prenotes = np.take_along_axis(prenotes, order, axis=1)
+        selected = _earliest_finish(prenotes["start"], prenotes["end"])
+
+        rows, cols = np.nonzero(selected)
+        kept = prenotes[rows, cols]
+        # a rest wherever a note ends before the next one of its measure starts
+        same = rows[1:] == rows[:-1]
+        gap = same & (kept["end"][:-1] < kept["start"][1:])
+        before = np.flatnonzero(gap)
+
+        events = np.empty(len(kept) + len(before), dtype=EVENT_DTYPE)
+        # each rest goes right before the note after it
+        rest_at = before + 1 + np.arange(len(before))
+        is_rest = np.zeros(len(events), dtype=bool)
+        is_rest[rest_at] = True
+        notes_at = np.flatnonzero(~is_rest)
+        events["measure"][notes_at] = rows
+        events["id"][notes_at] = kept["id"]
+        events["start"][notes_at] = kept["start"]
+        events["length"][notes_at] = kept["length"]
+        events["end"][notes_at] = kept["end"]
+        events["pitch"][notes_at] = self.rng.integers(len(self.pitch_names), size=len(kept))
+        events["measure"][rest_at] = rows[before]
+        events["id"][rest_at] = -1
+        events["start"][rest_at] = kept["end"][before]
+        events["end"][rest_at] = kept["start"][before + 1]
+        events["length"][rest_at] = events["end"][rest_at] - events["start"][rest_at]
+        events["pitch"][rest_at] = -1
+        return events
+
+    def events_to_measures(self, events, measures=None):
+        """ given a schedule_measures array, returns a stream.Measure per measure
+            (measures of them, by default one per measure number in events),
+            numbered from 1, notes labelled with their id as in note_seq_to_measure
+        """
+        if measures is None:
+            measures = int(events["measure"].max()) + 1 if len(events) else 0
+        bounds = np.searchsorted(events["measure"], np.arange(measures + 1))
+        result = []
+        for number in range(measures):
+            s = stream.Measure(number=number + 1)
+            for i, start, length, pitch in events[["id", "start", "length", "pitch"]][bounds[number]:bounds[number + 1]].tolist():
+                if i < 0:
+                    n = note.Rest(quarterLength=length)
+                else:
+                    n = note.Note(self.pitch_names[pitch], quarterLength=length)
+                    n.lyric = f"n{i}"
+                s.append(n)
+            result.append(s)
+        return result
 
     def note_seq_to_measure(self,notes):
         """ takes a list of tuples like
@@ -190,10 +300,12 @@ class Compose:
             inserts in a stream.Part obj and returns the obj
 
         """
+        return self.part_from_events(self.schedule_measures(measures_per_part), measures_per_part)
+
+    def part_from_events(self, events, measures=None):
+        """ given a schedule_measures array, returns a stream.Part of its measures """
         part = stream.Part()
-        for i in range(1,measures_per_part+1):
-            m = self.create_measure_from_gen_notes()
-            m.number = i
+        for m in self.events_to_measures(events, measures):
             part.append(m)
         return part
         
@@ -202,12 +314,19 @@ class Compose:
         """ given list of stream.Parts
             return a stream.Score w/ each Part stacked together
         """
+        return self.score_from_schedules([self.schedule_measures(4) for i in range(parts)], score_title, composer)
+
+    def score_from_schedules(self, schedules, score_title="Piano concerto", composer="Anonymous COMP5030 student"):
+        """ given a schedule_measures array per part (of 4 measures each, as
+            create_part_from_measures draws them), return the stream.Score
+            create_score_from_parts builds of them
+        """
         # create a score container
         s = stream.Score()
 
         # insert stacked parts
-        for i in range(1,parts+1):
-            p = self.create_part_from_measures()
+        for i, events in enumerate(schedules, 1):
+            p = self.part_from_events(events, 4)
             p.id = f"Part{i}"
             s.insert(0,p)
 
@@ -225,34 +344,159 @@ class Compose:
         """
         return "".join([i.name for i in part.pitches])
     
-    def generate_candidate_parts(self, num_parts):
+    def generate_candidate_parts(self, num_parts, size=10):
         """ given num_parts (int)
             returns a list of candidate stream.Parts w/ id="part{i}"
         """
-        return [self.create_part_from_notes(f"part{i}") for i in range(num_parts)]
-    
-    def get_similar_parts(self, list_of_parts, dist_func=Music21Helper().levenshteinDistanceDP):
-        """ given list of candidate parts
-            returns subset (list) of most similar parts
+        pitches, durations = self.generate_batch(num_parts, size)
+        return self.batch_to_parts(pitches)
+
+    def generate_batch(self, parts, notes, qlen=[1.0,2.0,4.0], qlen_prob=[0.15, 0.35, 0.5]):
+        """ draws the pitches and durations of parts parts of notes notes each,
+            one Generator call for each. returns (pitches, durations), two
+            (parts, notes) arrays:
+                pitches <- indexes into self.pitch_names (uint8)
+                durations <- quarter lengths chosen from qlen with qlen_prob
         """
-        # convert each part to a note_str
-        note_str_list = [self.part_from_notes_to_str(i) for i in list_of_parts]
+        return _draw_batch(self.rng, len(self.pitch_names), parts, notes, qlen, qlen_prob)
 
-        # create dict of (str1,str2): distance(str1,str2) elements for all combinations
-        # of all pairs of parts represented in note_str_list
-        d = {}
-        for i,j in list(combinations(note_str_list,r=2)):
-            d[(i,j)] = dist_func(i,j)
+    def batch_to_strings(self, pitches):
+        """ given a (parts, notes) array of generate_batch pitches,
+            returns each part's string of concatenated pitch names
+            (the strings part_from_notes_to_str gives)
+        """
+        names = np.array(self.pitch_names)[pitches]
+        return ["".join(row) for row in names.tolist()]
 
-        # convert dict to sorted list
-        # https://stackoverflow.com/questions/613183/how-do-i-sort-a-dictionary-by-value
-        sorted_str_d = sorted(d.items(), key=lambda item: item[1])
+    def batch_to_encoded(self, pitches, prefix="part"):
+        """ given a (parts, notes) array of generate_batch pitches,
+            returns an encoding.EncodedPart (pitch classes) per part, named prefix{i}.
+            no music21 objects are built
+        """
+        table = EncodedPart.fromLetterNames(self.pitch_names).codes
+        codes = table[pitches]
+        return [EncodedPart(row, f"{prefix}{i}") for i, row in enumerate(codes)]
+
+    def batch_to_parts(self, pitches, durations=None, prefix="part"):
+        """ given generate_batch arrays, returns a stream.Part per row
+            w/ id=prefix{i}: the notes back to back, or when durations is None
+            quarter notes at offsets 1, 2, ... like create_part_from_notes
+        """
+        names = np.array(self.pitch_names)[pitches].tolist()
+        parts = []
+        for i, row in enumerate(names):
+            p = stream.Part(id=f"{prefix}{i}")
+            if durations is None:
+                # placed as create_part_from_notes places its notes, from offset 1
+                for k, name in enumerate(row):
+                    p.insert(k + 1, note.Note(name))
+            else:
+                for name, length in zip(row, durations[i].tolist()):
+                    p.append(note.Note(name, quarterLength=length))
+            parts.append(p)
+        return parts
+
+    def generate_scores(self, scores, parts=4, notes=200, workers=1, seed=None,
+                        qlen=[1.0,2.0,4.0], qlen_prob=[0.15, 0.35, 0.5]):
+        """ generates scores scores of parts parts of notes notes each
+            returns (pitches, durations), two (scores, parts, notes) arrays
+            as generate_batch gives them
+
+            every score has its own Generator, seeded by a child of seed (by default
+            drawn from self.rng) spawned with numpy's SeedSequence, so the scores are
+            the same whatever the number of workers; workers > 1 generates them on
+            that many processes, in one contiguous shard of scores each
+        """
+        if seed is None:
+            seed = int(self.rng.integers(2**63))
+        seeds = np.random.SeedSequence(seed).spawn(scores)
+        args = (len(self.pitch_names), parts, notes, qlen, qlen_prob)
+        if workers == 1 or scores < 2:
+            return _generate_scores(seeds, *args)
+        results = _map_shards(_generate_scores, seeds, workers, args)
+        return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+    def create_scores(self, scores, parts=2, workers=1, seed=None,
+                      score_title="Piano concerto", composer="Anonymous COMP5030 student"):
+        """ builds scores stream.Scores as create_score_from_parts does, each by a
+            Compose of its own seed, a SeedSequence child of seed (by default drawn
+            from self.rng), so the scores are the same whatever the number of workers.
+            workers > 1 draws their schedule_measures arrays on that many processes, in
+            one contiguous shard of scores each; the music21 objects are only ever
+            built here, from those arrays
+        """
+        if seed is None:
+            seed = int(self.rng.integers(2**63))
+        seeds = np.random.SeedSequence(seed).spawn(scores)
+        args = (self.given_key, parts)
+        if workers == 1 or scores < 2:
+            schedules = _schedule_scores(seeds, *args)
+        else:
+            schedules = [s for shard in _map_shards(_schedule_scores, seeds, workers, args) for s in shard]
+        return [self.score_from_schedules(parts_events, score_title, composer) for parts_events in schedules]
 
-        # get avg dist in dict
-        avg = np.round(np.mean([j for i,j in d.items()]))
-        
-        # return list of (str1,str2) pairs whose dist < avg
-        return [i for i,j in sorted_str_d if j < avg]
+    def midi_parts(self, pitches, durations):
+        """ given generate_batch arrays (or per part lists of schedule_measures
+            "pitch" and "length" arrays), returns the parts as midiwriter takes them:
+            (MIDI pitches, quarter lengths) per part, rests (pitch -1) kept as -1
+        """
+        table = np.array([note.Note(name).pitch.midi for name in self.pitch_names] + [-1])
+        return [(table[np.asarray(p, dtype=np.int64)], np.asarray(d)) for p, d in zip(pitches, durations)]
+
+    def batch_to_midi(self, pitches, durations, names=None):
+        """ given generate_batch arrays (one score), returns the bytes of a
+            Standard MIDI File of it, without building music21 objects
+        """
+        return midiBytes(self.midi_parts(pitches, durations), names)
+
+    def write_scores(self, directory, scores, parts=4, notes=200, seed=None, workers=4, chunk=256, prefix="score"):
+        """ generates scores scores as generate_scores(scores, parts, notes, seed=seed)
+            does, chunk scores at a time, and writes each to directory as
+            {prefix}{i}.mid on workers threads. returns the paths
+        """
+        if seed is None:
+            seed = int(self.rng.integers(2**63))
+        seeds = np.random.SeedSequence(seed).spawn(scores)
+        width = len(str(max(scores - 1, 0)))
+        names = [f"Part{i + 1}" for i in range(parts)]
+        with MidiDirectoryWriter(directory, workers=workers) as writer:
+            for start in range(0, scores, chunk):
+                pitches, durations = _generate_scores(seeds[start:start + chunk], len(self.pitch_names), parts, notes,
+                                                      [1.0,2.0,4.0], [0.15, 0.35, 0.5])
+                for i in range(len(pitches)):
+                    writer.write(f"{prefix}{start + i:0{width}d}.mid", self.midi_parts(pitches[i], durations[i]), names)
+        return writer.written
+
+    def get_similar_parts(self, list_of_parts, dist_func=Music21Helper().levenshteinDistanceDP,
+                          top_k=None, threshold=None, workers=1, chunksize=4096):
+        """ given list of candidate parts
+            returns (i, j) index pairs of the most similar parts, i < j, closest first:
+                by default the pairs whose distance is below the (rounded) mean distance,
+                with top_k the top_k closest pairs,
+                with threshold the pairs whose distance is below threshold
+
+            top_k and threshold only ever hold the pairs they keep, never the full pair
+            list. a dist_func that takes max_distance (like levenshteinDistanceDP) is given
+            the current cutoff so it can give up on pairs that can't make it.
+
+            workers > 1 scores the pairs on that many processes, chunksize pairs at a time
+        """
+        # convert each part to a note_str (strings and EncodedParts, say from
+        # batch_to_strings or batch_to_encoded, are compared as they are)
+        note_str_list = [i if isinstance(i, (str, EncodedPart)) else self.part_from_notes_to_str(i) for i in list_of_parts]
+        n = len(note_str_list)
+        total = n * (n - 1) // 2
+        chunks = [(start, min(start + chunksize, total)) for start in range(0, total, chunksize)]
+        args = (dist_func, top_k, threshold)
+
+        if workers == 1:
+            _init_pair_worker(note_str_list)
+            results = (_score_pair_chunk(chunk, *args) for chunk in chunks)
+            return _merge_pair_scores(results, total, top_k, threshold)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_pair_worker,
+                                 initargs=(note_str_list,)) as executor:
+            results = executor.map(_score_pair_chunk, chunks, *[[a] * len(chunks) for a in args])
+            return _merge_pair_scores(results, total, top_k, threshold)
 
     def get_note_with_duration(self,measureEndTime=20,qlen = [1.0,2.0,4.0],qlen_prob = [0.15, 0.35, 0.5]):
         """ returns a prenote w/ randomly selected
@@ -260,10 +504,10 @@ class Compose:
                 startTime <- random choice (from 0:measureEnd-duration)
             implicit: endTime = startTime + duration (endTime <= measureEnd)
         """
-        start = np.random.choice(range(measureEndTime))
-        length = np.random.choice(qlen,p=qlen_prob)
+        start = self.rng.integers(measureEndTime)
+        length = self.rng.choice(qlen,p=qlen_prob)
         while start + length > measureEndTime:
-            length = np.random.choice(qlen,p=qlen_prob)
+            length = self.rng.choice(qlen,p=qlen_prob)
         end = start + length
         return (start,length,end)
 
@@ -278,7 +522,8 @@ class Compose:
             s = a
         A = []
         A.append(s[0])
-        k = 1
+        # k is the last note selected, s[0] to begin with
+        k = 0
         for m in range(1,len(s)):
             if s[m][1][0] >= s[k][1][2]:
                 A.append(s[m])
@@ -291,9 +536,180 @@ class Compose:
             score.show('text')
         score.show()
 
+def _earliest_finish(starts, ends):
+    """ the earliest finish greedy selection over many measures at once
+        given (measures, notes) arrays of integer starts and ends, each row
+        sorted by end, returns a bool array of the notes selected in each row:
+        the first note, then again and again the first note starting at or
+        after the end of the last one selected
+    """
+    measures, notes = starts.shape
+    if notes == 0:
+        return np.zeros((measures, 0), dtype=bool)
+    last = int(starts.max()) + 1
+    rows = np.arange(measures)
+    position = np.broadcast_to(np.arange(notes), (measures, notes))
+    # first[r, t]: the first note of row r (in end order) starting at t or later;
+    # notes is "none"
+    first = np.full((measures, last + 1), notes)
+    np.minimum.at(first, (np.repeat(rows, notes), starts.astype(np.int64).ravel()), position.ravel())
+    first = np.minimum.accumulate(first[:, ::-1], axis=1)[:, ::-1]
+
+    selected = np.zeros((measures, notes), dtype=bool)
+    cursor = np.zeros(measures, dtype=np.int64)
+    active = rows
+    # every step selects one more note in each row still going; a row ends when no
+    # note starts after its last one
+    while len(active):
+        pick = first[active, cursor[active]]
+        found = pick < notes
+        active, pick = active[found], pick[found]
+        selected[active, pick] = True
+        cursor[active] = np.minimum(np.ceil(ends[active, pick]).astype(np.int64), last)
+        active = active[cursor[active] < last]
+    return selected
+
+
+def _draw_batch(rng, num_names, parts, notes, qlen, qlen_prob):
+    """the (pitches, durations) arrays of Compose.generate_batch, drawn from rng"""
+    pitches = rng.integers(num_names, size=(parts, notes), dtype=np.uint8)
+    durations = rng.choice(np.asarray(qlen), size=(parts, notes), p=qlen_prob)
+    return pitches, durations
+
+
+def _map_shards(function, seeds, workers, args):
+    """ function(shard, *args) for contiguous shards of seeds, one per process of a
+        pool of workers, in order
+    """
+    bounds = np.linspace(0, len(seeds), min(workers, len(seeds)) + 1).astype(int)
+    shards = [seeds[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, shards, *[[a] * len(shards) for a in args]))
+
+
+def _schedule_scores(seeds, given_key, parts):
+    """ the schedule_measures arrays of every part of Compose.create_scores' scores,
+        for a shard of seeds, drawn as create_score_from_parts draws them (runs on the pool)
+    """
+    schedules = []
+    for seed in seeds:
+        compose = Compose(given_key, seed=seed)
+        schedules.append([compose.schedule_measures(4) for i in range(parts)])
+    return schedules
+
+
+def _generate_scores(seeds, num_names, parts, notes, qlen, qlen_prob):
+    """ the generate_batch arrays of a shard of scores, each drawn from a Generator
+        of its own seed, stacked to (scores, parts, notes) (runs on the pool)
+    """
+    pitches = np.empty((len(seeds), parts, notes), dtype=np.uint8)
+    durations = np.empty((len(seeds), parts, notes))
+    for i, seed in enumerate(seeds):
+        pitches[i], durations[i] = _draw_batch(np.random.default_rng(seed), num_names, parts, notes, qlen, qlen_prob)
+    return pitches, durations
+
+
+# note strings of the parts get_similar_parts is scoring, set once per worker process
+_pair_worker = {}
+
 
+def _init_pair_worker(note_str_list):
+    _pair_worker["strings"] = note_str_list
 
 
+def _pair_at(n, k):
+    """ the k-th (i, j), i < j, pair of n parts in itertools.combinations(range(n), 2)
+        order. k can be an int or an array of them
+    """
+    k = np.asarray(k, dtype=np.int64)
+    # row i starts at pair number i*(2n-i-1)/2: invert that for the row of k
+    i = n - 2 - np.floor(np.sqrt(4 * n * (n - 1) - 8 * k - 7) / 2 - 0.5).astype(np.int64)
+    j = k + i + 1 - i * (2 * n - i - 1) // 2
+    return i, j
+
+
+def _pairs(n, start, stop):
+    """yields the pairs number start to stop-1 of n parts, see _pair_at"""
+    if start >= stop:
+        return
+    i, j = (int(x) for x in _pair_at(n, start))
+    for unused in range(start, stop):
+        yield i, j
+        j += 1
+        if j == n:
+            i += 1
+            j = i + 1
+
+
+def _score_pair_chunk(chunk, dist_func, top_k, threshold):
+    """ scores one chunk of pairs:
+            an array of every distance in the chunk (no top_k or threshold),
+            else a list of (distance, i, j) of the pairs kept
+    """
+    strings = _pair_worker["strings"]
+    start, stop = chunk
+    n = len(strings)
+    try:
+        bounded = "max_distance" in inspect.signature(dist_func).parameters
+    except (TypeError, ValueError):
+        bounded = False
+
+    if top_k is None and threshold is None:
+        return np.array([dist_func(strings[i], strings[j]) for i, j in _pairs(n, start, stop)], dtype=np.float64)
+
+    if top_k == 0:
+        return []
+    # max heap (negated) of the top_k closest pairs so far
+    heap = []
+    kept = []
+    # largest distance still worth computing exactly: below threshold, and no further
+    # than the worst pair of a full heap
+    limit = None if threshold is None else math.ceil(threshold) - 1
+    for i, j in _pairs(n, start, stop):
+        if bounded and limit is not None:
+            distance = dist_func(strings[i], strings[j], max_distance=max(int(limit), 0))
+        else:
+            distance = dist_func(strings[i], strings[j])
+        if threshold is not None and distance >= threshold:
+            continue
+        if top_k is None:
+            kept.append((distance, i, j))
+            continue
+        if len(heap) < top_k:
+            heapq.heappush(heap, (-distance, -i, -j))
+        elif (distance, i, j) < (-heap[0][0], -heap[0][1], -heap[0][2]):
+            heapq.heapreplace(heap, (-distance, -i, -j))
+        else:
+            continue
+        if len(heap) == top_k:
+            worst = -heap[0][0]
+            limit = worst if limit is None else min(limit, worst)
+    if top_k is None:
+        return kept
+    return [(-d, -i, -j) for d, i, j in heap]
+
+
+def _merge_pair_scores(results, total, top_k, threshold):
+    """ combines the chunks of _score_pair_chunk, in chunk order, into the (i, j) pairs
+        get_similar_parts returns
+    """
+    if top_k is None and threshold is None:
+        if not total:
+            return []
+        # one float per pair, in combinations order
+        distances = np.concatenate(list(results))
+        # get avg dist
+        avg = np.round(np.mean(distances))
+        below = np.flatnonzero(distances < avg)
+        # stable sort keeps equally distant pairs in combinations order
+        below = below[np.argsort(distances[below], kind="stable")]
+        n = int(round((1 + math.sqrt(1 + 8 * total)) / 2))
+        i, j = _pair_at(n, below)
+        return list(zip(i.tolist(), j.tolist()))
+    if top_k is None:
+        return [(i, j) for d, i, j in sorted(kept for chunk in results for kept in chunk)]
+    return [(i, j) for d, i, j in heapq.nsmallest(top_k, (kept for chunk in results for kept in chunk))]
+
 
 if __name__ == '__main__':
 
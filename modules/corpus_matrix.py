@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import argparse
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from concurrent.futures import ProcessPoolExecutor
+
+from corpus import Corpus, CorpusMatrix, METRICS, listScores, similarity
+from corpusstore import CorpusStore
+from scorecache import ScoreCache, DEFAULT_CACHE_DIR, extractScore, extractEvents
+
+data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+
+class Progress():
+  """prints units (pairs, by default) done, rate and time left on one line of stderr"""
+  def __init__(self, unit="pairs"):
+    self.unit = unit
+    self.start = time.perf_counter()
+    self.first = None
+
+  def __call__(self, done, total):
+    if self.first is None:
+      self.first = done
+    elapsed = time.perf_counter() - self.start
+    rate = (done - self.first) / elapsed if elapsed > 0 else 0
+    eta = "{:.0f}s".format((total - done) / rate) if rate > 0 else "?"
+    sys.stderr.write("\r{}/{} {} ({:.0%}), {:.1f} {}/s, {} left   ".format(done, total, self.unit, done / total if total else 1, rate, self.unit, eta))
+    if done == total:
+      sys.stderr.write("\n")
+    sys.stderr.flush()
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Score every part of every MIDI file against every other part")
+  parser.add_argument('directory', nargs='?', default=data_dir, help='directory of MIDI files (default: data/)')
+  parser.add_argument('--against', help='second directory: score its parts (columns) against the first directory\'s (rows) instead of all pairs of one corpus')
+  parser.add_argument('-m', '--metric', choices=METRICS, default='levenshtein')
+  parser.add_argument('-o', '--output', help='.npy or .csv file to write (default: <metric>.npy). an interrupted run with the same output resumes')
+  parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: one per cpu, 1 to run in this process)')
+  parser.add_argument('--chunk', type=int, default=16, help='parts per side of a work unit')
+  parser.add_argument('--raw', action='store_true', help='write raw distances / lcs lengths instead of percent similarity')
+  parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_DIR, help='reuse parsed scores from a score cache (optionally at this directory)')
+  parser.add_argument('--fast', action='store_true', help='read notes directly from the MIDI events, without building music21 streams')
+  parser.add_argument('--store', help='read the parts from a corpus store (see pack_corpus.py) instead of the directory; the workers share its memory map')
+  args = parser.parse_args()
+
+  if args.store and args.against:
+    parser.error("--against reads a directory, it can't be used with --store")
+
+  output = args.output or "{}.npy".format(args.metric)
+  cache = None
+  if args.cache:
+    cache = ScoreCache(args.cache, extractor=extractEvents if args.fast else extractScore)
+
+  if args.store:
+    rows, cols = Corpus.fromStore(CorpusStore(args.store)), None
+  else:
+    rowPaths = listScores(args.directory)
+    colPaths = listScores(args.against) if args.against else None
+    print("Loading {} files...".format(len(rowPaths) + len(colPaths or [])))
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+      rows = Corpus.load(rowPaths, cache, args.fast, executor)
+      cols = Corpus.load(colPaths, cache, args.fast, executor) if colPaths else None
+
+  matrix = CorpusMatrix(rows, cols, metric=args.metric, output=output, chunk=args.chunk)
+  print("Computing a {} x {} {} matrix...".format(matrix.shape[0], matrix.shape[1], args.metric))
+  scores = matrix.compute(workers=args.workers, progress=Progress())
+  if not args.raw:
+    scores = similarity(scores, rows.lengths(), (rows if cols is None else cols).lengths(), args.metric)
+  matrix.save(scores, similarities=not args.raw)
+  print("Wrote {}".format(output))
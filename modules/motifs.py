@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import csv
+import argparse
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from corpus import Corpus, listScores, mineMotifs
+from corpus_matrix import Progress
+from encoding import substitutionMatrix
+from scorecache import ScoreCache, DEFAULT_CACHE_DIR, extractScore, extractEvents
+
+data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Find the passages parts of different MIDI files share, by local (Smith-Waterman) alignment")
+  parser.add_argument('directory', nargs='?', default=data_dir, help='directory of MIDI files (default: data/)')
+  parser.add_argument('--query', help='only align the parts of this MIDI file against the directory\'s')
+  parser.add_argument('-k', '--top', type=int, default=3, help='non-overlapping hits per pair of parts')
+  parser.add_argument('--min-score', type=int, default=24, help='smallest alignment score to report (a match scores 2)')
+  parser.add_argument('--intervals', action='store_true', help='align the intervals between notes, so transposed passages match')
+  parser.add_argument('--neighbours', action='store_true', help='score notes a tone or semitone apart -1 instead of -2 (not with --intervals)')
+  parser.add_argument('--same-file', action='store_true', help='also align parts of the same file with each other')
+  parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: one per cpu, 1 to run in this process)')
+  parser.add_argument('-n', '--limit', type=int, default=20, help='hits to print')
+  parser.add_argument('-o', '--output', help='write every hit to this .csv file')
+  parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_DIR, help='reuse parsed scores from a score cache (optionally at this directory)')
+  parser.add_argument('--fast', action='store_true', help='read notes directly from the MIDI events, without building music21 streams')
+  args = parser.parse_args()
+
+  if args.neighbours and args.intervals:
+    parser.error("--neighbours scores pitch classes, it can't be used with --intervals")
+  cache = None
+  if args.cache:
+    cache = ScoreCache(args.cache, extractor=extractEvents if args.fast else extractScore)
+
+  corpus = Corpus.load(listScores(args.directory), cache, args.fast, intervals=args.intervals)
+  query = Corpus.load([args.query], cache, args.fast, intervals=args.intervals) if args.query else None
+  rows, cols = (query, corpus) if query else (corpus, None)
+  substitution = substitutionMatrix() if args.neighbours else None
+
+  print("Aligning {} parts against {}...".format(len(rows), len(cols) if cols else "each other"))
+  hits = mineMotifs(rows, cols, top=args.top, minScore=args.min_score, substitution=substitution,
+                    sameFile=args.same_file, workers=args.workers, progress=Progress("rows"))
+  cols = rows if cols is None else cols
+
+  for score, i, j, (start1, end1), (start2, end2) in hits[:args.limit]:
+    print("{:>5}  {} notes {}-{}  ~  {} notes {}-{}".format(score, rows.labels[i], start1, end1, cols.labels[j], start2, end2))
+
+  if args.output:
+    with open(args.output, "w", newline="") as f:
+      writer = csv.writer(f)
+      writer.writerow(["score", "part1", "start1", "end1", "part2", "start2", "end2"])
+      for score, i, j, (start1, end1), (start2, end2) in hits:
+        writer.writerow([score, rows.labels[i], start1, end1, cols.labels[j], start2, end2])
+    print("Wrote {} hits to {}".format(len(hits), args.output))
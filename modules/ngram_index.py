@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import argparse
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from corpus import Corpus, listScores, loadParts
+from ngramindex import NgramIndex, MODES, RANKINGS
+from scorecache import ScoreCache, DEFAULT_CACHE_DIR, extractScore, extractEvents
+
+data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+
+def build(args, cache):
+  corpus = Corpus.load(listScores(args.directory), cache, args.fast)
+  start = time.perf_counter()
+  index = NgramIndex.build(corpus.parts, corpus.labels, corpus.files, n=args.n, mode=args.mode)
+  index.save(args.index)
+  print("Indexed {} parts ({} distinct {}-grams) in {:.2f}s into {}".format(
+    len(index), len(index.grams), args.n, time.perf_counter() - start, args.index))
+
+def query(args, cache):
+  index = NgramIndex.load(args.index)
+  parts = loadParts(args.file, cache, args.fast)
+  if args.part is not None:
+    parts = [parts[args.part]]
+  for part in parts:
+    start = time.perf_counter()
+    matches = index.query(part, top=args.top, candidates=args.candidates, rank=args.rank, metric=args.metric, locate=True)
+    print("{} part of {} ({} notes), {:.3f}s:".format(part.name, args.file, len(part), time.perf_counter() - start))
+    for m in matches:
+      print("  {:<40} {} {:>6}  shared {}-grams {:>6}  bound {:>6}  offset {}".format(
+        m.label, args.metric, m.distance, index.n, m.shared, m.bound, m.offset))
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Build or query an n-gram index of the parts of a directory of MIDI files")
+  parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_DIR, help='reuse parsed scores from a score cache (optionally at this directory)')
+  parser.add_argument('--fast', action='store_true', help='read notes directly from the MIDI events, without building music21 streams')
+  commands = parser.add_subparsers(dest='command', required=True)
+
+  buildParser = commands.add_parser('build', help='index every part of every MIDI file in a directory')
+  buildParser.add_argument('directory', nargs='?', default=data_dir, help='directory of MIDI files (default: data/)')
+  buildParser.add_argument('-o', '--index', default='ngram.idx', help='index directory to write')
+  buildParser.add_argument('-n', type=int, default=4, help='notes (or intervals) per gram')
+  buildParser.add_argument('--mode', choices=MODES, default='pitch', help='grams of pitch classes, or of intervals (transposition invariant)')
+
+  queryParser = commands.add_parser('query', help='find the indexed parts most similar to the parts of a MIDI file')
+  queryParser.add_argument('file', help='MIDI file to query with')
+  queryParser.add_argument('-i', '--index', default='ngram.idx', help='index directory')
+  queryParser.add_argument('-p', '--part', type=int, help='query with this part only (default: every part)')
+  queryParser.add_argument('-k', '--top', type=int, default=5, help='matches to report')
+  queryParser.add_argument('-c', '--candidates', type=int, default=50, help='most parts to run the exact DP on')
+  queryParser.add_argument('--rank', choices=RANKINGS, default='qgram')
+  queryParser.add_argument('-m', '--metric', choices=('levenshtein', 'lcs'), default='levenshtein')
+  args = parser.parse_args()
+
+  cache = None
+  if args.cache:
+    cache = ScoreCache(args.cache, extractor=extractEvents if args.fast else extractScore)
+  if args.command == 'build':
+    build(args, cache)
+  else:
+    query(args, cache)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import argparse
+from collections import Counter
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from concurrent.futures import ProcessPoolExecutor
+
+from corpus import listScores
+from corpusstore import CorpusStore
+from scorecache import ScoreCache, DEFAULT_CACHE_DIR, extractScore, extractEvents
+
+data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Pack the encoded parts of every MIDI file in a directory into one memory-mapped corpus store")
+  parser.add_argument('directory', nargs='?', default=data_dir, help='directory of MIDI files (default: data/)')
+  parser.add_argument('-o', '--output', default='corpus.npy', help='store to write: the codes go in this .npy file, the table of parts in <name>.json (default: corpus.npy)')
+  parser.add_argument('--intervals', action='store_true', help='store the intervals between notes instead of pitch classes')
+  parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes reading the files (default: one per cpu)')
+  parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_DIR, help='reuse parsed scores from a score cache (optionally at this directory)')
+  parser.add_argument('--fast', action='store_true', help='read notes directly from the MIDI events, without building music21 streams')
+  args = parser.parse_args()
+
+  cache = None
+  if args.cache:
+    cache = ScoreCache(args.cache, extractor=extractEvents if args.fast else extractScore)
+
+  paths = listScores(args.directory)
+  print("Reading {} files...".format(len(paths)))
+  with ProcessPoolExecutor(max_workers=args.workers) as executor:
+    store = CorpusStore.pack(paths, args.output, cache, args.fast, args.intervals, executor)
+
+  composers = Counter(entry["composer"] or "?" for entry in store.table)
+  print("Wrote {} parts, {} {} codes, to {}".format(len(store), int(store.lengths.sum()), store.alphabet, store.path))
+  print(", ".join("{}: {} parts".format(composer, n) for composer, n in sorted(composers.items())))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import asyncio
+import argparse
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from distancecache import DistanceCache
+from service import ComparisonService, DEFAULT_PORT
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Answer Levenshtein / LCS comparisons of MIDI parts over a socket, one JSON request per line (see lib/service.py)")
+  parser.add_argument('--unix', metavar='PATH', help='listen on this Unix socket instead of TCP')
+  parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+  parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='TCP port (default: {})'.format(DEFAULT_PORT))
+  parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes for reading and scoring (default: one per cpu)')
+  parser.add_argument('--queue', type=int, default=64, help='comparisons that may wait for a worker before requests are answered "busy"')
+  parser.add_argument('--window', type=int, default=16, help='requests in flight per connection before the service stops reading from it')
+  parser.add_argument('--max-scores', type=int, default=256, help='parsed files kept in memory')
+  parser.add_argument('--distances', metavar='PATH', help='also keep results in this sqlite file, for later runs')
+  args = parser.parse_args()
+
+  distances = DistanceCache(max_bytes=16 * 1024 * 1024, path=args.distances) if args.distances else None
+  service = ComparisonService(workers=args.workers, queue=args.queue, window=args.window, maxScores=args.max_scores, distances=distances)
+  where = args.unix or "{}:{}".format(args.host, args.port)
+  try:
+    asyncio.run(service.serve(path=args.unix, host=args.host, port=args.port,
+                              ready=lambda server: print("Serving comparisons on {}".format(where), flush=True)))
+  except KeyboardInterrupt:
+    pass
+  finally:
+    if args.unix and os.path.exists(args.unix):
+      os.remove(args.unix)
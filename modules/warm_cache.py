@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import argparse
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from scorecache import ScoreCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, extractScore, extractEvents
+
+data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Parse every MIDI file in a directory into the score cache")
+  parser.add_argument('directory', nargs='?', default=data_dir, help='directory of MIDI files (default: data/)')
+  parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='score cache location')
+  parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES, help='evict least recently used scores past this size')
+  parser.add_argument('--fast', action='store_true', help='read notes directly from the MIDI events, without building music21 streams')
+  args = parser.parse_args()
+
+  cache = ScoreCache(args.cache_dir, max_bytes=args.max_bytes, extractor=extractEvents if args.fast else extractScore)
+  for path, cached in cache.warm(args.directory):
+    print("{} {}".format("cached " if cached else "parsed ", path))
+
+  print("Cache size: {} bytes in {}".format(cache.size(), args.cache_dir))
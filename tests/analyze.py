@@ -1,106 +1,201 @@
 # -*- coding: utf-8 -*-
 
-# Analysis for the main driver code underlying the LCS and Lev modules.
-# We will analyize only this algorithmic code.
-# We will not be analyzing the time that it takes the music21 helper
+# Benchmarks for the algorithmic code underlying the LCS and Lev modules.
+# We time only the distance engines in the Music21Helper, not the time it takes
 # to read and convert MIDI files into a workable format.
+#
+# Inputs are seeded: for a given --seed every engine sees exactly the same pairs of
+# inputs, so results can be compared across engines and across releases.
 
+import csv
+import json
+import os
+import platform
 import random
 import string
-import time
-import os
 import sys
+import time
 import argparse
-import matplotlib.pyplot as plt
+
+import numpy as np
 
 # add ../modules to the system path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
 # add ../lib to the system path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
 
+from encoding import EncodedPart
 from helpers import Music21Helper
 
-class TestGenerator():
-    def __init__(self):
-        self.helper = Music21Helper()
+data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+
+# engine name -> function of two token sequences
+ENGINES = {
+    "levenshtein-python": lambda a, b: Music21Helper.levenshteinDistanceDP(a, b),
+    "levenshtein-numpy": lambda a, b: Music21Helper.levenshteinDistanceDP(a, b, engine="numpy"),
+    "levenshtein-bitparallel": Music21Helper.levenshteinBitParallel,
+    "lcs-python": lambda a, b: Music21Helper.lcsDP(a, b),
+    "lcs-traceback": lambda a, b: len(Music21Helper.lcsDP(a, b, traceback=True)[0]),
+    "lcs-bitparallel": Music21Helper.lcsBitParallel,
+    "smith-waterman": lambda a, b: (Music21Helper.smithWaterman(a, b) or (0,))[0],
+}
+
+INPUTS = ("random", "data")
+
+FIELDS = ["engine", "inputs", "size", "length1", "length2", "iterations", "warmup",
+          "min_ns", "median_ns", "p95_ns", "mean_ns", "result"]
+
+
+class InputGenerator():
+    """
+    pairs of inputs of a given size, the same ones for the same seed:
+    "random" strings of letters, or `size` consecutive notes of two parts from data/
+    """
+    def __init__(self, seed=5030, directory=data_dir):
+        self.seed = seed
+        self.directory = directory
+        self._parts = None
+
+    def parts(self):
+        # deferred: random-only runs never read MIDI files
+        if self._parts is None:
+            from corpus import Corpus, listScores
+            self._parts = Corpus.load(listScores(self.directory), fast=True).parts
+        return self._parts
+
+    def rng(self, inputs, size):
+        return random.Random("{}:{}:{}".format(self.seed, inputs, size))
 
     @staticmethod
-    def generateString(size, allowed_chars=string.ascii_letters):
-        return ''.join(random.choice(allowed_chars) for i in range(size))
-
-    def testCaseLCS(self, input_size, iterations):
-        times = []
-        for i in range(iterations):
-            print("Starting iteration {}".format(i))
-            token1 = self.generateString(input_size)
-            token2 = self.generateString(input_size)
-            start_time = time.time()
-            self.helper.lcsDP(token1, token2)
-            elapsed = time.time() - start_time
-            times.append(elapsed)
-            print("Iteration {} complete".format(i))
-        return times
-
-    def testCaseLevenshtein(self, input_size, iterations):
-        times = []
-        for i in range(iterations):
-            print("Starting iteration {}".format(i))
-            token1 = self.generateString(input_size)
-            token2 = self.generateString(input_size)
-            start_time = time.time()
-            self.helper.levenshteinDistanceDP(token1, token2)
-            elapsed = time.time() - start_time
-            times.append(elapsed)
-            print("Iteration {} complete".format(i))
-        return times
-
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser()
-    parser.add_argument('-s', '--input-size', nargs='+', help='Input sizes to run. ex: -s 10 100 1000', required=True)
-    parser.add_argument('-i', '--iterations', help='Number of iterations to run for each input size', required=True)
-    args = parser.parse_args()
-
-    input_size = args.input_size
-    iterations = args.iterations
-
-    if input_size == ['big']:
-        r = range(10000)
-        input_size = [num for num in r if num % 100 == 0]
-
-    print("recieved input size(s): " + str(input_size))
-    print("received iteration count: " + str(iterations))
-
-    testGen = TestGenerator()
+    def generateString(rng, size, allowed_chars=string.ascii_letters):
+        return ''.join(rng.choice(allowed_chars) for i in range(size))
+
+    def pairs(self, inputs, size, count):
+        rng = self.rng(inputs, size)
+        if inputs == "random":
+            return [(self.generateString(rng, size), self.generateString(rng, size)) for i in range(count)]
+        parts = self.parts()
+        pairs = []
+        for i in range(count):
+            part1, part2 = rng.choice(parts), rng.choice(parts)
+            start1 = rng.randrange(max(len(part1) - size, 0) + 1)
+            start2 = rng.randrange(max(len(part2) - size, 0) + 1)
+            pairs.append((EncodedPart(part1.codes[start1:start1 + size], part1.name),
+                          EncodedPart(part2.codes[start2:start2 + size], part2.name)))
+        return pairs
+
+
+def timeEngine(engine, pairs, warmup):
+    """runs engine over every pair after `warmup` untimed runs, returns (times in ns, first result)"""
+    for i in range(warmup):
+        engine(*pairs[i % len(pairs)])
+    times = []
+    result = None
+    for token1, token2 in pairs:
+        start = time.perf_counter_ns()
+        value = engine(token1, token2)
+        times.append(time.perf_counter_ns() - start)
+        if result is None:
+            result = value
+    return times, result
+
+
+def benchmark(engines, inputs, sizes, iterations, warmup=1, seed=5030, log=None):
+    """returns one row (a dict with FIELDS) per engine, input kind and size"""
+    generator = InputGenerator(seed)
+    rows = []
+    for kind in inputs:
+        for size in sizes:
+            pairs = generator.pairs(kind, size, iterations)
+            for name in engines:
+                if log is not None:
+                    log("{} on {} inputs of size {}".format(name, kind, size))
+                times, result = timeEngine(ENGINES[name], pairs, warmup)
+                rows.append({
+                    "engine": name,
+                    "inputs": kind,
+                    "size": size,
+                    "length1": len(pairs[0][0]),
+                    "length2": len(pairs[0][1]),
+                    "iterations": iterations,
+                    "warmup": warmup,
+                    "min_ns": int(np.min(times)),
+                    "median_ns": int(np.median(times)),
+                    "p95_ns": int(np.percentile(times, 95)),
+                    "mean_ns": int(np.mean(times)),
+                    "result": float(result),
+                })
+    return rows
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+def writeResults(rows, path, meta):
+    """rows to a .json file, under meta, or a .csv file that starts with meta as "# name: value" lines"""
+    if path.lower().endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            for name, value in meta.items():
+                f.write("# {}: {}\n".format(name, json.dumps(value)))
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, "w") as f:
+            json.dump({"meta": meta, "results": rows}, f, indent=2)
+
+
+def printTable(rows):
+    print("{:<24} {:<7} {:>6} {:>12} {:>12} {:>12}".format("engine", "inputs", "size", "median ms", "p95 ms", "min ms"))
+    for row in rows:
+        print("{:<24} {:<7} {:>6} {:>12.3f} {:>12.3f} {:>12.3f}".format(
+            row["engine"], row["inputs"], row["size"], row["median_ns"] / 1e6, row["p95_ns"] / 1e6, row["min_ns"] / 1e6))
+
+
+def plot(rows):
+    import matplotlib.pyplot as plt
 
     plt.xlabel("Input size")
-    plt.ylabel("Running time")
-
-    avg_times = []
-
-    # get times for running LCS
-    print("========== Beginning LCS Tests ===========")
-    for size in input_size:
-        print("running test for size {}".format(size))
-        times = testGen.testCaseLCS(int(size), int(iterations))
-        average = sum(times)/len(times)
-        avg_times.append(average)
+    plt.ylabel("Median running time (ms)")
+    for name in dict.fromkeys(row["engine"] for row in rows):
+        for kind in dict.fromkeys(row["inputs"] for row in rows):
+            points = [(row["size"], row["median_ns"] / 1e6) for row in rows if row["engine"] == name and row["inputs"] == kind]
+            if points:
+                plt.plot(*zip(*points), label="{} ({})".format(name, kind))
+    plt.legend()
+    plt.show()
 
-    # plot LCS
-    plt.plot(input_size, avg_times, label="LCS Runtime")
 
-    # clear times
-    avg_times = []
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the distance engines on seeded inputs")
+    parser.add_argument('-s', '--input-size', nargs='+', default=['100', '500', '1000'], help='Input sizes to run. ex: -s 10 100 1000, or -s big for 100-10,000')
+    parser.add_argument('-i', '--iterations', type=int, default=5, help='Number of timed iterations for each input size')
+    parser.add_argument('-w', '--warmup', type=int, default=1, help='untimed runs before timing each engine')
+    parser.add_argument('-e', '--engines', nargs='+', choices=sorted(ENGINES), default=list(ENGINES), help='engines to time (default: all)')
+    parser.add_argument('--inputs', nargs='+', choices=INPUTS, default=list(INPUTS), help='random strings, parts from data/, or both')
+    parser.add_argument('--seed', type=int, default=5030, help='seed for the inputs')
+    parser.add_argument('-o', '--output', help='write the results to this .json or .csv file')
+    parser.add_argument('-q', '--quiet', action='store_true', help='don\'t report progress')
+    parser.add_argument('--plot', action='store_true', help='show a matplotlib graph of the median times')
+    args = parser.parse_args()
 
-    # get times for running Lev
-    print("========== Beginning Levenshtein Tests ===========")
-    for size in input_size:
-        print("running test for size {}".format(size))
-        times = testGen.testCaseLCS(int(size), int(iterations))
-        average = sum(times)/len(times)
-        avg_times.append(average)
+    if args.input_size == ['big']:
+        sizes = list(range(100, 10001, 100))
+    else:
+        sizes = [int(size) for size in args.input_size]
 
-    # plot Lev
-    plt.plot(input_size, avg_times, label="Levenshtein Runtime")
+    log = None if args.quiet else lambda message: print(message, file=sys.stderr)
+    rows = benchmark(args.engines, args.inputs, sizes, args.iterations, args.warmup, args.seed, log)
 
-    plt.legend()
-    plt.show()
\ No newline at end of file
+    meta = dict(environment(), seed=args.seed, sizes=sizes, iterations=args.iterations, warmup=args.warmup)
+    if args.output:
+        writeResults(rows, args.output, meta)
+    printTable(rows)
+    if args.plot:
+        plot(rows)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+# Load generator for the comparison service (lib/service.py, modules/serve.py).
+# Sends seeded random comparisons of parts of the files in data/ from several
+# connections at once and reports throughput and latency percentiles, plus the
+# service's own counters (coalesced and remembered requests, "busy" answers,
+# files read).
+#
+# --pairs limits the distinct comparisons drawn from, so a small value shows
+# coalescing and warm scores, a large one the cost of scoring. --serve runs a
+# service in this process instead of connecting to one.
+
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import argparse
+
+import numpy as np
+
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from service import ComparisonService, DEFAULT_PORT
+
+data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def makeRequests(directory, count, pairs, metric, parts=4, seed=5030):
+    """count seeded comparison requests drawn from pairs distinct comparisons"""
+    rng = random.Random(seed)
+    files = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                   if name.endswith((".mid", ".midi", ".squ")))
+    distinct = [(rng.choice(files), rng.randrange(parts), rng.choice(files), rng.randrange(parts))
+                for i in range(pairs)]
+    requests = []
+    for number in range(count):
+        file1, part1, file2, part2 = rng.choice(distinct)
+        requests.append({"id": number, "file1": file1, "part1": part1, "file2": file2, "part2": part2, "metric": metric})
+    return requests
+
+
+async def connect(path, host, port):
+    if path is not None:
+        return await asyncio.open_unix_connection(path)
+    return await asyncio.open_connection(host, port)
+
+
+async def client(path, host, port, requests, window, latencies, replies):
+    """sends requests over one connection, at most window unanswered at a time"""
+    reader, writer = await connect(path, host, port)
+    sent = {}
+    slots = asyncio.Semaphore(window)
+
+    async def receive():
+        for i in range(len(requests)):
+            reply = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - sent.pop(reply["id"]))
+            replies.append(reply)
+            slots.release()
+
+    receiving = asyncio.ensure_future(receive())
+    for request in requests:
+        await slots.acquire()
+        sent[request["id"]] = time.perf_counter()
+        writer.write(json.dumps(request).encode("utf-8") + b"\n")
+        await writer.drain()
+    await receiving
+    writer.close()
+
+
+async def stats(path, host, port):
+    reader, writer = await connect(path, host, port)
+    writer.write(b'{"op": "stats"}\n')
+    await writer.drain()
+    reply = json.loads(await reader.readline())
+    writer.close()
+    return reply
+
+
+async def run(args):
+    requests = makeRequests(args.directory, args.requests, args.pairs, args.metric, seed=args.seed)
+    serving = None
+    path, host, port = args.unix, args.host, args.port
+    if args.serve:
+        service = ComparisonService(workers=args.workers, queue=args.queue)
+        path = os.path.join(tempfile.mkdtemp(), "loadgen.sock")
+        ready = asyncio.get_running_loop().create_future()
+        serving = asyncio.ensure_future(service.serve(path=path, ready=ready.set_result))
+        await ready
+
+    latencies, replies = [], []
+    # deal the requests out to the connections
+    shares = [requests[i::args.connections] for i in range(args.connections)]
+    start = time.perf_counter()
+    await asyncio.gather(*[client(path, host, port, share, args.window, latencies, replies) for share in shares])
+    elapsed = time.perf_counter() - start
+    counters = await stats(path, host, port)
+
+    if serving is not None:
+        serving.cancel()
+        try:
+            await serving
+        except asyncio.CancelledError:
+            pass
+        os.remove(path)
+
+    milliseconds = np.array(latencies) * 1000
+    errors = [reply["error"] for reply in replies if "error" in reply]
+    return {
+        "requests": len(replies),
+        "errors": len(errors) - errors.count("busy"),
+        "busy": errors.count("busy"),
+        "seconds": elapsed,
+        "requests_per_second": len(replies) / elapsed,
+        "latency_ms": {name: float(np.percentile(milliseconds, q)) for name, q in
+                       (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))},
+        "service": {name: counters[name] for name in ("scored", "coalesced", "remembered", "busy", "scores_read")},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure the throughput and latency of the comparison service")
+    parser.add_argument('directory', nargs='?', default=data_dir, help='directory of MIDI files (default: data/)')
+    parser.add_argument('--unix', metavar='PATH', help='connect to the service on this Unix socket')
+    parser.add_argument('--host', default='127.0.0.1', help='host of the service')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='TCP port of the service')
+    parser.add_argument('--serve', action='store_true', help='start a service in this process instead of connecting to one')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='with --serve, the service\'s worker processes')
+    parser.add_argument('--queue', type=int, default=64, help='with --serve, the service\'s queue limit')
+    parser.add_argument('-n', '--requests', type=int, default=200, help='comparisons to request')
+    parser.add_argument('--pairs', type=int, default=50, help='distinct comparisons to draw the requests from')
+    parser.add_argument('-c', '--connections', type=int, default=4, help='concurrent connections')
+    parser.add_argument('-w', '--window', type=int, default=8, help='unanswered requests per connection')
+    parser.add_argument('-m', '--metric', choices=["levenshtein", "lcs"], default="levenshtein", help='the comparison to request')
+    parser.add_argument('--seed', type=int, default=5030, help='seed for the requests')
+    parser.add_argument('-o', '--output', help='write the results to this .json file')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print("{requests} requests in {seconds:.2f}s: {requests_per_second:.1f} requests/s, {errors} errors, {busy} busy".format(**results))
+    print("latency (ms): " + ", ".join("{} {:.1f}".format(name, ms) for name, ms in results["latency_ms"].items()))
+    print("service: " + ", ".join("{} {}".format(name, n) for name, n in results["service"].items()))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print("Wrote the results to {}".format(args.output))
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+# Benchmark of Compose's measure builders: the tuple path of get_note_with_duration,
+# greedy_note_duration_selector and get_gaps_in_seq against the array path of
+# schedule_measures, first for the schedule of notes and rests alone, then with the
+# music21 Measures built from it (note_seq_to_measure against events_to_measures).
+
+import json
+import os
+import sys
+import time
+import argparse
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from composer import Compose
+
+
+def tupleSchedule(compose, notes=100):
+    """one measure's notes and rests, the way create_measure_from_gen_notes used to"""
+    a = [(f"n{i}", compose.get_note_with_duration()) for i in range(notes)]
+    selected = compose.greedy_note_duration_selector(sorted(a, key=lambda x: x[1][2]))
+    return selected, compose.get_gaps_in_seq(selected)
+
+
+def timeIt(function, measures):
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "measures_per_second": measures / seconds}
+
+
+def run(measures, notes, seed):
+    compose = Compose("g", seed=seed)
+    # the music21 paths are far slower, so they build a tenth as many measures
+    built = max(1, measures // 10)
+    results = {
+        "tuples": timeIt(lambda: [tupleSchedule(compose, notes) for i in range(measures)], measures),
+        "arrays": timeIt(lambda: compose.schedule_measures(measures, notes), measures),
+        "tuples+music21": timeIt(lambda: [compose.note_seq_to_measure(tupleSchedule(compose, notes)[0]) for i in range(built)], built),
+        "arrays+music21": timeIt(lambda: compose.events_to_measures(compose.schedule_measures(built, notes), built), built),
+    }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the tuple and array measure builders of Compose")
+    parser.add_argument('-n', '--measures', type=int, default=2000, help='measures to schedule (a tenth of that are built as music21 Measures)')
+    parser.add_argument('--notes', type=int, default=100, help='prenotes drawn per measure')
+    parser.add_argument('--seed', type=int, default=5030, help='seed for the Generator')
+    parser.add_argument('-o', '--output', help='write the results to this .json file')
+    args = parser.parse_args()
+
+    results = run(args.measures, args.notes, args.seed)
+    for name, result in results.items():
+        print("{:<16} {:>10.0f} measures/s  ({:.3f}s)".format(name, result["measures_per_second"], result["seconds"]))
+    print("arrays are {:.0f}x faster at scheduling, {:.1f}x with music21".format(
+        results["arrays"]["measures_per_second"] / results["tuples"]["measures_per_second"],
+        results["arrays+music21"]["measures_per_second"] / results["tuples+music21"]["measures_per_second"]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print("Wrote the results to {}".format(args.output))
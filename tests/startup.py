@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+# Cold-start times of the command line tools: each command is started as a new python
+# process `--repeat` times and timed from start to exit, so the numbers include the
+# interpreter and every import. Each is run once more under `python -X importtime` to
+# report how long its imports took and whether it imported music21.
+#
+# The comparisons are of the same two parts of two files in data/, read from the MIDI
+# events (--fast), from a warm score cache (--cache, filled by a first untimed run) and
+# with music21.
+#
+# `cli.py --help` must not import numpy (or anything else heavy): checkHelp() runs it
+# in a new process and fails when numpy ends up in sys.modules.
+
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import argparse
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+cli = os.path.join(root, "modules", "cli.py")
+data_dir = os.path.join(root, "data")
+mozart = os.path.join(data_dir, "mozsq1.mid")
+haydn = os.path.join(data_dir, "haydn_sq_A_20-6_1.squ")
+
+
+def commands(cache):
+    """(name, arguments to python) of every command timed"""
+    lcs = [cli, "lcs", mozart, haydn, "--part", "0"]
+    return [
+        ("python", ["-c", "pass"]),
+        ("cli.py --help", [cli, "--help"]),
+        ("lcs --fast", lcs + ["--fast"]),
+        ("lcs --fast --cache", lcs + ["--fast", "--cache", cache]),
+        ("lcs (music21)", lcs),
+        ("composition_lcs_score.py --fast", [os.path.join(root, "modules", "composition_lcs_score.py"), "--fast", "--part", "0"]),
+    ]
+
+
+def run(arguments, importtime=False):
+    """seconds from starting python with arguments to its exit, and its stderr"""
+    start = time.perf_counter()
+    done = subprocess.run([sys.executable] + (["-X", "importtime"] if importtime else []) + arguments,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    seconds = time.perf_counter() - start
+    if done.returncode:
+        raise RuntimeError("{} failed:\n{}".format(" ".join(arguments), done.stderr))
+    return seconds, done.stderr
+
+
+def imports(stderr):
+    """(total seconds of imports, whether music21 was imported) from -X importtime output"""
+    total = 0
+    music21 = False
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)", line)
+        if match is None:
+            continue
+        # only top level imports, their cumulative times include the rest
+        if not match.group(2):
+            total += int(match.group(1))
+        music21 |= match.group(3).split(".")[0] == "music21"
+    return total / 1e6, music21
+
+
+def modulesAfter(arguments):
+    """the modules in sys.modules once cli.py has run with arguments, in a new process"""
+    code = ("import runpy, sys\n"
+            "sys.argv = {!r}\n"
+            "try:\n"
+            "    runpy.run_path(sys.argv[0], run_name='__main__')\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "sys.stderr.write('\\n'.join(sys.modules))\n").format([cli] + list(arguments))
+    done = subprocess.run([sys.executable, "-c", code], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return set(done.stderr.splitlines())
+
+
+def checkHelp():
+    """fails when cli.py --help imports numpy"""
+    imported = modulesAfter(["--help"])
+    assert "numpy" not in imported, "cli.py --help imported numpy"
+    assert "music21" not in imported, "cli.py --help imported music21"
+
+
+def measure(repeat):
+    cache = tempfile.mkdtemp()
+    try:
+        # fill the cache, so the timed --cache runs find both files in it
+        run(commands(cache)[3][1])
+        results = {}
+        for name, arguments in commands(cache):
+            times = [run(arguments)[0] for i in range(repeat)]
+            importSeconds, music21 = imports(run(arguments, importtime=True)[1])
+            results[name] = {"median": statistics.median(times), "min": min(times),
+                             "imports": importSeconds, "music21": music21}
+        return results
+    finally:
+        shutil.rmtree(cache)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the cold start of the command line tools")
+    parser.add_argument('-n', '--repeat', type=int, default=5, help='runs of each command')
+    parser.add_argument('-o', '--output', help='write the results to this .json file')
+    args = parser.parse_args()
+
+    checkHelp()
+    results = measure(args.repeat)
+    print("{:<34} {:>8} {:>8} {:>8}  {}".format("command", "median", "min", "imports", "music21"))
+    for name, result in results.items():
+        print("{:<34} {:>7.3f}s {:>7.3f}s {:>7.3f}s  {}".format(name, result["median"], result["min"], result["imports"],
+                                                            "imported" if result["music21"] else "-"))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print("Wrote the results to {}".format(args.output))
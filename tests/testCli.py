@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import subprocess
+import tempfile
+import shutil
+import sys
+import os
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from corpusstore import CorpusStore
+from helpers import Music21Helper
+from midievents import MidiEvents
+from startup import checkHelp, modulesAfter
+
+helper = Music21Helper()
+
+cli = os.path.join(os.path.dirname(__file__), "..", "modules", "cli.py")
+data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+mozart = os.path.join(data_dir, "mozsq1.mid")
+haydn = os.path.join(data_dir, "haydn_sq_A_20-6_1.squ")
+
+def run(*arguments):
+    """(stdout, modules imported) of cli.py run with arguments in a new process"""
+    done = subprocess.run([sys.executable, "-X", "importtime", cli] + list(arguments),
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    assert done.returncode == 0, done.stderr
+    imported = {line.split("|")[-1].strip() for line in done.stderr.splitlines() if line.startswith("import time:")}
+    return done.stdout, imported
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testCompareWithoutMusic21(self):
+        parts1 = MidiEvents.read(mozart).encodedParts()
+        parts2 = MidiEvents.read(haydn).encodedParts()
+        lcs = helper.lcsBitParallel(parts1[1], parts2[1])
+
+        out, imported = run("lcs", mozart, haydn, "--part", "1", "--fast")
+        assert "Length of the longest common subsequence: {}".format(lcs) in out
+        assert "music21" not in imported and "comparison" in imported
+
+        cache = os.path.join(self.tmp, "cache")
+        run("compare", mozart, haydn, "--part", "1", "--fast", "--cache", cache)
+        # from the warm cache
+        out, imported = run("compare", mozart, haydn, "-m", "lcs", "--part", "1", "--fast", "--cache", cache)
+        assert "Length of the longest common subsequence: {}".format(lcs) in out
+        assert "music21" not in imported
+
+        out, imported = run("levenshtein", mozart, haydn, "--part", "1", "--fast")
+        distance = helper.levenshteinBitParallel(parts1[1], parts2[1])
+        assert "Raw distance between inputs: {}".format(distance) in out
+
+    def testHelpIsLazy(self):
+        checkHelp()
+        assert "numpy" not in modulesAfter(["compose", "--help"])
+        assert "comparison" in modulesAfter(["lcs", "--help"])
+
+    def testScripts(self):
+        output = os.path.join(self.tmp, "corpus.npy")
+        out, imported = run("pack", data_dir, "-o", output, "--fast", "-j", "1")
+        assert "Wrote" in out and "music21" not in imported
+        assert len(CorpusStore(output)) == 92
+
+    def testCompose(self):
+        directory = os.path.join(self.tmp, "scores")
+        out, imported = run("compose", directory, "-n", "3", "--notes", "20", "--seed", "4")
+        assert sorted(os.listdir(directory)) == ["score0.mid", "score1.mid", "score2.mid"]
+        assert [len(p) for p in MidiEvents.read(os.path.join(directory, "score1.mid")).encodedParts()] == [20] * 4
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import shutil
+import tempfile
+import sys
+import os
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from comparison import LazyParts
+from composition_lcs_score import LCS
+from composition_levenshtein_score import Levenshtein
+from helpers import Music21Helper
+from scorecache import ScoreCache, extractEvents
+
+helper = Music21Helper()
+
+data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+path = os.path.join(data_dir, "mozsq1.mid")
+
+class TestComparison(unittest.TestCase):
+
+    def testLazyParts(self):
+        loads = []
+        parts = LazyParts(["a", "b", "c"], lambda number: loads.append(number) or number * 10)
+
+        assert len(parts) == 3 and loads == []
+        assert parts[1] == 10 and parts[-1] == 20 and parts[1] == 10
+        assert loads == [1, 2]
+        assert parts.loaded() == [1, 2]
+        assert list(parts) == [0, 10, 20]
+        with self.assertRaises(IndexError):
+            parts[3]
+
+    def testSelectOnlyDecodesOnePart(self):
+        for select in ("Viola", 2, lambda names: names.index("Viola")):
+            driver = Levenshtein(fast=True, select=select)
+            parts = driver.loadParts(path)
+            part = driver.selectPart(parts)
+
+            assert part.name == "Viola"
+            assert parts.loaded() == [2]
+
+        with self.assertRaises(ValueError):
+            LCS(fast=True, select="Flute").selectPart(LCS(fast=True).loadParts(path))
+
+    def testSourcesAgree(self):
+        events = LCS(fast=True, select="Cello")
+        cello = events.selectPart(events.loadParts(path))
+
+        # music21 converts the cello track alone
+        music21 = LCS(select="Cello")
+        parts = music21.loadParts(path)
+        assert music21.selectPart(parts).codes.tolist() == cello.codes.tolist()
+        assert parts.loaded() == [3]
+
+        tmp = tempfile.mkdtemp()
+        try:
+            cached = LCS(cache=ScoreCache(tmp, extractor=extractEvents), select="Cello", intervals=True)
+            intervals = LCS(fast=True, select=3, intervals=True)
+            assert cached.selectPart(cached.loadParts(path)).alphabet == "interval"
+            assert cached.selectPart(cached.loadParts(path)).codes.tolist() == intervals.selectPart(intervals.loadParts(path)).codes.tolist()
+        finally:
+            shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    unittest.main()
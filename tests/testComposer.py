@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import sys
+import os
+from itertools import combinations
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+import numpy as np
+
+from composer import Compose, _earliest_finish
+from helpers import Music21Helper
+
+helper = Music21Helper()
+
+class TestSimilarParts(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        np.random.seed(5030)
+        cls.compose = Compose("g")
+        cls.parts = [cls.compose.create_part_from_notes(f"part{i}", size=np.random.randint(4, 12)) for i in range(12)]
+        # an exact copy, which the old string-keyed dict would have collapsed
+        cls.parts.append(cls.parts[0])
+        strings = [cls.compose.part_from_notes_to_str(p) for p in cls.parts]
+        cls.scored = sorted((helper.levenshteinDistanceDP(strings[i], strings[j]), i, j)
+                            for i, j in combinations(range(len(strings)), 2))
+
+    def testBelowMean(self):
+        avg = np.round(np.mean([d for d, i, j in self.scored]))
+        expected = [(i, j) for d, i, j in self.scored if d < avg]
+
+        assert self.compose.get_similar_parts(self.parts) == expected
+        assert self.compose.get_similar_parts(self.parts, chunksize=7) == expected
+        assert (0, 12) in expected
+
+    def testTopK(self):
+        for k in (0, 1, 5, 40, 1000):
+            expected = [(i, j) for d, i, j in self.scored[:k]]
+
+            assert self.compose.get_similar_parts(self.parts, top_k=k, chunksize=9) == expected
+
+    def testThreshold(self):
+        expected = [(i, j) for d, i, j in self.scored if d < 6]
+
+        assert self.compose.get_similar_parts(self.parts, threshold=6, chunksize=10) == expected
+        assert self.compose.get_similar_parts(self.parts, threshold=6, top_k=3) == expected[:3]
+
+    def testUnboundedDistance(self):
+        lcs = lambda a, b: -helper.lcsDP(a, b)
+        strings = [self.compose.part_from_notes_to_str(p) for p in self.parts]
+        scored = sorted((lcs(strings[i], strings[j]), i, j) for i, j in combinations(range(len(strings)), 2))
+
+        assert self.compose.get_similar_parts(self.parts, dist_func=lcs, top_k=4) == [(i, j) for d, i, j in scored[:4]]
+
+    def testWorkers(self):
+        expected = [(i, j) for d, i, j in self.scored[:10]]
+
+        assert self.compose.get_similar_parts(self.parts, top_k=10, workers=2, chunksize=8) == expected
+
+class TestBatch(unittest.TestCase):
+
+    def testSeeded(self):
+        pitches, durations = Compose("g", seed=7).generate_batch(3, 50)
+        again = Compose("g", seed=7).generate_batch(3, 50)
+
+        assert pitches.shape == durations.shape == (3, 50)
+        assert (pitches == again[0]).all() and (durations == again[1]).all()
+        assert pitches.max() < len(Compose("g").pitch_names)
+        assert set(np.unique(durations)) <= {1.0, 2.0, 4.0}
+
+    def testScoresIndependentOfWorkers(self):
+        compose = Compose("E-")
+        pitches, durations = compose.generate_scores(5, parts=4, notes=30, seed=11)
+        sharded = compose.generate_scores(5, parts=4, notes=30, seed=11, workers=2)
+
+        assert pitches.shape == (5, 4, 30)
+        assert (pitches == sharded[0]).all() and (durations == sharded[1]).all()
+        # each score draws from its own seed
+        assert not (pitches[0] == pitches[1]).all()
+        assert compose.generate_scores(0, notes=30)[0].shape == (0, 4, 30)
+
+    def testConversions(self):
+        compose = Compose("g", seed=3)
+        pitches, durations = compose.generate_batch(6, 12)
+        parts = compose.batch_to_parts(pitches, durations)
+        strings = compose.batch_to_strings(pitches)
+
+        assert strings == [compose.part_from_notes_to_str(p) for p in parts]
+        assert [p.duration.quarterLength for p in parts] == durations.sum(axis=1).tolist()
+        encoded = compose.batch_to_encoded(pitches)
+        assert [e.letterNames() for e in encoded] == [[n.name for n in p.pitches] for p in parts]
+        assert compose.get_similar_parts(strings, top_k=5) == compose.get_similar_parts(parts, top_k=5)
+        # encoded parts are compared note by note, not character by character
+        names = [e.letterNames() for e in encoded]
+        scored = sorted((helper.levenshteinDistanceDP(names[i], names[j]), i, j) for i, j in combinations(range(6), 2))
+        assert compose.get_similar_parts(encoded, top_k=5) == [(i, j) for d, i, j in scored[:5]]
+
+    def testCandidatePartOffsets(self):
+        compose = Compose("g", seed=2)
+        legacy = compose.create_part_from_notes("part0", size=6)
+        candidates = compose.generate_candidate_parts(3, size=6)
+
+        assert [c.id for c in candidates] == ["part0", "part1", "part2"]
+        for part in candidates:
+            assert [n.offset for n in part.notes] == [n.offset for n in legacy.notes] == [1, 2, 3, 4, 5, 6]
+            assert part.duration.quarterLength == legacy.duration.quarterLength
+
+    def testScoresSharded(self):
+        compose = Compose("E-")
+        # measure by measure, as the scores are built
+        notes = lambda score: [(m.number, [(n.offset, n.duration.quarterLength, n.name) for n in m.notesAndRests])
+                               for p in score.parts for m in p.getElementsByClass("Measure")]
+        scores = compose.create_scores(3, parts=2, seed=9)
+        sharded = compose.create_scores(3, parts=2, seed=9, workers=2)
+
+        assert [notes(s) for s in scores] == [notes(s) for s in sharded]
+        assert notes(scores[0]) != notes(scores[1])
+        assert [len(s.parts) for s in sharded] == [2, 2, 2]
+        assert sharded[2].metadata.title == "Piano concerto in E- major"
+        # create_score_from_parts draws the same score from the same seed
+        alone = Compose("E-", seed=np.random.SeedSequence(9).spawn(3)[1]).create_score_from_parts(2)
+        assert notes(alone) == notes(sharded[1])
+
+class TestMeasures(unittest.TestCase):
+
+    def testGreedy(self):
+        compose = Compose("g")
+        durations = [("n0", (0, 1.0, 1.0)), ("n1", (0, 2.0, 2.0)), ("n2", (1, 1.0, 2.0)), ("n3", (2, 4.0, 6.0))]
+
+        # n2 starts when n0 ends, so it is compatible with n0
+        assert [n for n, d in compose.greedy_note_duration_selector(durations)] == ["n0", "n2", "n3"]
+
+        prenotes = compose.sample_note_durations(200, 60)
+        prenotes = np.take_along_axis(prenotes, np.argsort(prenotes["end"], axis=1, kind="stable"), axis=1)
+        selected = _earliest_finish(prenotes["start"], prenotes["end"])
+        for row, keep in zip(prenotes, selected):
+            expected = compose.greedy_note_duration_selector([(i, (s, l, e)) for i, s, l, e in row.tolist()])
+            assert row["id"][keep].tolist() == [i for i, d in expected]
+
+    def testSchedule(self):
+        compose = Compose("g", seed=5)
+        events = compose.schedule_measures(50)
+
+        assert (events["end"] <= 20).all() and (events["length"] > 0).all()
+        assert (np.diff(events["measure"]) >= 0).all()
+        for number in range(50):
+            measure = events[events["measure"] == number]
+            # back to back, from the first note to the last
+            assert (measure["start"][1:] == measure["end"][:-1]).all()
+            assert measure["id"][0] >= 0 and measure["id"][-1] >= 0
+            assert ((measure["id"] < 0) == (measure["pitch"] < 0)).all()
+
+        measures = compose.events_to_measures(events)
+        assert [m.number for m in measures] == list(range(1, 51))
+        first = events[events["measure"] == 0]
+        assert measures[0].duration.quarterLength == first["end"][-1] - first["start"][0]
+        assert len(compose.create_score_from_parts().parts) == 2
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import shutil
+import random
+import sys
+import os
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+import numpy as np
+
+from corpus import Corpus, CorpusMatrix, mineMotifs, similarity
+from encoding import EncodedPart
+from helpers import Music21Helper
+
+helper = Music21Helper()
+
+def randomCorpus(seed, files=3, parts=3):
+    rng = random.Random(seed)
+    paths = ["score{}.mid".format(f) for f in range(files)]
+    scores = [[EncodedPart([rng.randrange(12) for k in range(rng.randint(0, 60))], "part{}".format(p))
+               for p in range(parts)] for f in range(files)]
+    return Corpus(paths, scores)
+
+class TestCorpus(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testSymmetric(self):
+        corpus = randomCorpus(1)
+        matrix = CorpusMatrix(corpus, metric="levenshtein", chunk=4).compute(workers=1)
+
+        assert matrix.shape == (9, 9)
+        for i in range(9):
+            for j in range(9):
+                assert matrix[i, j] == helper.levenshteinDistanceDP(corpus.parts[i], corpus.parts[j])
+
+    def testRectangularInPool(self):
+        rows = randomCorpus(2, files=2)
+        cols = randomCorpus(3, files=3, parts=2)
+        matrix = CorpusMatrix(rows, cols, metric="lcs", chunk=4).compute(workers=2)
+
+        assert matrix.shape == (6, 6)
+        for i in range(6):
+            for j in range(6):
+                assert matrix[i, j] == helper.lcsDP(rows.parts[i], cols.parts[j])
+
+    def testResume(self):
+        corpus = randomCorpus(4)
+        output = os.path.join(self.tmp, "lcs.npy")
+        expected = CorpusMatrix(corpus, metric="lcs").compute(workers=1)
+
+        # an interrupted run: only the first row of tiles got written
+        first = CorpusMatrix(corpus, metric="lcs", output=output, chunk=4)
+        partial = first._openPartial()
+        partial[0:4, :] = expected[0:4, :]
+        partial[:, 0:4] = expected[:, 0:4]
+        partial.flush()
+        del partial
+
+        calls = []
+        matrix = CorpusMatrix(corpus, metric="lcs", output=output, chunk=4)
+        result = matrix.compute(workers=1, progress=lambda done, total: calls.append(done))
+
+        assert calls[0] == 4 * 4 + 4 * 4 + 4 * 1
+        assert (result == expected).all()
+        matrix.save(result)
+        assert not os.path.exists(output + ".partial.npy")
+        assert (np.load(output) == expected).all()
+        with open(os.path.join(self.tmp, "lcs.labels.txt")) as f:
+            assert f.read().split("\n")[:2] == ["score0.mid:part0", "score0.mid:part1"]
+
+    def testCsv(self):
+        corpus = randomCorpus(6, files=2, parts=2)
+        matrix = CorpusMatrix(corpus, metric="lcs", chunk=4)
+        result = matrix.compute(workers=1)
+        output = os.path.join(self.tmp, "lcs.csv")
+
+        matrix.save(result, output)
+        with open(output) as f:
+            header = f.readline().strip().split(",")
+        assert header == ["metric=lcs values=raw"] + corpus.labels
+        matrix.save(similarity(result, corpus.lengths(), corpus.lengths(), "lcs"), output, similarities=True)
+        with open(output) as f:
+            assert f.readline().startswith("metric=lcs values=similarity,")
+
+    def testSimilarity(self):
+        raw = np.array([[0.0, 2.0], [2.0, 0.0]])
+        lengths = np.array([4, 2])
+
+        assert (similarity(raw, lengths, lengths, "levenshtein") == [[1.0, 0.5], [0.5, 1.0]]).all()
+        assert (similarity(raw, lengths, lengths, "lcs") == [[0.0, 0.5], [0.5, 0.0]]).all()
+
+    def testMineMotifs(self):
+        theme = [0, 2, 4, 5, 7, 9, 11, 0, 11, 9, 7, 5]
+        rng = random.Random(6)
+        noise = lambda k: [rng.randrange(12) for i in range(k)]
+        scores = [[EncodedPart(noise(20) + theme + noise(5), "a"), EncodedPart(noise(30), "b")],
+                  [EncodedPart(noise(3) + theme + noise(40), "c")],
+                  [EncodedPart(noise(10) + theme, "d")]]
+        corpus = Corpus(["one.mid", "two.mid", "three.mid"], scores)
+
+        hits = mineMotifs(corpus, top=1, minScore=20, workers=1)
+
+        pairs = [(corpus.labels[i], corpus.labels[j]) for score, i, j, region1, region2 in hits]
+        assert sorted(pairs) == [("one.mid:a", "three.mid:d"), ("one.mid:a", "two.mid:c"), ("two.mid:c", "three.mid:d")]
+        for score, i, j, (start1, end1), (start2, end2) in hits:
+            assert score >= 2 * len(theme)
+            for part, start, end in ((corpus.parts[i], start1, end1), (corpus.parts[j], start2, end2)):
+                # the alignment may run on into noise that happens to match, but covers the theme
+                region = "".join(chr(65 + c) for c in part.codes[start:end].tolist())
+                assert "".join(chr(65 + c) for c in theme) in region
+
+        query = Corpus(["one.mid"], scores[:1])
+        assert [(i, j) for score, i, j, r1, r2 in mineMotifs(query, corpus, top=1, minScore=20, workers=2)] == [(0, 2), (0, 3)]
+
+if __name__ == '__main__':
+    unittest.main()
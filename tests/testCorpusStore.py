@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import shutil
+import pickle
+import random
+import sys
+import os
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+import numpy as np
+
+from corpus import Corpus, CorpusMatrix, listScores, mineMotifs
+from corpusstore import CorpusStore, scoreMetadata
+from encoding import EncodedPart
+from helpers import Music21Helper
+
+helper = Music21Helper()
+
+data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+
+def randomScores(seed, files=3, parts=3, alphabet="pitchClass"):
+    rng = random.Random(seed)
+    paths = ["haydn_sq_Eb_20-{}_1.squ".format(f) for f in range(files - 1)] + ["other.mid"]
+    scores = [[EncodedPart([rng.randrange(12) for k in range(rng.randint(0, 60))], "part{}".format(p), alphabet)
+               for p in range(parts)] for f in range(files)]
+    return paths, scores
+
+class TestCorpusStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testRoundTrip(self):
+        paths, scores = randomScores(1)
+        store = CorpusStore.fromParts(paths, scores, os.path.join(self.tmp, "corpus.npy"))
+        parts = [part for score in scores for part in score]
+
+        assert len(store) == 9
+        assert [(p.name, p.codes.tolist()) for p in store] == [(p.name, p.codes.tolist()) for p in parts]
+        assert [p.name for p in store[2:5]] == ["part2", "part0", "part1"]
+        assert store.labels() == Corpus(paths, scores).labels
+        # the parts are views of the memory map, not copies
+        assert isinstance(store.codes, np.memmap)
+        assert all(np.shares_memory(p.codes, store.codes) for p in store if len(p))
+        assert not store[4].codes.flags.writeable
+
+    def testMetadata(self):
+        assert scoreMetadata("data/mozart_sq_Bb_k589_1.squ") == {"composer": "mozart", "key": "Bb", "catalogue": "k589", "movement": 1}
+        assert scoreMetadata("data/mozsq1.mid")["composer"] is None
+
+        paths, scores = randomScores(2)
+        store = CorpusStore.fromParts(paths, scores, os.path.join(self.tmp, "corpus"))
+        assert store.select(composer="haydn", catalogue="20-1") == [3, 4, 5]
+        assert store.select(composer=None) == [6, 7, 8]
+        assert store.table[0]["key"] == "Eb"
+
+    def testIntervals(self):
+        paths, scores = randomScores(3, alphabet="interval")
+        store = CorpusStore.fromParts(paths, scores, os.path.join(self.tmp, "corpus.npy"))
+
+        assert store.alphabet == "interval"
+        assert store[1].codes.tolist() == scores[0][1].codes.tolist()
+        with self.assertRaises(ValueError):
+            CorpusStore.fromParts(paths[:2], [scores[0], randomScores(3)[1][0]], os.path.join(self.tmp, "mixed.npy"))
+
+    def testPickledAsPath(self):
+        paths, scores = randomScores(4, files=20, parts=4)
+        store = CorpusStore.fromParts(paths, scores, os.path.join(self.tmp, "corpus.npy"))
+        copy = pickle.loads(pickle.dumps(store))
+
+        assert len(pickle.dumps(store)) < 200
+        assert [p.codes.tolist() for p in copy] == [p.codes.tolist() for p in store]
+
+    def testMatrixFromStore(self):
+        paths = listScores(data_dir)[:3]
+        store = CorpusStore.pack(paths, os.path.join(self.tmp, "corpus.npy"), fast=True)
+        loaded = Corpus.load(paths, fast=True)
+        corpus = Corpus.fromStore(store)
+
+        assert corpus.labels == loaded.labels and corpus.files == loaded.files and corpus.paths == loaded.paths
+        assert (corpus.lengths() == loaded.lengths()).all()
+        expected = CorpusMatrix(loaded, chunk=4).compute(workers=1)
+        assert (CorpusMatrix(corpus, chunk=4).compute(workers=2) == expected).all()
+        assert mineMotifs(corpus, minScore=40, workers=2) == mineMotifs(loaded, minScore=40, workers=1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import shutil
+import sqlite3
+import json
+import sys
+import os
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from distancecache import DistanceCache, MISSING, fingerprint
+from encoding import EncodedPart
+from helpers import Music21Helper
+
+helper = Music21Helper()
+
+class TestDistanceCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testSymmetric(self):
+        cache = DistanceCache()
+
+        assert cache.levenshteinDistanceDP("kitten", "sitting") == 3
+        assert cache.levenshteinDistanceDP("sitting", "kitten", engine="numpy") == 3
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # different algorithm or parameters: different entries
+        assert cache.lcsDP("kitten", "sitting") == 4
+        assert cache.levenshteinDistanceDP("kitten", "sitting", max_distance=1) == 2
+        assert cache.misses == 3
+
+    def testTracebackOrder(self):
+        cache = DistanceCache()
+        forward = cache.lcsDP("ABCBDAB", "BDCABA", traceback=True)
+        backward = cache.lcsDP("BDCABA", "ABCBDAB", traceback=True)
+
+        assert cache.misses == 2
+        assert forward == helper.lcsDP("ABCBDAB", "BDCABA", traceback=True)
+        assert backward == helper.lcsDP("BDCABA", "ABCBDAB", traceback=True)
+
+    def testFingerprint(self):
+        part = EncodedPart.fromLetterNames(["C", "E", "G"])
+
+        assert fingerprint(part) == fingerprint(EncodedPart.fromLetterNames(["C", "E", "G"]))
+        assert fingerprint(part) != fingerprint(EncodedPart.fromLetterNames(["C", "E", "G"], alphabet="spelled"))
+        assert fingerprint(["C", "E", "G"]) == fingerprint(("C", "E", "G"))
+        assert fingerprint("CEG") != fingerprint(["C", "E", "G"])
+        assert fingerprint(EncodedPart.fromIntervals([60, 62, 64], durations=[1, 1, 2])) != \
+            fingerprint(EncodedPart.fromIntervals([60, 62, 64], durations=[1, 2, 2]))
+        # tokens with the same str() but different types
+        assert fingerprint([1, 2]) != fingerprint(["1", "2"])
+        assert fingerprint([1.0]) != fingerprint([1])
+        assert fingerprint([(0, 4)]) != fingerprint(["(0, 4)"])
+
+    def testDefaultParams(self):
+        cache = DistanceCache()
+        a, b = list("kitten"), list("sitting")
+
+        assert cache.key(helper.levenshteinDistanceDP, a, b) == cache.key(helper.levenshteinDistanceDP, a, b, max_distance=None)
+        assert cache.levenshteinDistanceDP(a, b) == cache.levenshteinDistanceDP(a, b, max_distance=None) == 3
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert cache.levenshteinDistanceDP([1, 2], [1, 2]) == 0
+        assert cache.levenshteinDistanceDP(["1", "2"], [1, 2]) == 2
+
+    def testEviction(self):
+        cache = DistanceCache(max_bytes=200)
+        for i in range(20):
+            cache.lcsBitParallel("A" * i, "AB")
+
+        assert cache.evictions > 0
+        assert cache.bytes <= 200
+        assert len(cache) == 20 - cache.evictions
+        # the most recent entry survived, the oldest didn't
+        cache.lcsBitParallel("A" * 19, "AB")
+        cache.lcsBitParallel("", "AB")
+        assert (cache.hits, cache.misses) == (1, 21)
+
+    def testDiskStore(self):
+        path = os.path.join(self.tmp, "distances.sqlite")
+        first = DistanceCache(path=path)
+        first.levenshteinBitParallel("kitten", "sitting")
+        first.lcsDP("ABCBDAB", "BDCABA", traceback=True)
+        first.close()
+
+        second = DistanceCache(path=path)
+        assert second.levenshteinBitParallel("sitting", "kitten") == 3
+        assert second.lcsDP("ABCBDAB", "BDCABA", traceback=True) == helper.lcsDP("ABCBDAB", "BDCABA", traceback=True)
+        stats = second.stats()
+        assert (stats["disk_hits"], stats["misses"], stats["hit_rate"]) == (2, 0, 1.0)
+        second.close()
+
+    def testDiskStoreIsJson(self):
+        path = os.path.join(self.tmp, "distances.sqlite")
+        first = DistanceCache(path=path)
+        key = first.key(Music21Helper.lcsDP, "AB", "BA")
+        first.store(key, (2, [1, 3], ((4,), [])))
+        first.close()
+
+        # the file holds plain JSON, and tuples come back as tuples, lists as lists
+        db = sqlite3.connect(path)
+        assert json.loads(db.execute("SELECT value FROM distances").fetchone()[0])
+        db.execute("INSERT INTO distances VALUES (?, ?)", (b"old", b"\x80\x04K\x03."))
+        db.commit()
+        db.close()
+        second = DistanceCache(path=path)
+        value = second.lookup(key)
+        assert value == (2, [1, 3], ((4,), [])) and isinstance(value[2][0], tuple) and isinstance(value[1], list)
+        # a pickle left by an older version is a miss, not unpickled
+        assert second.lookup(b"old") is MISSING
+        second.close()
+
+if __name__ == '__main__':
+    unittest.main()
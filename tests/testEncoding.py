@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import random
+import sys
+import os
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from encoding import EncodedPart, PITCH_CLASS_NAMES, chordMasks
+from helpers import Music21Helper
+from streaming import StreamingMatcher
+
+helper = Music21Helper()
+
+class TestEncoding(unittest.TestCase):
+
+    def testPitchClass(self):
+        part = EncodedPart.fromLetterNames(["C", "C#", "D-", "B-", "A#", "B"], "Violin")
+
+        assert part.codes.dtype.name == "uint8"
+        assert list(part.codes) == [0, 1, 1, 10, 10, 11]
+        assert part.letterNames() == ["C", "C#", "C#", "B-", "B-", "B"]
+        assert len(part) == 6
+        assert part.name == "Violin"
+
+    def testSpelled(self):
+        names = ["C", "C#", "D-", "B-", "A#", "F##", "G--"]
+        part = EncodedPart.fromLetterNames(names, alphabet="spelled")
+
+        assert part.letterNames() == names
+        assert len(set(part.codes.tolist())) == len(names)
+
+    def testFromPitches(self):
+        part = EncodedPart.fromPitches([60, 73, 47])
+
+        assert part.letterNames() == ["C", "C#", "B"]
+
+    def testUnknownName(self):
+        with self.assertRaises(ValueError):
+            EncodedPart.fromLetterNames(["H"])
+
+    def testEnginesAcceptEncodedParts(self):
+        rng = random.Random(5030)
+        for i in range(20):
+            names1 = [rng.choice(PITCH_CLASS_NAMES) for k in range(rng.randint(0, 40))]
+            names2 = [rng.choice(PITCH_CLASS_NAMES) for k in range(rng.randint(0, 40))]
+            part1 = EncodedPart.fromLetterNames(names1)
+            part2 = EncodedPart.fromLetterNames(names2)
+
+            distance = helper.levenshteinDistanceDP(names1, names2)
+            lcs = helper.lcsDP(names1, names2)
+
+            assert helper.levenshteinDistanceDP(part1, part2) == distance
+            assert helper.levenshteinDistanceDP(part1, part2, engine="numpy") == distance
+            assert helper.levenshteinDistanceDP(part1, part2, max_distance=5) == min(distance, 6)
+            assert helper.levenshteinBitParallel(part1, part2) == distance
+            assert helper.lcsDP(part1, part2) == lcs
+            assert helper.lcsBitParallel(part1, part2) == lcs
+            assert len(helper.lcsDP(part1, part2, traceback=True)[0]) == lcs
+
+    def testMixedInputs(self):
+        part = EncodedPart.fromLetterNames(["C", "E", "G"])
+        spelled = EncodedPart.fromLetterNames(["C", "E", "G"], alphabet="spelled")
+
+        assert helper.levenshteinDistanceDP(part, ["C", "E", "G"]) == 0
+        assert helper.levenshteinDistanceDP(part, spelled, engine="numpy") == 0
+        assert helper.lcsDP(part, "CEG") == 3
+
+    def testIntervals(self):
+        part = EncodedPart.fromIntervals([60, 64, 67, 72, 55])
+
+        assert part.codes.dtype.name == "int8"
+        assert list(part.codes) == [4, 3, 5, -17]
+        assert list(EncodedPart.fromIntervals([60, 64, 67, 72, 55], fold=True).codes) == [4, 3, 5, -5]
+        assert list(EncodedPart.fromLetterNames(["C", "E", "G", "C", "G"]).toIntervals().codes) == [4, 3, 5, -5]
+
+    def testRatios(self):
+        part = EncodedPart.fromIntervals([60, 62, 64, 65], durations=[1.0, 0.5, 0.5, 2.0 / 3])
+
+        assert part.ratios.dtype.name == "int8"
+        assert list(part.ratios) == [-12, 0, 5]
+
+    def testTranspositionInvariant(self):
+        rng = random.Random(5030)
+        theme = [rng.randrange(48, 84) for k in range(60)]
+        other = [rng.randrange(48, 84) for k in range(60)]
+        durations = [rng.choice([0.5, 1.0, 2.0]) for k in range(60)]
+        part = EncodedPart.fromIntervals(theme, durations=durations)
+        transposed = EncodedPart.fromIntervals([p + 7 for p in theme], durations=durations)
+        unrelated = EncodedPart.fromIntervals(other, durations=durations)
+
+        assert helper.levenshteinDistanceDP(part, transposed) == 0
+        assert helper.levenshteinDistanceDP(part, transposed, engine="numpy") == 0
+        assert helper.lcsBitParallel(part, transposed) == 59
+        assert helper.levenshteinBitParallel(part, unrelated) == helper.levenshteinDistanceDP(part, unrelated)
+        # same intervals, different rhythm: only matches once ratios are left out
+        slower = EncodedPart.fromIntervals(theme, durations=durations[::-1])
+        plain = EncodedPart.fromIntervals(theme)
+        assert helper.lcsDP(part, slower) < 59
+        assert helper.lcsBitParallel(part, slower) == helper.lcsDP(part, slower)
+        assert helper.lcsDP(plain, slower) == 59
+
+    def testIntervalMixing(self):
+        intervals = EncodedPart.fromIntervals([60, 62, 64])
+
+        assert helper.levenshteinDistanceDP(intervals, [2, 2]) == 0
+        with self.assertRaises(ValueError):
+            helper.lcsDP(intervals, EncodedPart.fromPitches([60, 62, 64]))
+
+    def testChordMasks(self):
+        # C major triad, a lone A, a D-F# double stop an octave apart
+        part = EncodedPart.fromChords([[60, 64, 67], [69], [50, 66, 74]], "piano")
+
+        assert part.alphabet == "pitchClassSet"
+        assert part.codes.dtype.name == "uint16"
+        assert part.codes.tolist() == [0b000010010001, 0b001000000000, 0b000001000100]
+        assert chordMasks([60, 64, 67, 69], [3, 1]).tolist() == part.codes[:2].tolist()
+        assert len(chordMasks([], [])) == 0
+        assert EncodedPart.fromLetterNames(["C", "B-"], alphabet="pitchClassSet").codes.tolist() == [1, 1 << 10]
+
+    def testSetOverlap(self):
+        rng = random.Random(17)
+        randomSet = lambda: sum(1 << pc for pc in rng.sample(range(12), rng.randint(1, 3)))
+        for i in range(10):
+            part1 = EncodedPart([randomSet() for k in range(rng.randint(0, 90))], alphabet="pitchClassSet")
+            part2 = EncodedPart([randomSet() for k in range(rng.randint(0, 90))], alphabet="pitchClassSet")
+            # the python engine on plain ints, with the overlap spelled out
+            a, b = part1.codes.tolist(), part2.codes.tolist()
+            d = [[max(x, y) if x == 0 or y == 0 else 0 for y in range(len(b) + 1)] for x in range(len(a) + 1)]
+            for x in range(1, len(a) + 1):
+                for y in range(1, len(b) + 1):
+                    cost = 0 if a[x - 1] & b[y - 1] else 1
+                    d[x][y] = min(d[x - 1][y - 1] + cost, d[x - 1][y] + 1, d[x][y - 1] + 1)
+            expected = d[len(a)][len(b)]
+
+            assert helper.levenshteinDistanceDP(part1, part2) == expected
+            assert helper.levenshteinDistanceDP(part1, part2, engine="numpy") == expected
+            assert helper.levenshteinDistanceDP(part1, part2, engine="numpy", max_distance=200) == expected
+            assert helper.levenshteinDistanceDP(part1, part2, max_distance=200) == expected
+            assert helper.levenshteinBitParallel(part1, part2) == expected
+            assert helper.batchDistances(part1, [part2]).tolist() == [expected]
+            matcher = StreamingMatcher(part2)
+            matcher.extend(a)
+            assert matcher.distance == expected
+
+            lcs = helper.lcsDP(part1, part2)
+            assert helper.lcsBitParallel(part1, part2) == lcs
+            subsequence, positions1, positions2 = helper.lcsDP(part1, part2, traceback=True)
+            assert len(positions1) == lcs
+            assert all(a[x] & b[y] for x, y in zip(positions1, positions2))
+
+    def testChordsAgainstNotes(self):
+        chords = EncodedPart.fromChords([[60, 64, 67], [62, 65], [67, 71, 74]])
+
+        # a single note matches any chord it is a tone of
+        assert helper.levenshteinDistanceDP(chords, ["E", "F", "D"]) == 0
+        assert helper.lcsBitParallel(chords, EncodedPart.fromLetterNames(["G", "A", "B"])) == 2
+        assert helper.smithWaterman(chords, ["D", "E", "F", "G", "A"]) == (6, (0, 3), (1, 4))
+        with self.assertRaises(ValueError):
+            helper.lcsDP(chords, EncodedPart.fromIntervals([60, 62]))
+
+if __name__ == '__main__':
+    unittest.main()
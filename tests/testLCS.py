@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 
 import unittest
+import random
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 # add ../modules to the system path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
@@ -38,5 +42,60 @@ class TestLCS(unittest.TestCase):
 
         assert int(lcs) == 1
 
+    def testTraceback(self):
+        token1 = "ABCBDAB"
+        token2 = "BDCABA"
+
+        subsequence, positions1, positions2 = helper.lcsDP(token1, token2, traceback=True)
+
+        assert len(subsequence) == helper.lcsDP(token1, token2) == 4
+        assert [token1[i] for i in positions1] == subsequence
+        assert [token2[j] for j in positions2] == subsequence
+
+    def testTracebackRandom(self):
+        rng = random.Random(5030)
+        for i in range(50):
+            token1 = [rng.choice("ABCDEFG") for k in range(rng.randint(0, 30))]
+            token2 = [rng.choice("ABCDEFG") for k in range(rng.randint(0, 30))]
+
+            subsequence, positions1, positions2 = helper.lcsDP(token1, token2, traceback=True)
+
+            assert len(subsequence) == helper.lcsDP(token1, token2)
+            assert positions1 == sorted(set(positions1))
+            assert positions2 == sorted(set(positions2))
+            assert [token1[i] for i in positions1] == subsequence
+            assert [token2[j] for j in positions2] == subsequence
+
+    def testBitParallel(self):
+        assert helper.lcsBitParallel("AAAAAAAAAAA", "BBBBBBBBBBB") == 0
+        assert helper.lcsBitParallel("testString", "testString") == len("testString")
+        assert helper.lcsBitParallel("AAAAABAAAA", "BBBBBBBBBB") == 1
+
+    def testBitParallelMultiWord(self):
+        rng = random.Random(5030)
+        for i in range(20):
+            token1 = [rng.choice("ABCDEFG") for k in range(rng.randint(0, 300))]
+            token2 = [rng.choice("ABCDEFG") for k in range(rng.randint(0, 300))]
+            masks = helper.matchMasks(token1)
+
+            expected = helper.lcsDP(token1, token2)
+
+            assert helper.lcsBitParallel(token1, token2) == expected
+            assert helper.lcsBitParallel(token1, token2, masks=masks) == expected
+
+    def testBatch(self):
+        rng = random.Random(16)
+        query = [rng.choice("ABCDEFG") for k in range(150)]
+        targets = [[rng.choice("ABCDEFG") for k in range(rng.randint(0, 300))] for i in range(30)]
+        expected = [helper.lcsDP(query, t) for t in targets]
+
+        scores = helper.batchDistances(query, targets, metric="lcs")
+        assert scores.dtype == np.int64
+        assert scores.tolist() == expected
+        assert helper.batchDistances(query, targets, metric="lcs", workers=2, chunksize=7).tolist() == expected
+        with ThreadPoolExecutor(2) as executor:
+            assert helper.batchDistances(query, targets, metric="lcs", executor=executor).tolist() == expected
+        assert len(helper.batchDistances(query, [], metric="lcs")) == 0
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,14 +1,19 @@
 # -*- coding: utf-8 -*-
 
 import unittest
+import random
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 # add ../modules to the system path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
 # add ../lib to the system path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
 
+from encoding import EncodedPart
 from helpers import Music21Helper
 
 helper = Music21Helper()
@@ -30,5 +35,95 @@ class TestLevenshtein(unittest.TestCase):
 
         assert int(lev) == 0
 
+    def testNumpyEngine(self):
+        token1 = "AAAAAAAAAAA"
+        token2 = "BBBBBBBBBBB"
+
+        assert helper.levenshteinDistanceDP(token1, token2, engine="numpy") == len(token1)
+        assert helper.levenshteinDistanceDP("testString", "testString", engine="numpy") == 0
+        assert helper.levenshteinDistanceDP("kitten", "sitting", engine="numpy") == 3
+        assert helper.levenshteinDistanceDP("", "abc", engine="numpy") == 3
+
+    def testNumpyEngineMatchesPython(self):
+        rng = random.Random(5030)
+        for i in range(50):
+            token1 = [rng.choice("ABCDEFG") for k in range(rng.randint(0, 40))]
+            token2 = [rng.choice("ABCDEFG") for k in range(rng.randint(0, 40))]
+
+            expected = helper.levenshteinDistanceDP(token1, token2)
+
+            assert helper.levenshteinDistanceDP(token1, token2, engine="numpy") == int(expected)
+
+    def testIntsAndPrinting(self):
+        for params in ({}, {"engine": "numpy"}, {"max_distance": 2}, {"engine": "numpy", "max_distance": 2}):
+            assert type(helper.levenshteinDistanceDP("kitten", "sitting", **params)) is int
+
+        with self.assertRaises(ValueError):
+            helper.levenshteinDistanceDP("kitten", "sitting", printDistances=True, engine="numpy")
+        with self.assertRaises(ValueError):
+            helper.levenshteinDistanceDP("kitten", "sitting", printDistances=True, max_distance=2)
+
+    def testMaxDistance(self):
+        token1 = "AAAAAAAAAAA"
+        token2 = "BBBBBBBBBBB"
+
+        for engine in ("python", "numpy"):
+            assert helper.levenshteinDistanceDP(token1, token2, engine=engine, max_distance=3) == 4
+            assert helper.levenshteinDistanceDP(token1, token2, engine=engine, max_distance=11) == 11
+            assert helper.levenshteinDistanceDP("kitten", "sitting", engine=engine, max_distance=3) == 3
+            assert helper.levenshteinDistanceDP("kitten", "sitting", engine=engine, max_distance=2) == 3
+            assert helper.levenshteinDistanceDP("abc", "abcdefgh", engine=engine, max_distance=4) == 5
+
+    def testMaxDistanceMatchesFull(self):
+        rng = random.Random(5030)
+        for i in range(50):
+            token1 = [rng.choice("ABC") for k in range(rng.randint(0, 30))]
+            token2 = [rng.choice("ABC") for k in range(rng.randint(0, 30))]
+            distance = helper.levenshteinDistanceDP(token1, token2, engine="numpy")
+
+            for k in (0, 2, 5, 10, 30):
+                expected = min(distance, k + 1)
+
+                assert helper.levenshteinDistanceDP(token1, token2, max_distance=k) == expected
+                assert helper.levenshteinDistanceDP(token1, token2, engine="numpy", max_distance=k) == expected
+
+    def testBitParallel(self):
+        assert helper.levenshteinBitParallel("AAAAAAAAAAA", "BBBBBBBBBBB") == 11
+        assert helper.levenshteinBitParallel("testString", "testString") == 0
+        assert helper.levenshteinBitParallel("kitten", "sitting") == 3
+        assert helper.levenshteinBitParallel("", "abc") == 3
+
+    def testBitParallelMultiWord(self):
+        rng = random.Random(5030)
+        for i in range(20):
+            token1 = [rng.choice("ABCDEFG") for k in range(rng.randint(0, 300))]
+            token2 = [rng.choice("ABCDEFG") for k in range(rng.randint(0, 300))]
+            masks = helper.matchMasks(token1)
+
+            expected = helper.levenshteinDistanceDP(token1, token2, engine="numpy")
+
+            assert helper.levenshteinBitParallel(token1, token2) == expected
+            assert helper.levenshteinBitParallel(token1, token2, masks=masks) == expected
+
+    def testBatch(self):
+        rng = random.Random(16)
+        query = [rng.choice("ABCDEFG") for k in range(150)]
+        targets = [[rng.choice("ABCDEFG") for k in range(rng.randint(0, 300))] for i in range(30)]
+        expected = [helper.levenshteinDistanceDP(query, t, engine="numpy") for t in targets]
+
+        scores = helper.batchDistances(query, targets, metric="levenshtein")
+        assert scores.dtype == np.int64
+        assert scores.tolist() == expected
+        assert helper.batchDistances(query, targets, metric="levenshtein", workers=2, chunksize=7).tolist() == expected
+        with ThreadPoolExecutor(2) as executor:
+            assert helper.batchDistances(query, targets, metric="levenshtein", executor=executor).tolist() == expected
+        assert len(helper.batchDistances(query, [], metric="levenshtein")) == 0
+
+    def testBatchEncoded(self):
+        query = EncodedPart.fromLetterNames(["C", "E", "G", "C"])
+        targets = [EncodedPart.fromLetterNames(["C", "E", "G"]), ["C", "E", "G", "C"], "CDEF"]
+        assert helper.batchDistances(query, targets).tolist() == [1, 0, 3]
+        self.assertRaises(ValueError, helper.batchDistances, query, targets, metric="hamming")
+
 if __name__ == '__main__':
     unittest.main()
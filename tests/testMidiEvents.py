@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import struct
+import sys
+import os
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from midievents import MidiEvents
+
+data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+
+def smf(*tracks, ticksPerQuarter=480):
+    data = b"MThd" + struct.pack(">IHHH", 6, 1, len(tracks), ticksPerQuarter)
+    for body in tracks:
+        body = body + b"\x00\xff\x2f\x00"
+        data += b"MTrk" + struct.pack(">I", len(body)) + body
+    return data
+
+class TestMidiEvents(unittest.TestCase):
+
+    def testNotes(self):
+        # C4 quarter, then E4+G4 together for a half note (running status, note-on
+        # velocity 0 as note-off), then an unterminated D4 that gets dropped
+        track = (b"\x00\xff\x03\x06Violin"
+                 b"\x00\x90\x3c\x64" b"\x83\x60\x80\x3c\x00"
+                 b"\x00\x90\x40\x50" b"\x00\x43\x50" b"\x87\x40\x40\x00" b"\x00\x43\x00"
+                 b"\x00\x90\x3e\x64")
+        conductor = b"\x00\xff\x58\x04\x04\x02\x18\x08"
+
+        events = MidiEvents.parse(smf(conductor, track))
+
+        notes = events.parts()[0].notes
+        assert events.partNames() == ["Violin"]
+        assert list(notes["onset"]) == [0, 480, 480]
+        assert list(notes["pitch"]) == [60, 64, 67]
+        assert list(notes["duration"]) == [480, 960, 960]
+        assert list(notes["velocity"]) == [100, 80, 80]
+        assert events.letterNames() == [["C", "E"]]
+
+    def testSplitAtBarline(self):
+        # a whole note starting on beat 3 of a 4/4 bar is tied over the barline
+        track = b"\x00\xff\x03\x05Cello" b"\x00\x90\x30\x64" b"\x87\x40\x80\x30\x00" b"\x00\x90\x32\x64" b"\x8f\x00\x80\x32\x00"
+
+        events = MidiEvents.parse(smf(track))
+        offsets, durations, chords = events.noteSequence(events.parts()[0])
+
+        assert list(offsets) == [0.0, 2.0, 4.0]
+        assert list(durations) == [2.0, 2.0, 2.0]
+        assert events.letterNames() == [["C", "D", "D"]]
+
+    def testMatchesMusic21(self):
+        from composition_lcs_score import LCS
+        lcs = LCS()
+        path = os.path.join(data_dir, "mozsq1.mid")
+        stream = lcs.preProcessStream(path)
+
+        events = MidiEvents.read(path)
+
+        note_matrix = lcs.helper.streamToMatrix(stream)
+        assert events.letterNames() == lcs.helper.noteToLetterName(note_matrix)
+        assert events.partNames() == lcs.helper.listInstruments(stream)
+        sets = lcs.helper.noteToPitchClassSets(note_matrix)
+        assert [s.tolist() for s in events.pitchClassSets()] == [s.tolist() for s in sets]
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+import numpy as np
+
+from comparison import ScoreComparison
+from composer import Compose
+from encoding import PITCH_CLASS_NAMES
+from helpers import Music21Helper
+from midievents import MidiEvents
+from midiwriter import MidiDirectoryWriter, _varLenBytes, barLines, midiBytes, writeMidi, TICKS_PER_QUARTER
+
+helper = Music21Helper()
+
+def randomParts(seed, count=4, notes=120):
+    rng = np.random.default_rng(seed)
+    parts = []
+    for i in range(count):
+        pitches = rng.integers(40, 90, size=notes)
+        pitches[rng.random(notes) < 0.1] = -1
+        parts.append((pitches, rng.choice([0.5, 1.0, 1.5, 2.0, 4.0], size=notes)))
+    return parts
+
+def letterNames(parts):
+    return [[PITCH_CLASS_NAMES[p % 12] for p in pitches.tolist() if p >= 0] for pitches, durations in parts]
+
+class TestMidiWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testVarLen(self):
+        assert _varLenBytes(0) == b"\x00"
+        assert _varLenBytes(0x7F) == b"\x7f"
+        assert _varLenBytes(0x80) == b"\x81\x00"
+        assert _varLenBytes(0x1FFFFF) == b"\xff\xff\x7f"
+
+    def testRoundTrip(self):
+        parts = randomParts(5030)
+        events = MidiEvents.parse(midiBytes(parts, names=["Violino I", "Violino II", "Viola", "Cello"]))
+
+        assert events.partNames() == ["Violino I", "Violino II", "Viola", "Cello"]
+        assert events.letterNames() == letterNames(parts)
+        # and the rhythm: notes where they were written, rests as gaps
+        for (pitches, durations), track in zip(parts, events.parts()):
+            offsets, lengths, chords = events.noteSequence(track)
+            starts = np.concatenate([[0], np.cumsum(durations)[:-1]])
+            assert offsets.tolist() == starts[pitches >= 0].tolist()
+            assert lengths.tolist() == durations[pitches >= 0].tolist()
+
+    def testMusic21RoundTrip(self):
+        parts = randomParts(7, count=2, notes=40)
+        path = writeMidi(os.path.join(self.tmp, "two.mid"), parts)
+        comparison = ScoreComparison()
+        encoded = comparison.streamToParts(comparison.preProcessStream(path))
+
+        assert [part.letterNames() for part in encoded] == letterNames(parts)
+        assert [part.name for part in encoded] == ["Part 1", "Part 2"]
+
+    def testBarLines(self):
+        parts = randomParts(11)
+        bars = np.array(barLines(parts))
+
+        assert bars[0] == 0 and (np.diff(bars[:-1]) >= 4 * TICKS_PER_QUARTER).all()
+        for pitches, durations in parts:
+            ends = np.rint(np.cumsum(durations) * TICKS_PER_QUARTER)
+            starts = np.concatenate([[0], ends[:-1]])
+            notes = pitches >= 0
+            # no note sounds over a barline
+            assert not ((starts[notes, None] < bars) & (bars < ends[notes, None])).any()
+
+    def testDirectoryWriter(self):
+        scores = [randomParts(seed, count=2, notes=30) for seed in range(6)]
+        with MidiDirectoryWriter(self.tmp, workers=3, pending=2) as writer:
+            for i, parts in enumerate(scores):
+                writer.write("score{}.mid".format(i), parts)
+
+        assert writer.written == [os.path.join(self.tmp, "score{}.mid".format(i)) for i in range(6)]
+        for path, parts in zip(writer.written, scores):
+            assert MidiEvents.read(path).letterNames() == letterNames(parts)
+
+        with self.assertRaises(ValueError):
+            with MidiDirectoryWriter(self.tmp) as writer:
+                writer.write("bad.mid", [(np.array([60, 200]), np.array([1.0, 1.0]))])
+        assert not os.path.exists(os.path.join(self.tmp, "bad.mid"))
+
+    def testComposeScores(self):
+        compose = Compose("g", seed=1)
+        paths = compose.write_scores(self.tmp, 12, parts=4, notes=50, seed=3, chunk=5)
+        pitches, durations = compose.generate_scores(12, parts=4, notes=50, seed=3)
+
+        assert [os.path.basename(p) for p in paths] == ["score{:02d}.mid".format(i) for i in range(12)]
+        for path, score in zip(paths, pitches):
+            assert MidiEvents.read(path).letterNames() == [[compose.pitch_names[p] for p in part] for part in score.tolist()]
+
+        # MIDI keeps pitches, not spellings: E major's D# comes back as E-
+        compose = Compose("E", seed=1)
+        pitches, durations = compose.generate_batch(2, 40)
+        events = MidiEvents.parse(compose.batch_to_midi(pitches, durations))
+        spelled = [[compose.pitch_names[p] for p in part] for part in pitches.tolist()]
+        assert [e.codes.tolist() for e in events.encodedParts()] == [e.codes.tolist() for e in compose.batch_to_encoded(pitches)]
+        assert "D#" in spelled[0] + spelled[1] and events.letterNames() != spelled
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import shutil
+import random
+import sys
+import os
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+import numpy as np
+
+from encoding import EncodedPart, PITCH_CLASS_NAMES
+from helpers import Music21Helper
+from ngramindex import NgramIndex
+
+helper = Music21Helper()
+
+def mutate(rng, codes, edits):
+    codes = list(codes)
+    for k in range(edits):
+        codes[rng.randrange(len(codes))] = rng.randrange(12)
+    return codes
+
+class TestNgramIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(5030)
+        cls.query = EncodedPart([rng.randrange(12) for k in range(80)], "query")
+        cls.parts = [EncodedPart([rng.randrange(12) for k in range(rng.randint(40, 120))], "random{}".format(i)) for i in range(30)]
+        # near copies of the query, further and further away
+        for edits in (1, 4, 12):
+            cls.parts.insert(rng.randrange(len(cls.parts)), EncodedPart(mutate(rng, cls.query.codes, edits), "copy{}".format(edits)))
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testShared(self):
+        index = NgramIndex.build([["C", "D", "E", "C", "D"], ["E", "C", "D", "E"]], n=2)
+
+        assert list(index.shared(["C", "D", "C", "D"])) == [2, 1]
+        assert list(index.shared(["G", "A"])) == [0, 0]
+        assert len(index) == 2
+        assert index.part(1).letterNames() == ["E", "C", "D", "E"]
+
+    def testExactQuery(self):
+        index = NgramIndex.build(self.parts, n=3)
+        expected = sorted((helper.levenshteinDistanceDP(self.query, p), i) for i, p in enumerate(self.parts))[:5]
+        matches = index.query(self.query, top=5, candidates=None)
+
+        assert [(m.distance, m.part) for m in matches] == expected
+        assert matches[0].label == "copy1"
+        for m in matches:
+            assert m.bound <= m.distance
+
+    def testBoundsHold(self):
+        for mode in ("pitch", "interval"):
+            index = NgramIndex.build(self.parts, n=3, mode=mode)
+            bounds = index.lowerBounds(len(self.query), index.shared(self.query))
+            for i, p in enumerate(self.parts):
+                assert bounds[i] <= helper.levenshteinDistanceDP(self.query, p)
+
+    def testLcsQuery(self):
+        index = NgramIndex.build(self.parts, n=3)
+        matches = index.query(self.query, top=3, rank="shared", metric="lcs")
+
+        assert [m.label for m in matches] == ["copy1", "copy4", "copy12"]
+        assert matches[0].distance == helper.lcsDP(self.query, self.parts[matches[0].part])
+
+    def testTransposedQuery(self):
+        index = NgramIndex.build(self.parts, n=4, mode="interval")
+        transposed = EncodedPart((self.query.codes + 5) % 12)
+        matches = index.query(transposed, top=1, exact=False)
+
+        assert matches[0].label == "copy1"
+        assert matches[0].distance is None
+
+    def testLocate(self):
+        index = NgramIndex.build(self.parts, n=4)
+        snippet = EncodedPart(self.query.codes[30:50])
+        match = index.query(snippet, top=1, rank="shared", exact=False, locate=True)[0]
+
+        assert match.label.startswith("copy")
+        assert match.offset == 30
+
+    def testSaveLoad(self):
+        index = NgramIndex.build(self.parts, n=3, mode="interval")
+        index.save(os.path.join(self.tmp, "index"))
+        loaded = NgramIndex.load(os.path.join(self.tmp, "index"))
+
+        assert isinstance(loaded.postingParts, np.memmap)
+        assert (loaded.mode, loaded.n, loaded.labels) == ("interval", 3, index.labels)
+        assert loaded.query(self.query, top=3) == index.query(self.query, top=3)
+
+if __name__ == '__main__':
+    unittest.main()
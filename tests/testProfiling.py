@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import shutil
+import json
+import sys
+import os
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from composition_levenshtein_score import Levenshtein
+from helpers import Music21Helper
+from profiling import NO_PROFILER, Profiler
+
+helper = Music21Helper()
+
+data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testStages(self):
+        seen = []
+        profiler = Profiler(callback=lambda name, seconds, peak: seen.append(name))
+        for i in range(3):
+            with profiler.stage("outer"):
+                with profiler.stage("inner"):
+                    helper.levenshteinDistanceDP("kitten", "sitting")
+        profiler.count("pairs", 3)
+
+        report = profiler.report()
+        assert seen == ["inner", "outer"] * 3
+        assert report["stages"]["outer"]["calls"] == 3
+        assert report["stages"]["outer"]["seconds"] >= report["stages"]["inner"]["seconds"] > 0
+        assert report["stages"]["inner"]["peak_bytes"] is None
+        assert report["counters"] == {"pairs": 3}
+
+    def testMemory(self):
+        profiler = Profiler(memory=True)
+        with profiler.stage("outer"):
+            with profiler.stage("allocate"):
+                block = bytearray(4 * 1024 * 1024)
+                del block
+            with profiler.stage("nothing"):
+                pass
+        profiler.stop()
+
+        stages = profiler.report()["stages"]
+        assert stages["allocate"]["peak_bytes"] >= 4 * 1024 * 1024
+        assert stages["nothing"]["peak_bytes"] < 1024 * 1024
+        # the outer stage saw the inner stage's peak
+        assert stages["outer"]["peak_bytes"] >= 4 * 1024 * 1024
+        assert "top_allocations" in profiler.report()
+
+    def testSaveAndMerge(self):
+        path = os.path.join(self.tmp, "run.json")
+        profiler = Profiler(cprofile=True, output=path)
+        with profiler.stage("lcs"):
+            helper.lcsDP("AGGTAB", "GXTXAYB")
+        assert profiler.save() == path
+
+        with open(path) as f:
+            report = json.load(f)
+        assert report["stages"]["lcs"]["calls"] == 1
+        assert os.path.exists(os.path.join(self.tmp, "run.prof"))
+
+        total = Profiler()
+        total.merge(report)
+        total.merge(report)
+        assert total.report()["stages"]["lcs"]["calls"] == 2
+
+        # neither an output nor a path to save to
+        with self.assertRaisesRegex(ValueError, "no output path"):
+            Profiler().save()
+
+    def testDisabled(self):
+        with NO_PROFILER.stage("anything") as stage:
+            NO_PROFILER.count("anything")
+        assert NO_PROFILER.stage("other") is stage
+        assert NO_PROFILER.report() == {}
+
+    def testDriver(self):
+        profiler = Profiler()
+        lev = Levenshtein(fast=True, select="Viola", profiler=profiler)
+        path = os.path.join(data_dir, "mozsq1.mid")
+        lev.compute(path, path)
+
+        report = profiler.report()
+        assert set(report["stages"]) == {"readEvents", "encodedPart", "selectPart", "levenshteinDistanceDP"}
+        assert report["stages"]["encodedPart"]["calls"] == 2
+        assert report["counters"]["parts"] == 2
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from scorecache import CachedScore, ScoreCache
+
+data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+
+class CountingExtractor():
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        with open(path, "rb") as f:
+            size = len(f.read())
+        return CachedScore(["Violin", None], [[60, 61, 62], [size % 128]], [[1.0, 0.5, 2.0], [4.0]], [[0.0, 1.0, 1.5], [0.0]])
+
+class TestScoreCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.midi = os.path.join(self.tmp, "score.mid")
+        with open(self.midi, "wb") as f:
+            f.write(b"MThd" + b"\0" * 100)
+        self.extractor = CountingExtractor()
+        self.cache = ScoreCache(os.path.join(self.tmp, "cache"), extractor=self.extractor)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testRoundTrip(self):
+        first = self.cache.get(self.midi)
+        second = self.cache.get(self.midi)
+
+        assert self.extractor.calls == 1
+        assert (self.cache.hits, self.cache.misses) == (1, 1)
+        assert second.partNames == ["Violin", None]
+        assert second.letterNames() == first.letterNames() == [["C", "C#", "D"], ["G#"]]
+        assert list(second.durations[0]) == [1.0, 0.5, 2.0]
+        assert list(second.offsets[0]) == [0.0, 1.0, 1.5]
+
+    def testModifiedFile(self):
+        self.cache.get(self.midi)
+        with open(self.midi, "ab") as f:
+            f.write(b"\0")
+        os.utime(self.midi, ns=(0, 0))
+
+        score = self.cache.get(self.midi)
+
+        assert self.extractor.calls == 2
+        assert score.letterNames()[1] == ["A"]
+
+    def testTouchedFileReusesContents(self):
+        self.cache.get(self.midi)
+        os.utime(self.midi, ns=(0, 0))
+
+        self.cache.get(self.midi)
+
+        assert self.extractor.calls == 1
+
+    def testEviction(self):
+        for i in range(5):
+            path = os.path.join(self.tmp, "score{}.mid".format(i))
+            with open(path, "wb") as f:
+                f.write(b"MThd" + bytes([i]) * 100)
+            self.cache.get(path)
+        one = self.cache.size() // 5
+
+        removed = self.cache.evict(max_bytes=2 * one)
+
+        assert removed == 3
+        assert self.cache.size() <= 2 * one
+        assert self.cache.lookup(os.path.join(self.tmp, "score0.mid")) is None
+        assert self.cache.lookup(os.path.join(self.tmp, "score4.mid")) is not None
+
+    def testTimingAndExtractorKeepSeparateEntries(self):
+        untimed = ScoreCache(self.cache.directory, timing=False, extractor=self.extractor)
+        assert untimed.get(self.midi).durations is None
+
+        # a timing cache doesn't get the entry saved without durations
+        score = self.cache.get(self.midi)
+        assert self.extractor.calls == 2
+        assert list(score.durations[0]) == [1.0, 0.5, 2.0]
+        assert score.part(0, intervals=True, ratios=True).ratios is not None
+        assert untimed.get(self.midi).durations is None and self.extractor.calls == 2
+
+        other = CountingExtractor()
+        ScoreCache(self.cache.directory, extractor=other).get(self.midi)
+        assert other.calls == 0
+        renamed = lambda path: CachedScore(["Viola"], [[64]])
+        assert ScoreCache(self.cache.directory, extractor=renamed).get(self.midi).partNames == ["Viola"]
+
+    def testNoParts(self):
+        empty = ScoreCache(os.path.join(self.tmp, "empty"), extractor=lambda path: CachedScore([], [], [], []))
+        empty.get(self.midi)
+        score = empty.get(self.midi)
+
+        assert empty.hits == 1
+        assert score.partNames == [] and score.pitches == [] and score.durations == [] and score.parts() == []
+
+    def testMatchesMusic21(self):
+        from composition_lcs_score import LCS
+        lcs = LCS()
+        path = os.path.join(data_dir, "haydn_sq_D_50-6_1.squ")
+        stream = lcs.preProcessStream(path)
+        expected = lcs.helper.noteToLetterName(lcs.helper.streamToMatrix(stream))
+
+        score = ScoreCache(os.path.join(self.tmp, "music21")).get(path)
+
+        assert score.letterNames() == expected
+        assert score.partNames == lcs.helper.listInstruments(stream)
+
+if __name__ == '__main__':
+    unittest.main()
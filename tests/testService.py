@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import asyncio
+import tempfile
+import shutil
+import json
+import sys
+import os
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from helpers import Music21Helper
+from midievents import MidiEvents
+from service import ComparisonService
+
+helper = Music21Helper()
+
+data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+mozart = os.path.join(data_dir, "mozsq1.mid")
+haydn = os.path.join(data_dir, "haydn_sq_A_20-6_1.squ")
+
+class TestService(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "compare.sock")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def ask(self, service, requests):
+        """sends requests on one connection and returns the replies, by id"""
+        async def run():
+            ready = asyncio.get_running_loop().create_future()
+            serving = asyncio.ensure_future(service.serve(path=self.path, ready=ready.set_result))
+            await ready
+            reader, writer = await asyncio.open_unix_connection(self.path)
+            for request in requests:
+                writer.write((request if isinstance(request, str) else json.dumps(request)).encode("utf-8") + b"\n")
+            await writer.drain()
+            replies = [json.loads(await reader.readline()) for request in requests]
+            writer.close()
+            serving.cancel()
+            try:
+                await serving
+            except asyncio.CancelledError:
+                pass
+            return {reply.get("id"): reply for reply in replies}
+        return asyncio.run(run())
+
+    def testCompare(self):
+        service = ComparisonService(workers=1)
+        replies = self.ask(service, [
+            {"id": 1, "file1": mozart, "part1": "Viola", "file2": haydn, "part2": 1},
+            {"id": 2, "file1": mozart, "part1": 2, "file2": haydn, "part2": 1, "metric": "lcs"},
+            {"id": 3, "file1": mozart, "part1": "Viola", "file2": haydn, "part2": 1, "intervals": True},
+            {"id": 4, "op": "stats"},
+        ])
+
+        viola = MidiEvents.read(mozart).encodedPart(2)
+        second = MidiEvents.read(haydn).encodedPart(1)
+        assert replies[1]["score"] == helper.levenshteinDistanceDP(viola, second)
+        assert replies[2]["score"] == helper.lcsBitParallel(viola, second)
+        assert replies[1]["length1"] == len(viola) and replies[1]["length2"] == len(second)
+        viola = MidiEvents.read(mozart).encodedPart(2, intervals=True)
+        second = MidiEvents.read(haydn).encodedPart(1, intervals=True)
+        assert replies[3]["score"] == helper.levenshteinBitParallel(viola, second)
+        # each file is read once per encoding, then kept
+        assert service.counters["requests"] == 3 and service.counters["scores_read"] == 4
+        assert "waiting" in replies[4] and "error" not in replies[4]
+
+    def testCoalescing(self):
+        service = ComparisonService(workers=1)
+        request = {"file1": mozart, "part1": 0, "file2": haydn, "part2": 3}
+        swapped = {"file1": haydn, "part1": 3, "file2": mozart, "part2": 0}
+        replies = self.ask(service, [dict(request, id=i) for i in range(4)] + [dict(swapped, id=4)])
+
+        assert len({reply["score"] for reply in replies.values()}) == 1
+        assert service.counters["scored"] == 1
+        assert service.counters["coalesced"] + service.counters["remembered"] == 4
+        assert service.counters["coalesced"] >= 1
+        assert service.distances.stats()["entries"] == 1
+
+    def testErrors(self):
+        service = ComparisonService(workers=1, queue=0)
+        replies = self.ask(service, [
+            "not json",
+            {"id": 1, "file1": mozart, "part1": "Flute", "file2": mozart},
+            {"id": 2, "file1": os.path.join(self.tmp, "missing.mid"), "file2": mozart},
+            {"id": 3, "file1": mozart, "file2": mozart, "metric": "hamming"},
+            {"id": 4, "file1": mozart, "file2": mozart},
+        ])
+
+        assert replies[None]["error"] == "not JSON"
+        assert "Flute" in replies[1]["error"]
+        assert "missing.mid" in replies[2]["error"]
+        assert "hamming" in replies[3]["error"]
+        # with no room in the queue every comparison is turned away
+        assert replies[4]["error"] == "busy"
+        assert service.counters["busy"] == 1 and service.counters["errors"] == 4
+
+    def testMalformedFile(self):
+        truncated = os.path.join(self.tmp, "truncated.mid")
+        with open(mozart, "rb") as f:
+            data = f.read()
+        with open(truncated, "wb") as f:
+            f.write(data[:1000])
+        service = ComparisonService(workers=1)
+        replies = self.ask(service, [
+            {"id": 1, "file1": truncated, "file2": mozart},
+            {"id": 2, "file1": mozart, "file2": truncated, "metric": "lcs"},
+            {"id": 3, "file1": mozart, "part1": 0, "file2": mozart, "part2": 1},
+        ])
+
+        assert "truncated.mid" in replies[1]["error"] and "truncated.mid" in replies[2]["error"]
+        # the service keeps answering
+        assert "error" not in replies[3]
+        assert service.counters["errors"] == 2
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import random
+import sys
+import os
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from encoding import EncodedPart, substitutionMatrix
+from helpers import Music21Helper
+
+helper = Music21Helper()
+
+def bruteForce(token1, token2, score, gap):
+    """full-table smith-waterman, best score only"""
+    table = [[0] * (len(token2) + 1) for i in range(len(token1) + 1)]
+    best = 0
+    for i in range(1, len(token1) + 1):
+        for j in range(1, len(token2) + 1):
+            table[i][j] = max(0, table[i-1][j-1] + score(token1[i-1], token2[j-1]),
+                              table[i-1][j] + gap, table[i][j-1] + gap)
+            best = max(best, table[i][j])
+    return best
+
+class TestSmithWaterman(unittest.TestCase):
+
+    def testSharedTheme(self):
+        score, (start1, end1), (start2, end2) = helper.smithWaterman("xxxxABCDEFGyyyy", "zzABCXEFGzzzzzz")
+
+        assert score == 6 * 2 - 2
+        assert (start1, end1) == (4, 11)
+        assert (start2, end2) == (2, 9)
+
+    def testNothingShared(self):
+        assert helper.smithWaterman("AAAA", "BBBB") is None
+        assert helper.smithWaterman("", "ABC") is None
+        assert helper.smithWaterman("AAAA", "BBBB", top=3) == []
+
+    def testMatchesBruteForce(self):
+        rng = random.Random(5030)
+        simple = lambda a, b: 2 if a == b else -2
+        for i in range(40):
+            token1 = [rng.choice("ABCDE") for k in range(rng.randint(0, 30))]
+            token2 = [rng.choice("ABCDE") for k in range(rng.randint(0, 30))]
+
+            expected = bruteForce(token1, token2, simple, -3)
+            hit = helper.smithWaterman(token1, token2)
+
+            if expected == 0:
+                assert hit is None
+                continue
+            score, (start1, end1), (start2, end2) = hit
+            assert score == expected
+            # the reported stretches really hold an alignment with that score
+            assert bruteForce(token1[start1:end1], token2[start2:end2], simple, -3) == expected
+
+    def testSubstitutionMatrix(self):
+        matrix = substitutionMatrix("spelled")
+        codes = lambda *names: EncodedPart.fromLetterNames(names, alphabet="spelled").codes.tolist()
+        c, cSharp, dFlat, d, g = codes("C", "C#", "D-", "D", "G")
+
+        assert matrix[c, c] == 2
+        assert matrix[cSharp, dFlat] == 1
+        assert matrix[c, d] == matrix[cSharp, c] == -1
+        assert matrix[c, g] == -2
+        assert (substitutionMatrix() == substitutionMatrix().T).all()
+
+        rng = random.Random(5030)
+        pcMatrix = substitutionMatrix("pitchClass")
+        for i in range(20):
+            part1 = EncodedPart([rng.randrange(12) for k in range(rng.randint(1, 25))])
+            part2 = EncodedPart([rng.randrange(12) for k in range(rng.randint(1, 25))])
+            expected = bruteForce(part1.codes.tolist(), part2.codes.tolist(), lambda a, b: pcMatrix[a, b], -3)
+            hit = helper.smithWaterman(part1, part2, substitution=pcMatrix)
+
+            assert (hit[0] if hit else 0) == expected
+
+    def testTopHits(self):
+        theme = "ABCDEFGH"
+        token1 = "xx" + theme + "yyyy" + theme[:5] + "yy"
+        token2 = "zzzzz" + theme + "zzzzzzzz" + theme[:5] + "zz" + theme
+
+        hits = helper.smithWaterman(token1, token2, top=5)
+
+        assert [h[0] for h in hits] == [16, 10]
+        assert hits[0][1] == (2, 10)
+        for k, (score, region1, region2) in enumerate(hits):
+            assert token1[region1[0]:region1[1]] == token2[region2[0]:region2[1]]
+            for other in hits[k + 1:]:
+                assert region1[1] <= other[1][0] or other[1][1] <= region1[0]
+                assert region2[1] <= other[2][0] or other[2][1] <= region2[0]
+
+    def testCoordinatesWhenSwapped(self):
+        hit = helper.smithWaterman("zzzzzzzzzzABCDzz", "ABCD")
+
+        assert hit == (8, (10, 14), (0, 4))
+
+    def testTransposedTheme(self):
+        theme = [60, 62, 64, 65, 67, 65, 64, 62, 60]
+        part1 = EncodedPart.fromIntervals([20, 90, 10] + theme + [100, 5])
+        part2 = EncodedPart.fromIntervals([110] + [p + 5 for p in theme] + [0, 120, 3])
+
+        score, (start1, end1), (start2, end2) = helper.smithWaterman(part1, part2)
+
+        assert score == 2 * (len(theme) - 1)
+        assert (start1, end1) == (3, 11)
+        assert (start2, end2) == (1, 9)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import random
+import sys
+import os
+
+# add ../modules to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+# add ../lib to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from encoding import EncodedPart
+from helpers import Music21Helper
+from streaming import StreamingMatcher
+
+helper = Music21Helper()
+
+NAMES = ['C', 'C#', 'D', 'E-', 'E', 'F', 'F#', 'G', 'G#', 'A', 'B-', 'B']
+
+def semiGlobalDistance(query, reference):
+    """best edit distance of query to any stretch of reference, and the earliest end of one"""
+    best = None
+    for end in range(len(reference) + 1):
+        d = min(helper.levenshteinDistanceDP(query, reference[start:end]) for start in range(end + 1))
+        if best is None or d < best[0]:
+            best = (d, end)
+    return best
+
+class TestStreaming(unittest.TestCase):
+
+    def testGlobal(self):
+        rng = random.Random(3)
+        reference = [rng.choice(NAMES) for i in range(70)]
+        query = [rng.choice(NAMES) for i in range(40)]
+        for engine in ("bitparallel", "numpy"):
+            matcher = StreamingMatcher(reference, engine=engine)
+            assert matcher.distance == len(reference)
+            for i, note in enumerate(query):
+                matcher.push(note)
+                assert matcher.distance == helper.levenshteinDistanceDP(query[:i + 1], reference)
+                assert matcher.end == len(reference)
+            assert len(matcher) == len(query)
+
+    def testSemiGlobal(self):
+        rng = random.Random(4)
+        reference = [rng.choice(NAMES) for i in range(30)]
+        # a slightly wrong performance of the middle of the reference
+        query = reference[10:20]
+        query[3] = "C" if query[3] != "C" else "D"
+        del query[6]
+        for engine in ("bitparallel", "numpy"):
+            matcher = StreamingMatcher(reference, semiGlobal=True, engine=engine)
+            for i, note in enumerate(query):
+                matcher.push(note)
+                assert (matcher.distance, matcher.end) == semiGlobalDistance(query[:i + 1], reference)
+            assert matcher.distance <= 2
+            assert matcher.end == 20
+
+    def testColumnsAgree(self):
+        rng = random.Random(5)
+        reference = [rng.choice(NAMES) for i in range(150)]
+        for semiGlobal in (False, True):
+            bits = StreamingMatcher(reference, semiGlobal, "bitparallel")
+            rows = StreamingMatcher(reference, semiGlobal, "numpy")
+            for i in range(60):
+                note = rng.choice(NAMES)
+                bits.push(note)
+                rows.push(note)
+                assert bits.column().tolist() == rows.column().tolist()
+                assert (bits.distance, bits.end) == (rows.distance, rows.end)
+
+    def testEncodedReference(self):
+        reference = EncodedPart.fromLetterNames(["C", "E", "G", "C", "A", "F", "D", "G"], "ref")
+        matcher = StreamingMatcher(reference, semiGlobal=True)
+        # letter names and pitch classes both work
+        matcher.extend(["A", 5, "D"])
+        assert (matcher.distance, matcher.end) == (0, 7)
+
+        # an interval reference follows a transposed performance
+        theme = [60, 64, 67, 65, 62, 60]
+        matcher = StreamingMatcher(EncodedPart.fromIntervals([55, 57] + theme + [50]), semiGlobal=True, engine="numpy")
+        played = [p + 5 for p in theme]
+        matcher.extend(b - a for a, b in zip(played, played[1:]))
+        assert (matcher.distance, matcher.end) == (0, 7)
+
+        matcher = StreamingMatcher(EncodedPart.fromIntervals([60, 62]))
+        self.assertRaises(ValueError, matcher.push, "C")
+
+    def testReset(self):
+        matcher = StreamingMatcher(list("CDEFG"), semiGlobal=True)
+        matcher.extend(list("XYZ"))
+        matcher.reset()
+        matcher.extend(list("EF"))
+        assert (matcher.distance, matcher.end, len(matcher)) == (0, 4, 2)
+
+    def testEmptyReference(self):
+        for semiGlobal in (False, True):
+            bits = StreamingMatcher([], semiGlobal, "bitparallel")
+            rows = StreamingMatcher(EncodedPart([]), semiGlobal, "numpy")
+            assert bits.distance == rows.distance == 0
+            bits.extend(list("CDE"))
+            rows.extend(["C", "D", "E"])
+            assert (bits.distance, bits.end) == (rows.distance, rows.end) == (3, 0)
+            assert bits.column().tolist() == rows.column().tolist() == [3]
+            assert bits.distance == helper.levenshteinDistanceDP(list("CDE"), [])
+
+if __name__ == '__main__':
+    unittest.main()